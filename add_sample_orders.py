@@ -93,6 +93,9 @@ def add_sample_orders():
                 
         db.commit()
         
+        # Đơn hàng được thêm trực tiếp nên cần cập nhật lại bảng tổng hợp
+        Order.rebuild_rollups()
+        
         print(f"\n✅ Đã tạo {orders_created} đơn hàng mẫu!")
         
         # Thống kê
@@ -1,7 +1,16 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify,
+                   stream_with_context)
+from datetime import datetime
 from functools import wraps
-from database import init_db, close_db
-from models import Product, Order, Review
+from database import init_db, close_db, get_db
+from change_feed import change_feed, subscriber_limit
+from dashboard import dashboard_service, REVENUE_DAYS, TOP_PRODUCTS
+from query_trace import server_timing
+import metrics
+import assets
+import compression
+from models import Product, Order, Review, decode_cursor, split_page
+from order_export import iter_csv, iter_ndjson
 import traceback
 
 app = Flask(__name__)
@@ -11,6 +20,34 @@ app.config['SESSION_TYPE'] = 'filesystem'
 # Đăng ký hàm đóng database
 app.teardown_appcontext(close_db)
 
+# Header Server-Timing: số truy vấn và tổng thời gian DB của request
+app.after_request(server_timing)
+
+# Đo request (route /metrics đăng ký sau login_required)
+metrics.init_app(app, 'admin')
+
+# Static asset có hash, nén sẵn (build_assets.py) và hàm asset_url cho template
+assets.init_app(app)
+
+# Nén gzip/brotli cho HTML, JSON và file xuất
+compression.init_app(app, 'admin')
+
+# Số dòng mặc định / tối đa mỗi trang
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def get_page_args(default_limit=PAGE_SIZE):
+    """Đọc tham số phân trang ?after=&limit= (bỏ qua cursor không hợp lệ)"""
+    after = request.args.get('after') or None
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        try:
+            decode_cursor(after)
+        except ValueError:
+            after = None
+    return after, limit
+
 # Thông tin đăng nhập admin
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'admin123'
@@ -25,6 +62,9 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Metrics của cả 2 app: admin đã đăng nhập hoặc Prometheus có METRICS_TOKEN
+metrics.add_endpoint(app, login_required)
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Trang đăng nhập admin"""
@@ -70,34 +110,21 @@ def dashboard():
     try:
         print("[DASHBOARD] Loading dashboard...")  # Debug
         
-        stats = Order.get_statistics()
-        recent_orders = Order.get_all()[:10]
-        total_products = len(Product.get_all())
-        
-        # Thống kê theo thời gian
-        orders_today = Order.get_orders_today()
-        orders_week = Order.get_orders_this_week()
-        orders_month = Order.get_orders_this_month()
+        # Toàn bộ số liệu lấy từ một snapshot (xem dashboard.py)
+        snapshot = dashboard_service.get()
         
-        # Top sản phẩm bán chạy
-        top_products = Order.get_top_products(5)
-        
-        # Đánh giá gần đây
-        recent_reviews = Review.get_recent(5)
-        review_stats = Review.get_statistics()
-        
-        print(f"[DASHBOARD] Stats: {stats}")  # Debug
+        print(f"[DASHBOARD] Stats: {snapshot['stats']}")  # Debug
         
         return render_template('admin/dashboard.html',
-                             stats=stats,
-                             total_products=total_products,
-                             recent_orders=recent_orders,
-                             orders_today=orders_today,
-                             orders_week=orders_week,
-                             orders_month=orders_month,
-                             top_products=top_products,
-                             recent_reviews=recent_reviews,
-                             review_stats=review_stats)
+                             stats=snapshot['stats'],
+                             total_products=snapshot['total_products'],
+                             recent_orders=snapshot['recent_orders'],
+                             orders_today=snapshot['orders_today'],
+                             orders_week=snapshot['orders_week'],
+                             orders_month=snapshot['orders_month'],
+                             top_products=snapshot['top_products'][:5],
+                             recent_reviews=snapshot['recent_reviews'],
+                             review_stats=snapshot['review_stats'])
     
     except Exception as e:
         print(f"[ERROR] Dashboard error: {e}")
@@ -232,15 +259,21 @@ def orders():
     """Danh sách đơn hàng"""
     try:
         status_filter = request.args.get('status', '')
+        after, limit = get_page_args()
         
+        # Lấy dư 1 dòng để biết còn trang sau không
         if status_filter:
-            all_orders = Order.get_by_status(status_filter)
+            page_orders = Order.get_by_status(status_filter, after, limit + 1)
         else:
-            all_orders = Order.get_all()
+            page_orders = Order.get_all(after, limit + 1)
+        page_orders, next_cursor = split_page(page_orders, limit)
         
         return render_template('admin/orders.html', 
-                             orders=all_orders,
-                             status_filter=status_filter)
+                             orders=page_orders,
+                             stats=Order.get_statistics(),
+                             status_filter=status_filter,
+                             next_cursor=next_cursor,
+                             limit=limit)
     
     except Exception as e:
         print(f"[ERROR] Orders error: {e}")
@@ -248,6 +281,41 @@ def orders():
         flash(f'Lỗi: {str(e)}', 'danger')
         return redirect(url_for('dashboard'))
 
+# Định dạng xuất đơn hàng: (hàm tạo nội dung, mimetype)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+
+@app.route('/orders/export.<fmt>')
+@login_required
+def export_orders(fmt):
+    """Xuất đơn hàng kèm chi tiết (?status=&from=YYYY-MM-DD&to=YYYY-MM-DD), stream từng lô"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Định dạng không hỗ trợ'}), 404
+    
+    status = request.args.get('status', '')
+    date_from = request.args.get('from', '')
+    date_to = request.args.get('to', '')
+    if status and status not in ('pending', 'processing', 'completed', 'cancelled'):
+        return jsonify({'error': 'Trạng thái không hợp lệ'}), 400
+    try:
+        for value in (date_from, date_to):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Ngày phải có dạng YYYY-MM-DD'}), 400
+    
+    render, mimetype = EXPORT_FORMATS[fmt]
+    # Giữ request context tới khi stream xong: kết nối database chỉ trả về pool sau dòng cuối
+    body = stream_with_context(render(Order.iter_export(status or None, date_from or None, date_to or None)))
+    filename = '-'.join(['orders'] + [part for part in (status, date_from, date_to) if part]) + f'.{fmt}'
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/orders/<int:order_id>')
 @login_required
 def order_detail(order_id):
@@ -319,7 +387,10 @@ def api_revenue_chart():
     """API dữ liệu biểu đồ doanh thu"""
     try:
         days = request.args.get('days', 7, type=int)
-        data = Order.get_revenue_by_date(days)
+        if 0 < days <= REVENUE_DAYS:
+            data = dashboard_service.get()['revenue'][-days:]
+        else:
+            data = Order.get_revenue_by_date(days)
         
         result = {
             'labels': [row['date'] for row in data],
@@ -330,12 +401,33 @@ def api_revenue_chart():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/orders')
+@login_required
+def api_orders():
+    """API danh sách đơn hàng (?status=&after=&limit=)"""
+    try:
+        status = request.args.get('status', '')
+        after, limit = get_page_args()
+        
+        if status:
+            page_orders = Order.get_by_status(status, after, limit + 1)
+        else:
+            page_orders = Order.get_all(after, limit + 1)
+        page_orders, next_cursor = split_page(page_orders, limit)
+        
+        return jsonify({
+            'orders': [dict(order) for order in page_orders],
+            'next': next_cursor
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/status-chart')
 @login_required
 def api_status_chart():
     """API dữ liệu biểu đồ trạng thái"""
     try:
-        data = Order.get_orders_by_status()
+        data = [{'status': status, 'count': count} for status, count in dashboard_service.get()['status'].items()]
         
         status_labels = {
             'pending': 'Chờ xử lý',
@@ -359,7 +451,10 @@ def api_top_products_chart():
     """API dữ liệu biểu đồ sản phẩm bán chạy"""
     try:
         limit = request.args.get('limit', 10, type=int)
-        data = Order.get_top_products(limit)
+        if 0 < limit <= TOP_PRODUCTS:
+            data = dashboard_service.get()['top_products'][:limit]
+        else:
+            data = Order.get_top_products(limit)
         
         result = {
             'labels': [row['name'] for row in data],
@@ -371,16 +466,40 @@ def api_top_products_chart():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/dashboard/stream')
+@login_required
+def api_dashboard_stream():
+    """SSE: snapshot dashboard rồi các thay đổi đơn hàng (order_created, status_changed)"""
+    # Mỗi kết nối giữ một luồng của server: chừa luồng cho request thường (SERVER_THREADS do prefork đặt)
+    subscription = change_feed.subscribe(get_db(), subscriber_limit(app.config.get('SERVER_THREADS')))
+    if subscription is None:
+        return jsonify({'error': 'Quá nhiều kết nối dashboard'}), 503
+    try:
+        # Snapshot phải gồm mọi sự kiện trước thời điểm đăng ký (các sự kiện sau sẽ được gửi tiếp)
+        snapshot, change_id = dashboard_service.live(subscription.start_id)
+    except Exception:
+        change_feed.unsubscribe(subscription)
+        raise
+    
+    response = Response(change_feed.stream(subscription, snapshot, change_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: change_feed.unsubscribe(subscription))
+    return response
+
 @app.route('/reviews')
 @login_required
 def reviews():
     """Quản lý đánh giá"""
     try:
-        all_reviews = Review.get_all()
+        after, limit = get_page_args()
+        page_reviews, next_cursor = split_page(Review.get_all(after, limit + 1), limit)
         review_stats = Review.get_statistics()
         return render_template('admin/reviews.html', 
-                             reviews=all_reviews,
-                             stats=review_stats)
+                             reviews=page_reviews,
+                             stats=review_stats,
+                             next_cursor=next_cursor,
+                             limit=limit)
     except Exception as e:
         print(f"[ERROR] Reviews error: {e}")
         traceback.print_exc()
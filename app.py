@@ -1,22 +1,105 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import uuid
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g
 from database import init_db, close_db
-from models import Product, Order, Review
+from query_trace import server_timing
+from models import Product, Order, Review, decode_cursor, split_page
+from cart_store import cart_store
+from http_cache import conditional, touch_cart
+from catalog_cache import version_clock
+from fragment_cache import FragmentCacheExtension
+import metrics
+import assets
+import compression
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-in-production-12345'
 app.config['SESSION_TYPE'] = 'filesystem'
 
+# Thẻ {% cache %} cho các đoạn HTML chỉ phụ thuộc danh mục (badge giỏ hàng nằm ngoài)
+app.jinja_env.add_extension(FragmentCacheExtension)
+
 # Đăng ký hàm đóng database
 app.teardown_appcontext(close_db)
 
+# Header Server-Timing: số truy vấn và tổng thời gian DB của request
+app.after_request(server_timing)
+
+# Đo request (/metrics chỉ xuất ở app admin)
+metrics.init_app(app, 'customer')
+
+# Static asset có hash, nén sẵn (build_assets.py) và hàm asset_url cho template
+assets.init_app(app)
+
+# Nén gzip/brotli cho HTML, JSON và file xuất
+compression.init_app(app, 'customer')
+
+# Số dòng mặc định / tối đa mỗi trang
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Số sản phẩm tối đa mỗi lần gọi /api/products/ratings
+MAX_RATING_IDS = 500
+
+def get_page_args(default_limit=PAGE_SIZE):
+    """Đọc tham số phân trang ?after=&limit= (bỏ qua cursor không hợp lệ)"""
+    after = request.args.get('after') or None
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        try:
+            decode_cursor(after)
+        except ValueError:
+            after = None
+    return after, limit
+
+def get_cart_id(create=False):
+    """Lấy cart_id trong session (cookie chỉ giữ id, giỏ hàng nằm ở server)"""
+    cart_id = session.get('cart_id')
+    if cart_id is None and (create or 'cart' in session):
+        cart_id = session['cart_id'] = uuid.uuid4().hex
+    # Chuyển giỏ hàng kiểu cũ (lưu cả list trong cookie) sang cart store
+    legacy_cart = session.pop('cart', None)
+    if legacy_cart:
+        for item in legacy_cart:
+            cart_store.add(cart_id, item['id'], item['quantity'])
+        touch_cart()
+    return cart_id
+
+def get_cart():
+    """Lấy giỏ hàng dạng dict {product_id: dòng giỏ hàng} (nhớ trong request)"""
+    if 'cart' not in g:
+        cart_id = get_cart_id()
+        quantities = cart_store.load(cart_id) if cart_id else {}
+        cart = {}
+        for product_id, quantity in quantities.items():
+            product = Product.get_by_id(product_id)
+            if not product:
+                continue
+            cart[product_id] = {
+                'id': product_id,
+                'name': product['name'],
+                'price': product['price'],
+                'image_url': product['image_url'],
+                'quantity': quantity
+            }
+        g.cart = cart
+    return g.cart
+
+@app.context_processor
+def inject_cart_count():
+    """Số sản phẩm trong giỏ cho badge trên thanh menu"""
+    return {'cart_count': len(get_cart())}
+
 @app.route('/')
+@conditional('catalog', per_cart=True)
 def index():
     """Trang chủ"""
-    products = Product.get_all()[:8]  # Lấy 8 sản phẩm mới nhất
+    products = Product.get_all(limit=8)  # Lấy 8 sản phẩm mới nhất
     categories = Product.get_categories()
     return render_template('customer/index.html', products=products, categories=categories)
 
 @app.route('/menu')
+@conditional('catalog', per_cart=True)
 def menu():
     """Trang thực đơn"""
     category = request.args.get('category', '')
@@ -37,6 +120,7 @@ def menu():
                          search_query=search)
 
 @app.route('/product/<int:product_id>')
+@conditional('catalog', 'reviews', per_cart=True)
 def product_detail(product_id):
     """Chi tiết sản phẩm"""
     product = Product.get_by_id(product_id)
@@ -47,13 +131,17 @@ def product_detail(product_id):
     related_products = Product.get_by_category(product['category'])
     related_products = [p for p in related_products if p['id'] != product_id][:4]
     
-    # Lấy rating
-    rating_info = Review.get_average_rating(product_id)
+    # Rating và trang đánh giá đầu tiên render sẵn (một truy vấn)
+    rating_info, product_reviews = Review.get_summary(product_id, limit=PAGE_SIZE + 1)
+    product_reviews, next_cursor = split_page(product_reviews, PAGE_SIZE)
     
     return render_template('customer/product_detail.html', 
                          product=product,
                          related_products=related_products,
-                         rating_info=rating_info)
+                         rating_info=rating_info,
+                         reviews=product_reviews,
+                         next_cursor=next_cursor,
+                         reviews_version=version_clock.get('reviews')[0][1])
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
@@ -69,35 +157,14 @@ def add_to_cart():
         if not product:
             return jsonify({'success': False, 'message': 'Sản phẩm không tồn tại'})
         
-        # Khởi tạo giỏ hàng nếu chưa có
-        if 'cart' not in session:
-            session['cart'] = []
-        
-        cart = session['cart']
-        
-        # Kiểm tra sản phẩm đã có trong giỏ hàng chưa
-        found = False
-        for item in cart:
-            if item['id'] == product_id:
-                item['quantity'] += quantity
-                found = True
-                break
-        
-        # Nếu chưa có, thêm mới
-        if not found:
-            cart.append({
-                'id': product_id,
-                'name': product['name'],
-                'price': product['price'],
-                'image_url': product['image_url'],
-                'quantity': quantity
-            })
-        
-        session['cart'] = cart
-        session.modified = True
+        cart_store.add(get_cart_id(create=True), product_id, quantity)
+        touch_cart()
+        g.pop('cart', None)
+        cart = get_cart()
+        metrics.observe('cart_size_lines', len(cart))
         
         # Tính tổng số lượng items trong giỏ
-        total_items = sum(item['quantity'] for item in cart)
+        total_items = sum(item['quantity'] for item in cart.values())
         
         return jsonify({
             'success': True, 
@@ -112,7 +179,7 @@ def add_to_cart():
 @app.route('/cart')
 def cart():
     """Trang giỏ hàng"""
-    cart_items = session.get('cart', [])
+    cart_items = list(get_cart().values())
     
     # Tính tổng tiền
     subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
@@ -132,22 +199,16 @@ def update_cart():
         product_id = int(request.form.get('product_id'))
         action = request.form.get('action')  # increase, decrease, remove
         
-        cart = session.get('cart', [])
+        cart_id = get_cart_id()
         
-        for item in cart:
-            if item['id'] == product_id:
-                if action == 'increase':
-                    item['quantity'] += 1
-                elif action == 'decrease':
-                    item['quantity'] -= 1
-                    if item['quantity'] <= 0:
-                        cart.remove(item)
-                elif action == 'remove':
-                    cart.remove(item)
-                break
-        
-        session['cart'] = cart
-        session.modified = True
+        if cart_id and product_id in get_cart():
+            if action == 'increase':
+                cart_store.add(cart_id, product_id, 1)
+            elif action == 'decrease':
+                cart_store.add(cart_id, product_id, -1)
+            elif action == 'remove':
+                cart_store.remove(cart_id, product_id)
+            touch_cart()
         
         return redirect(url_for('cart'))
     
@@ -158,7 +219,7 @@ def update_cart():
 @app.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     """Trang thanh toán"""
-    cart_items = session.get('cart', [])
+    cart_items = list(get_cart().values())
     
     if not cart_items:
         return redirect(url_for('cart'))
@@ -179,7 +240,8 @@ def checkout():
             order_id = Order.create(customer_name, customer_phone, customer_address, cart_items)
             
             # Xóa giỏ hàng
-            session.pop('cart', None)
+            cart_store.clear(session.pop('cart_id'))
+            touch_cart()
             
             return redirect(url_for('checkout_success', order_id=order_id))
         
@@ -214,7 +276,11 @@ def checkout_success(order_id):
 @app.route('/clear_cart')
 def clear_cart():
     """Xóa toàn bộ giỏ hàng"""
-    session.pop('cart', None)
+    cart_id = get_cart_id()
+    if cart_id:
+        cart_store.clear(cart_id)
+        session.pop('cart_id', None)
+        touch_cart()
     return redirect(url_for('cart'))
 
 @app.route('/review/add', methods=['POST'])
@@ -245,10 +311,15 @@ def add_review():
 @app.route('/reviews')
 def reviews():
     """Trang tất cả đánh giá"""
-    all_reviews = Review.get_all()
-    return render_template('customer/reviews.html', reviews=all_reviews)
+    after, limit = get_page_args()
+    page_reviews, next_cursor = split_page(Review.get_all(after, limit + 1), limit)
+    return render_template('customer/reviews.html', 
+                         reviews=page_reviews,
+                         next_cursor=next_cursor,
+                         limit=limit)
 
 @app.route('/api/product/<int:product_id>/rating')
+@conditional('reviews')
 def api_product_rating(product_id):
     """API lấy rating của sản phẩm"""
     try:
@@ -258,11 +329,46 @@ def api_product_rating(product_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/product/<int:product_id>/reviews')
+@conditional('reviews')
 def api_product_reviews(product_id):
-    """API lấy danh sách reviews của sản phẩm"""
+    """API lấy danh sách reviews của sản phẩm (?after=&limit=)"""
+    try:
+        after, limit = get_page_args()
+        reviews, next_cursor = split_page(Review.get_by_product(product_id, after, limit + 1), limit)
+        response = jsonify([dict(review) for review in reviews])
+        # Cursor trang sau nằm trong header để giữ nguyên dạng mảng của body
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/product/<int:product_id>/summary')
+@conditional('reviews')
+def api_product_summary(product_id):
+    """API lấy rating và một trang reviews của sản phẩm trong một request (?after=&limit=)"""
+    try:
+        after, limit = get_page_args()
+        rating_info, reviews = Review.get_summary(product_id, after, limit + 1)
+        reviews, next_cursor = split_page(reviews, limit)
+        return jsonify({'rating': rating_info, 'reviews': reviews, 'next_cursor': next_cursor})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/products/ratings')
+@conditional('reviews')
+def api_products_ratings():
+    """API lấy rating của nhiều sản phẩm (?ids=1,2,3), dùng cho lưới sản phẩm"""
+    try:
+        product_ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids phải là danh sách số nguyên cách nhau bởi dấu phẩy'}), 400
+    if len(product_ids) > MAX_RATING_IDS:
+        return jsonify({'error': f'Tối đa {MAX_RATING_IDS} sản phẩm mỗi lần'}), 400
+    
     try:
-        reviews = Review.get_by_product(product_id)
-        return jsonify([dict(review) for review in reviews])
+        ratings = Review.get_ratings(product_ids)
+        return jsonify({str(product_id): rating for product_id, rating in ratings.items()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
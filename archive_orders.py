@@ -0,0 +1,69 @@
+"""
+Script chuyển đơn hàng đã hoàn thành/hủy cũ hơn N ngày sang file lưu trữ (orders_archive.db)
+để bảng orders/order_items chính nhỏ lại và nằm gọn trong cache.
+Đơn đã lưu trữ vẫn xem được qua chi tiết đơn hàng và file xuất, thống kê không đổi.
+Chạy: python archive_orders.py [--days 90] [--batch 5000] [--vacuum]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from app import app
+from models import Order
+from database import init_db, get_db, get_pool, archive_path
+
+def archive_orders(days, batch_size, vacuum=False):
+    """Chuyển từng lô đơn cũ sang file lưu trữ"""
+    
+    with app.app_context():
+        print("\n" + "="*60)
+        print("📦 LƯU TRỮ ĐƠN HÀNG CŨ")
+        print("="*60 + "\n")
+        
+        init_db()
+        
+        # created_at lưu theo giờ UTC (CURRENT_TIMESTAMP)
+        before = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"🗂️  Đơn hoàn thành/hủy trước {before} → {archive_path()}")
+        
+        start = time.perf_counter()
+        total = 0
+        while True:
+            moved = Order.archive(before, batch_size)
+            if not moved:
+                break
+            total += moved
+            print(f"   {total:>12,} đơn | {total / (time.perf_counter() - start):>9,.0f} đơn/giây")
+        
+        db = get_db()
+        remaining = db.execute('SELECT COUNT(*) FROM main.orders').fetchone()[0]
+        archived = db.execute('SELECT COUNT(*) FROM archive.orders').fetchone()[0]
+        print(f"\n✅ Đã chuyển {total:,} đơn trong {time.perf_counter() - start:.2f}s")
+        print(f"   - Còn trong database chính: {remaining:,}")
+        print(f"   - Trong file lưu trữ: {archived:,}")
+        
+        if total:
+            db.execute('ANALYZE')
+            db.commit()
+    
+    if vacuum:
+        # VACUUM cần độc quyền file, chỉ chạy khi server đã dừng
+        print("\n🧹 Đang VACUUM database chính...")
+        get_pool().close()
+        with app.app_context():
+            db = get_db()
+            db.execute('VACUUM main')
+        print("✅ Đã thu gọn file database\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lưu trữ đơn hàng cũ')
+    parser.add_argument('--days', type=int, default=90, help='Chuyển đơn cũ hơn số ngày này')
+    parser.add_argument('--batch', type=int, default=5000, help='Số đơn mỗi transaction')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM database chính sau khi chuyển')
+    args = parser.parse_args()
+    try:
+        archive_orders(args.days, args.batch, args.vacuum)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,123 @@
+"""
+Static asset đã fingerprint và nén sẵn (xem build_assets.py)
+- asset_url('static', filename=...) dùng như url_for, trả tên có hash trong static/dist/manifest.json
+- Thư viện bên thứ ba (Bootstrap, Font Awesome, Chart.js) dùng bản trong static/vendor;
+  build_assets.py dừng nếu thiếu file hoặc sai sha256, nên chỉ khi chạy dev chưa build mới trỏ về CDN
+- Route static trả bản .br/.gz theo Accept-Encoding, file có hash được cache immutable 1 năm
+"""
+
+import json
+import mimetypes
+import os
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+# Thư mục chứa file đã build và manifest (tương đối so với thư mục static)
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Thời gian cache (giây) cho file có hash trong tên: nội dung không bao giờ đổi
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Bản nén sẵn theo thứ tự ưu tiên: (Content-Encoding, đuôi file)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Thư viện bên thứ ba: đường dẫn trong static/ -> URL gốc trên CDN
+VENDOR_ASSETS = {
+    'vendor/bootstrap/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'vendor/chart.js/chart.umd.min.js':
+        'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+}
+
+# Font Awesome nạp webfont theo đường dẫn tương đối ../webfonts/ trong all.min.css
+VENDOR_ASSETS.update(
+    (f'vendor/fontawesome/webfonts/{name}', f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/{name}')
+    for font in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400', 'fa-v4compatibility')
+    for name in (f'{font}.woff2', f'{font}.ttf')
+)
+
+
+class AssetManifest:
+    """Bảng tên file gốc -> tên file có hash của một thư mục static"""
+    
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+        self._mtime = None
+        self.files = {}
+        self.fingerprinted = set()
+    
+    def load(self):
+        """Đọc lại manifest nếu file đã đổi (sau khi chạy build_assets.py)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self.files, self.fingerprinted, self._mtime = {}, set(), None
+            return
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as f:
+                files = json.load(f)
+            self.files = files
+            self.fingerprinted = set(files.values())
+            self._mtime = mtime
+    
+    def resolve(self, filename):
+        """Tên file để đưa vào URL, None nếu là thư viện chưa được tải về"""
+        if filename in self.files:
+            return self.files[filename]
+        if filename in VENDOR_ASSETS and not os.path.isfile(os.path.join(self.static_folder, filename)):
+            return None
+        return filename
+
+
+def _accepted_encoding(path):
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+
+def init_app(app):
+    """Thay route static bằng bản có nén sẵn và đăng ký asset_url cho template"""
+    manifest = AssetManifest(app.static_folder)
+    manifest.load()
+    
+    def asset_url(endpoint, **values):
+        """Như url_for, nhưng với 'static' trả tên file có hash (hoặc URL CDN của thư viện chưa tải)"""
+        if endpoint == 'static' and 'filename' in values:
+            filename = manifest.resolve(values['filename'])
+            if filename is None:
+                return VENDOR_ASSETS[values['filename']]
+            values['filename'] = filename
+        return url_for(endpoint, **values)
+    
+    def send_static(filename):
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        
+        encoding, variant = _accepted_encoding(path)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        immutable = filename in manifest.fingerprinted
+        response = send_file(variant, mimetype=mimetype, conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE if immutable else None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if encoding or any(os.path.isfile(path + suffix) for _, suffix in ENCODINGS):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+    
+    # Chỉ một lần stat file manifest mỗi request
+    app.before_request(manifest.load)
+    
+    app.view_functions['static'] = send_static
+    app.jinja_env.globals['asset_url'] = asset_url
+    return manifest
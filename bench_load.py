@@ -0,0 +1,344 @@
+"""
+Benchmark tải: mô phỏng khách xem menu, tìm kiếm, thêm/sửa giỏ hàng, đặt hàng
+và admin liên tục tải lại dashboard. Báo p50/p95/p99 và throughput, lưu kết quả JSON.
+
+Chạy bằng Flask test client (DB tạm, tự tạo dữ liệu):
+    python bench_load.py [--concurrency 1 4 8] [--sessions 20] [--orders 0 100000] [--output kq.json]
+Chạy qua HTTP với server đang chạy (python run.py --workers 4):
+    python bench_load.py --url http://localhost:5000 --admin-url http://localhost:5001
+So sánh với lần chạy trước:
+    python bench_load.py --baseline cu.json ...      hoặc      python bench_load.py --compare cu.json moi.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+SEARCH_TERMS = ['phở', 'cơm', 'bún', 'gà', 'bò', 'trà', 'chả', 'xyz']
+
+def percentile(sorted_values, p):
+    """Percentile kiểu nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies):
+    """Tóm tắt danh sách thời gian (giây) thành ms"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values) * 1000, 3) if values else 0,
+        'p50': round(percentile(values, 50) * 1000, 3),
+        'p95': round(percentile(values, 95) * 1000, 3),
+        'p99': round(percentile(values, 99) * 1000, 3),
+        'max': round(values[-1] * 1000, 3) if values else 0
+    }
+
+# ----------------------------------------------------------------------
+# Client: Flask test client hoặc HTTP thật, cùng một giao diện request()
+# ----------------------------------------------------------------------
+
+class TestClientSession:
+    """Phiên người dùng dùng Flask test client (mỗi phiên một cookie jar)"""
+    
+    def __init__(self, app):
+        self.client = app.test_client()
+    
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        body = response.get_data(as_text=True)
+        return response.status_code, body
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpSession:
+    """Phiên người dùng gọi server thật qua HTTP (không tự theo redirect, giống test client)"""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+    
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+# ----------------------------------------------------------------------
+# Kịch bản
+# ----------------------------------------------------------------------
+
+class Recorder:
+    """Gom thời gian theo từng bước (mỗi thread một Recorder, gộp khi xong)"""
+    
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+    
+    def call(self, session, name, method, path, data=None, ok=(200, 302, 304)):
+        start = time.perf_counter()
+        try:
+            status, body = session.request(method, path, data)
+        except Exception:
+            status, body = None, ''
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if status not in ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return body
+    
+    def merge(self, other):
+        for name, values in other.latencies.items():
+            self.latencies.setdefault(name, []).extend(values)
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+
+def discover_catalog(session):
+    """Lấy danh sách ID sản phẩm và danh mục từ trang /menu"""
+    _, html = session.request('GET', '/menu')
+    product_ids = sorted({int(pid) for pid in re.findall(r'/product/(\d+)', html)})
+    categories = sorted({urllib.parse.unquote_plus(c) for c in re.findall(r'/menu\?category=([^"&]+)', html)})
+    return product_ids, categories
+
+def shopper(session, recorder, rng, product_ids, categories):
+    """Một lượt mua hàng: xem menu, tìm kiếm, thêm/sửa giỏ, thanh toán"""
+    recorder.call(session, 'home', 'GET', '/')
+    recorder.call(session, 'menu', 'GET', '/menu')
+    if categories:
+        recorder.call(session, 'menu_category', 'GET', '/menu?' + urllib.parse.urlencode({'category': rng.choice(categories)}))
+    recorder.call(session, 'search', 'GET', '/menu?' + urllib.parse.urlencode({'search': rng.choice(SEARCH_TERMS)}))
+    
+    picked = rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4)))
+    for product_id in picked:
+        recorder.call(session, 'product', 'GET', f'/product/{product_id}')
+        recorder.call(session, 'add_to_cart', 'POST', '/add_to_cart',
+                      {'product_id': product_id, 'quantity': rng.randint(1, 3)})
+    
+    recorder.call(session, 'cart', 'GET', '/cart')
+    recorder.call(session, 'update_cart', 'POST', '/update_cart',
+                  {'product_id': picked[0], 'action': rng.choice(['increase', 'decrease'])})
+    recorder.call(session, 'checkout_form', 'GET', '/checkout')
+    recorder.call(session, 'checkout', 'POST', '/checkout', {
+        'customer_name': 'Khách hàng', 'customer_phone': '0900000000', 'customer_address': 'TP.HCM'
+    })
+
+def admin_poller(session, recorder, stop_event, interval):
+    """Admin mở dashboard và danh sách đơn hàng liên tục"""
+    session.request('POST', '/login', {'username': 'admin', 'password': 'admin123'})
+    while not stop_event.is_set():
+        recorder.call(session, 'dashboard', 'GET', '/')
+        recorder.call(session, 'admin_orders_api', 'GET', '/api/orders?limit=50')
+        stop_event.wait(interval)
+
+def run_level(make_customer, make_admin, concurrency, sessions, pollers, poll_interval, seed):
+    """Chạy `concurrency` khách song song, mỗi khách `sessions` lượt mua"""
+    product_ids, categories = discover_catalog(make_customer())
+    if not product_ids:
+        raise RuntimeError('Không tìm thấy sản phẩm nào trên /menu')
+    
+    recorders = []
+    stop_event = threading.Event()
+    
+    def user(index):
+        recorder = Recorder()
+        recorders.append(recorder)
+        rng = random.Random(seed * 1000 + index)
+        for _ in range(sessions):
+            shopper(make_customer(), recorder, rng, product_ids, categories)
+    
+    def poll():
+        recorder = Recorder()
+        recorders.append(recorder)
+        admin_poller(make_admin(), recorder, stop_event, poll_interval)
+    
+    poll_threads = [threading.Thread(target=poll, daemon=True) for _ in range(pollers if make_admin else 0)]
+    user_threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    
+    start = time.perf_counter()
+    for thread in poll_threads + user_threads:
+        thread.start()
+    for thread in user_threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stop_event.set()
+    for thread in poll_threads:
+        thread.join()
+    
+    merged = Recorder()
+    for recorder in recorders:
+        merged.merge(recorder)
+    
+    all_latencies = [value for values in merged.latencies.values() for value in values]
+    return {
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'requests': len(all_latencies),
+        'throughput_rps': round(len(all_latencies) / wall, 1),
+        'checkouts_per_second': round(len(merged.latencies.get('checkout', [])) / wall, 1),
+        'errors': sum(merged.errors.values()),
+        'overall': summarize(all_latencies),
+        'steps': {name: dict(summarize(values), errors=merged.errors.get(name, 0))
+                  for name, values in sorted(merged.latencies.items())}
+    }
+
+def print_level(label, result):
+    print(f"\n⚡ {label} | {result['concurrency']} user | {result['requests']} request trong {result['wall_seconds']}s "
+          f"| {result['throughput_rps']} req/s | {result['checkouts_per_second']} đơn/s | lỗi: {result['errors']}")
+    print(f"   {'Bước':<18} {'Số lần':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+    for name, step in list(result['steps'].items()) + [('TỔNG', result['overall'])]:
+        print(f"   {name:<18} {step['count']:>7} {step['p50']:>9.2f} {step['p95']:>9.2f} "
+              f"{step['p99']:>9.2f} {step['max']:>9.2f}")
+
+# ----------------------------------------------------------------------
+# Chuẩn bị dữ liệu cho chế độ test client
+# ----------------------------------------------------------------------
+
+def seed_orders(count, rng, batch_size=1000):
+    """Tạo `count` đơn hàng ngẫu nhiên bằng Order.create_many"""
+    from models import Order, Product
+    product_ids = [p['id'] for p in Product.get_all()]
+    statuses = ['pending', 'processing', 'completed', 'completed', 'completed', 'cancelled']
+    done = 0
+    while done < count:
+        size = min(batch_size, count - done)
+        Order.create_many([
+            {'customer_name': 'Khách hàng', 'customer_phone': '0900000000', 'customer_address': 'TP.HCM',
+             'status': rng.choice(statuses),
+             'items': [{'id': pid, 'quantity': rng.randint(1, 3)}
+                       for pid in rng.sample(product_ids, rng.randint(1, 4))]}
+            for _ in range(size)
+        ])
+        done += size
+
+def run_test_client(args):
+    import database
+    from app import app as customer_app
+    from admin_app import app as admin_app
+    from database import init_db
+    
+    results = []
+    for orders in args.orders:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE = os.path.join(tmp, 'bench.db')
+            with customer_app.app_context():
+                init_db()
+                if orders:
+                    print(f"\n📦 Đang tạo {orders:,} đơn hàng...")
+                    seed_orders(orders, random.Random(args.seed))
+            
+            for concurrency in args.concurrency:
+                result = run_level(lambda: TestClientSession(customer_app),
+                                   lambda: TestClientSession(admin_app),
+                                   concurrency, args.sessions, args.pollers, args.poll_interval, args.seed)
+                result['orders'] = orders
+                print_level(f"{orders:,} đơn có sẵn", result)
+                results.append(result)
+    return results
+
+def run_http(args):
+    results = []
+    make_admin = (lambda: HttpSession(args.admin_url)) if args.admin_url else None
+    for concurrency in args.concurrency:
+        result = run_level(lambda: HttpSession(args.url), make_admin,
+                           concurrency, args.sessions, args.pollers, args.poll_interval, args.seed)
+        result['orders'] = None
+        print_level(args.url, result)
+        results.append(result)
+    return results
+
+# ----------------------------------------------------------------------
+# So sánh kết quả
+# ----------------------------------------------------------------------
+
+def compare(old, new, threshold):
+    """In chênh lệch p95 giữa 2 lần chạy, trả về số bước chậm hơn ngưỡng"""
+    old_levels = {(r['orders'], r['concurrency']): r for r in old['results']}
+    regressions = 0
+    print("\n" + "="*78)
+    print(f"{'Đơn':>9} {'User':>5} {'Bước':<18} {'p95 cũ':>10} {'p95 mới':>10} {'Thay đổi':>10}")
+    print("-"*78)
+    for level in new['results']:
+        before = old_levels.get((level['orders'], level['concurrency']))
+        if before is None:
+            continue
+        steps = dict(level['steps'], **{'TỔNG': level['overall']})
+        old_steps = dict(before['steps'], **{'TỔNG': before['overall']})
+        for name, step in steps.items():
+            if name not in old_steps or not old_steps[name]['p95']:
+                continue
+            change = (step['p95'] - old_steps[name]['p95']) / old_steps[name]['p95'] * 100
+            flag = ''
+            if change > threshold:
+                flag = ' ⚠️'
+                regressions += 1
+            print(f"{level['orders'] if level['orders'] is not None else '-':>9} {level['concurrency']:>5} "
+                  f"{name:<18} {old_steps[name]['p95']:>10.2f} {step['p95']:>10.2f} {change:>+9.1f}%{flag}")
+    print("="*78)
+    print(f"Số bước chậm hơn {threshold}%: {regressions}\n")
+    return regressions
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark tải cho luồng mua hàng và dashboard')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--sessions', type=int, default=20, help='Số lượt mua của mỗi user')
+    parser.add_argument('--orders', type=int, nargs='+', default=[0, 10000],
+                        help='Số đơn có sẵn trong DB (chỉ chế độ test client)')
+    parser.add_argument('--pollers', type=int, default=1, help='Số admin tải lại dashboard')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='Chạy qua HTTP với customer app tại URL này')
+    parser.add_argument('--admin-url', help='URL admin app (chế độ HTTP)')
+    parser.add_argument('--output', help='Lưu kết quả JSON')
+    parser.add_argument('--baseline', help='File JSON lần chạy trước để so sánh')
+    parser.add_argument('--compare', nargs=2, metavar=('CU', 'MOI'), help='Chỉ so sánh 2 file JSON')
+    parser.add_argument('--threshold', type=float, default=10, help='Ngưỡng chậm hơn (%%) bị coi là regression')
+    args = parser.parse_args()
+    
+    if args.compare:
+        sys.exit(1 if compare(load_json(args.compare[0]), load_json(args.compare[1]), args.threshold) else 0)
+    
+    results = run_http(args) if args.url else run_test_client(args)
+    report = {
+        'meta': {
+            'mode': 'http' if args.url else 'test_client',
+            'url': args.url,
+            'sessions': args.sessions,
+            'pollers': args.pollers,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': results
+    }
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Đã lưu kết quả vào {args.output}")
+    
+    if args.baseline:
+        sys.exit(1 if compare(load_json(args.baseline), report, args.threshold) else 0)
@@ -0,0 +1,101 @@
+"""
+Benchmark tạo đơn hàng: vòng lặp INSERT từng dòng (cũ) so với executemany (mới)
+Chạy: python bench_orders.py [--lines 1 5 10 25 50] [--orders 500] [--batch 100]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import database
+from app import app
+from database import get_db, init_db, apply_order_rollup
+from models import Order, Product
+
+def legacy_create(customer_name, customer_phone, customer_address, cart_items):
+    """Cách tạo đơn cũ: tin giá trong giỏ hàng, INSERT từng dòng chi tiết"""
+    db = get_db()
+    total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
+    cursor = db.execute(
+        '''INSERT INTO orders (customer_name, customer_phone, customer_address, total_amount)
+           VALUES (?, ?, ?, ?)''',
+        (customer_name, customer_phone, customer_address, total_amount)
+    )
+    order_id = cursor.lastrowid
+    for item in cart_items:
+        db.execute(
+            '''INSERT INTO order_items (order_id, product_id, quantity, price)
+               VALUES (?, ?, ?, ?)''',
+            (order_id, item['id'], item['quantity'], item['price'])
+        )
+    apply_order_rollup(db, order_id)
+    db.commit()
+    return order_id
+
+def make_carts(products, count, lines, rng):
+    """Tạo `count` giỏ hàng, mỗi giỏ `lines` dòng"""
+    carts = []
+    for _ in range(count):
+        picked = [rng.choice(products) for _ in range(lines)]
+        carts.append([{'id': p['id'], 'price': p['price'], 'quantity': rng.randint(1, 3)} for p in picked])
+    return carts
+
+def orders_per_second(func, carts):
+    start = time.perf_counter()
+    func(carts)
+    return len(carts) / (time.perf_counter() - start)
+
+def run(line_counts, order_count, batch_size):
+    rng = random.Random(42)
+    results = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        with app.app_context():
+            init_db()
+            products = Product.get_all()
+            
+            for lines in line_counts:
+                carts = make_carts(products, order_count, lines, rng)
+                
+                def legacy(carts):
+                    for cart in carts:
+                        legacy_create('Khách hàng', '0900000000', 'TP.HCM', cart)
+                
+                def single(carts):
+                    for cart in carts:
+                        Order.create('Khách hàng', '0900000000', 'TP.HCM', cart)
+                
+                def batched(carts):
+                    for i in range(0, len(carts), batch_size):
+                        Order.create_many([
+                            {'customer_name': 'Khách hàng', 'customer_phone': '0900000000',
+                             'customer_address': 'TP.HCM', 'items': cart}
+                            for cart in carts[i:i + batch_size]
+                        ])
+                
+                row = (lines,
+                       orders_per_second(legacy, carts),
+                       orders_per_second(single, carts),
+                       orders_per_second(batched, carts))
+                results.append(row)
+                print(f"🛒 {lines:>3} dòng/giỏ: cũ {row[1]:8.0f} | create {row[2]:8.0f} | "
+                      f"create_many {row[3]:8.0f} đơn/giây")
+    
+    print("\n" + "="*66)
+    print(f"{'Dòng/giỏ':>9} | {'Cũ':>10} | {'create':>10} | {f'create_many({batch_size})':>18}")
+    print("-"*66)
+    for lines, legacy, single, batched in results:
+        print(f"{lines:>9} | {legacy:>10.0f} | {single:>10.0f} | {batched:>18.0f}")
+    print("="*66)
+    print("(đơn vị: đơn hàng/giây)\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Order.create / Order.create_many')
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 5, 10, 25, 50])
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+    run(args.lines, args.orders, args.batch)
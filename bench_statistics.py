@@ -0,0 +1,95 @@
+"""
+Benchmark thống kê dashboard: 6 truy vấn trên orders (cũ) so với 1 lần gom nhóm (mới)
+Chạy: python bench_statistics.py [--sizes 100000 1000000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+from admin_app import app
+from database import get_db, init_db
+from models import Order
+
+STATUSES = ['pending', 'processing', 'completed', 'completed', 'completed', 'cancelled']
+
+def legacy_statistics():
+    """Cách tính cũ: 1 COUNT tổng, 4 COUNT theo trạng thái, 1 SUM doanh thu"""
+    db = get_db()
+    stats = {'total': 0, 'pending': 0, 'processing': 0, 'completed': 0, 'cancelled': 0, 'revenue': 0}
+    stats['total'] = db.execute('SELECT COUNT(*) as count FROM orders').fetchone()['count']
+    for status in ['pending', 'processing', 'completed', 'cancelled']:
+        stats[status] = db.execute(
+            'SELECT COUNT(*) as count FROM orders WHERE status = ?',
+            (status,)
+        ).fetchone()['count']
+    result = db.execute(
+        "SELECT SUM(total_amount) as revenue FROM orders WHERE status = 'completed'"
+    ).fetchone()
+    stats['revenue'] = result['revenue'] or 0
+    return stats
+
+def seed_orders(count, batch_size=50000):
+    """Thêm nhanh `count` đơn hàng ngẫu nhiên"""
+    db = get_db()
+    rng = random.Random(42)
+    done = 0
+    while done < count:
+        size = min(batch_size, count - done)
+        db.executemany(
+            '''INSERT INTO orders (customer_name, customer_phone, customer_address, total_amount, status)
+               VALUES (?, ?, ?, ?, ?)''',
+            [('Khách hàng', '0900000000', 'TP.HCM', rng.randint(2, 40) * 5000, rng.choice(STATUSES))
+             for _ in range(size)]
+        )
+        done += size
+    db.commit()
+    Order.rebuild_rollups()
+    db.execute('ANALYZE')
+    db.commit()
+
+def measure(func, repeat):
+    """Trả về thời gian trung vị (ms)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE = os.path.join(tmp, 'bench.db')
+            with app.app_context():
+                init_db()
+                print(f"\n📦 Đang tạo {size:,} đơn hàng...")
+                seed_orders(size)
+                
+                assert legacy_statistics() == Order.get_statistics()
+                
+                before = measure(legacy_statistics, repeat)
+                after = measure(Order.get_statistics, repeat)
+            
+            results.append((size, before, after))
+            print(f"   ⏱️  Cũ (6 truy vấn): {before:8.2f} ms")
+            print(f"   ⏱️  Mới (1 truy vấn): {after:8.2f} ms  (nhanh hơn {before / after:.1f} lần)")
+    
+    print("\n" + "="*60)
+    print(f"{'Số đơn':>12} | {'Cũ (ms)':>10} | {'Mới (ms)':>10} | {'Tăng tốc':>8}")
+    print("-"*60)
+    for size, before, after in results:
+        print(f"{size:>12,} | {before:>10.2f} | {after:>10.2f} | {before / after:>7.0f}x")
+    print("="*60 + "\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Order.get_statistics')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,202 @@
+"""
+Script build static asset: tải thư viện bên thứ ba về static/vendor, thêm hash nội dung vào tên file,
+ghi bản .gz/.br cạnh file đã build trong static/dist và tạo manifest.json cho asset_url().
+Chạy lại sau mỗi lần sửa file trong static/ (server tự đọc manifest mới).
+Thư viện được kiểm tra sha256 theo vendor.lock.json: thiếu file hoặc sai hash thì build dừng với lỗi
+(không âm thầm dùng CDN). Đổi phiên bản thư viện: sửa VENDOR_ASSETS rồi chạy --pin-vendor và commit file lock.
+Chạy: python build_assets.py [--refresh-vendor] [--offline] [--pin-vendor]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+import urllib.request
+from assets import DIST_DIR, MANIFEST_NAME, VENDOR_ASSETS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+
+# sha256 của từng file trong VENDOR_ASSETS (commit cùng code)
+VENDOR_LOCK = os.path.join(BASE_DIR, 'vendor.lock.json')
+
+# Chỉ nén file dạng văn bản (woff2, ảnh đã được nén sẵn)
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.ttf', '.map'}
+
+# Số ký tự hash trong tên file
+HASH_LENGTH = 10
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+def load_vendor_lock():
+    try:
+        with open(VENDOR_LOCK, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+def download_vendor(refresh=False, offline=False, pin=False):
+    """Tải các thư viện trong VENDOR_ASSETS và kiểm tra sha256 theo vendor.lock.json
+    
+    pin=True tải lại tất cả và ghi hash mới vào file lock.
+    Thiếu file, không tải được hoặc sai hash thì raise RuntimeError (liệt kê mọi file lỗi).
+    """
+    lock = {} if pin else load_vendor_lock()
+    errors = []
+    for filename, url in VENDOR_ASSETS.items():
+        path = os.path.join(STATIC_DIR, filename)
+        expected = lock.get(filename)
+        if expected is None and not pin:
+            errors.append(f"{filename}: chưa có hash trong vendor.lock.json (chạy --pin-vendor)")
+            continue
+        
+        downloaded = pin or refresh or not os.path.isfile(path)
+        if downloaded and offline:
+            errors.append(f"{filename}: chưa được tải về (build --offline)")
+            continue
+        try:
+            if downloaded:
+                data = fetch(url)
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+        except OSError as e:
+            errors.append(f"{filename}: không tải được {url} ({e})")
+            continue
+        
+        digest = hashlib.sha256(data).hexdigest()
+        if pin:
+            lock[filename] = digest
+        elif digest != expected:
+            errors.append(f"{filename}: sha256 {digest} khác vendor.lock.json ({expected})")
+            continue
+        if downloaded:
+            write_file(path, data)
+            print(f"📥 {filename} ({len(data) / 1024:,.1f} KB)")
+    
+    if errors:
+        raise RuntimeError("Thư viện bên thứ ba không hợp lệ:\n   - " + "\n   - ".join(errors))
+    if pin:
+        write_file(VENDOR_LOCK, (json.dumps(lock, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+        print(f"🔒 Đã ghi hash của {len(lock)} file vào vendor.lock.json")
+
+def collect_sources():
+    """Các file nguồn trong static/ (trừ thư mục build), CSS xếp cuối để thay url() bằng tên đã hash"""
+    sources = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if root == STATIC_DIR and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in files:
+            if name.endswith('.tmp'):
+                continue
+            sources.append(os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/'))
+    return sorted(sources, key=lambda filename: (filename.endswith('.css'), filename))
+
+def rewrite_css_urls(filename, data, manifest):
+    """Thay url(...) tương đối trong CSS bằng file đã hash (vd. webfont của Font Awesome)"""
+    directory = posixpath.dirname(filename)
+    
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(directory, path))
+        if target not in manifest:
+            return match.group(0)
+        # dist/ giữ nguyên cấu trúc thư mục nên chỉ cần đổi tên file
+        hashed = posixpath.basename(manifest[target])
+        return f'url({quote}{posixpath.join(posixpath.dirname(path), hashed)}{suffix}{quote})'
+    
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def write_compressed(path, data):
+    """Ghi bản .gz/.br nếu nhỏ hơn file gốc, trả về kích thước các bản đã ghi"""
+    sizes = {}
+    # mtime=0 để build lại cùng nội dung cho ra cùng file .gz
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            write_file(path + suffix, compressed)
+            sizes[suffix] = len(compressed)
+    return sizes
+
+def build_assets(refresh_vendor=False, offline=False, pin_vendor=False):
+    """Build toàn bộ static/ vào static/dist và ghi manifest"""
+    print("\n" + "="*60)
+    print("📦 BUILD STATIC ASSET")
+    print("="*60 + "\n")
+    
+    start = time.perf_counter()
+    download_vendor(refresh_vendor, offline, pin_vendor)
+    if brotli is None:
+        print("⚠️  Chưa cài brotli (pip install brotli): chỉ tạo bản .gz")
+    
+    manifest = {}
+    total = {'raw': 0, '.gz': 0, '.br': 0}
+    for filename in collect_sources():
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            data = f.read()
+        if filename.endswith('.css'):
+            data = rewrite_css_urls(filename, data, manifest)
+        
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = posixpath.splitext(filename)
+        hashed = f'{DIST_DIR}/{stem}.{digest}{ext}'
+        path = os.path.join(STATIC_DIR, hashed)
+        if not os.path.isfile(path):
+            write_file(path, data)
+        manifest[filename] = hashed
+        
+        sizes = write_compressed(path, data) if ext in COMPRESSIBLE else {}
+        total['raw'] += len(data)
+        for suffix in ('.gz', '.br'):
+            total[suffix] += sizes.get(suffix, len(data))
+        compressed = ', '.join(f"{suffix} {size / 1024:,.1f} KB" for suffix, size in sizes.items())
+        print(f"   {hashed} ({len(data) / 1024:,.1f} KB{', ' + compressed if compressed else ''})")
+    
+    # Ghi manifest sau cùng: server chỉ chuyển sang tên mới khi mọi file đã sẵn sàng
+    write_file(os.path.join(STATIC_DIR, DIST_DIR, MANIFEST_NAME),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    
+    print(f"\n✅ Đã build {len(manifest)} file trong {time.perf_counter() - start:.2f}s")
+    print(f"   - Gốc: {total['raw'] / 1024:,.1f} KB")
+    print(f"   - gzip: {total['.gz'] / 1024:,.1f} KB")
+    if brotli is not None:
+        print(f"   - brotli: {total['.br'] / 1024:,.1f} KB")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build static asset có hash và nén sẵn')
+    parser.add_argument('--refresh-vendor', action='store_true', help='Tải lại thư viện bên thứ ba')
+    parser.add_argument('--offline', action='store_true', help='Không tải thư viện, chỉ kiểm tra file đang có')
+    parser.add_argument('--pin-vendor', action='store_true', help='Tải lại thư viện và ghi hash vào vendor.lock.json')
+    args = parser.parse_args()
+    try:
+        build_assets(args.refresh_vendor, args.offline, args.pin_vendor)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
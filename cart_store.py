@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from database import get_db
+
+# Backend lưu giỏ hàng: 'sqlite' (dùng chung giữa các tiến trình) hoặc 'memory' (LRU trong tiến trình)
+CART_BACKEND = os.environ.get('CART_BACKEND', 'sqlite')
+
+# Số giỏ hàng tối đa giữ trong bộ nhớ với backend 'memory'
+MEMORY_CART_CAPACITY = int(os.environ.get('CART_MEMORY_CAPACITY', 10000))
+
+
+class CartStore(ABC):
+    """Lưu giỏ hàng phía server: mỗi cart_id ứng với dict {product_id: quantity}"""
+    
+    @abstractmethod
+    def load(self, cart_id):
+        """Lấy giỏ hàng dạng dict {product_id: quantity}"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add(self, cart_id, product_id, quantity):
+        """Cộng thêm số lượng (có thể âm), xóa dòng khi số lượng <= 0"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def remove(self, cart_id, product_id):
+        """Xóa một sản phẩm khỏi giỏ hàng"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def clear(self, cart_id):
+        """Xóa toàn bộ giỏ hàng"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def purge(self, max_age_days=7):
+        """Xóa giỏ hàng bỏ quên lâu hơn max_age_days, trả về số dòng đã xóa"""
+        raise NotImplementedError
+
+
+class SQLiteCartStore(CartStore):
+    """Giỏ hàng lưu trong bảng cart_items (các worker đều thấy)"""
+    
+    def load(self, cart_id):
+        db = get_db()
+        result = db.execute(
+            'SELECT product_id, quantity FROM cart_items WHERE cart_id = ?',
+            (cart_id,)
+        ).fetchall()
+        return {row['product_id']: row['quantity'] for row in result}
+    
+    def add(self, cart_id, product_id, quantity):
+        db = get_db()
+        db.execute(
+            '''INSERT INTO cart_items (cart_id, product_id, quantity, updated_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(cart_id, product_id) DO UPDATE SET
+                   quantity = quantity + excluded.quantity,
+                   updated_at = excluded.updated_at''',
+            (cart_id, product_id, quantity, time.time())
+        )
+        db.execute(
+            'DELETE FROM cart_items WHERE cart_id = ? AND product_id = ? AND quantity <= 0',
+            (cart_id, product_id)
+        )
+        db.commit()
+    
+    def remove(self, cart_id, product_id):
+        db = get_db()
+        db.execute(
+            'DELETE FROM cart_items WHERE cart_id = ? AND product_id = ?',
+            (cart_id, product_id)
+        )
+        db.commit()
+    
+    def clear(self, cart_id):
+        db = get_db()
+        db.execute('DELETE FROM cart_items WHERE cart_id = ?', (cart_id,))
+        db.commit()
+    
+    def purge(self, max_age_days=7):
+        db = get_db()
+        cursor = db.execute(
+            'DELETE FROM cart_items WHERE updated_at < ?',
+            (time.time() - max_age_days * 86400,)
+        )
+        db.commit()
+        return cursor.rowcount
+
+
+class MemoryCartStore(CartStore):
+    """Giỏ hàng trong bộ nhớ, bỏ giỏ ít dùng nhất khi đầy (chỉ hợp với 1 tiến trình)"""
+    
+    def __init__(self, capacity=MEMORY_CART_CAPACITY):
+        self.capacity = capacity
+        self._carts = OrderedDict()
+        self._updated_at = {}
+        self._lock = threading.Lock()
+    
+    def _get(self, cart_id, create=False):
+        cart = self._carts.get(cart_id)
+        if cart is None and create:
+            cart = self._carts[cart_id] = {}
+            while len(self._carts) > self.capacity:
+                self._updated_at.pop(self._carts.popitem(last=False)[0], None)
+        if cart is not None:
+            self._carts.move_to_end(cart_id)
+        return cart
+    
+    def load(self, cart_id):
+        with self._lock:
+            return dict(self._get(cart_id) or {})
+    
+    def add(self, cart_id, product_id, quantity):
+        with self._lock:
+            cart = self._get(cart_id, create=True)
+            cart[product_id] = cart.get(product_id, 0) + quantity
+            if cart[product_id] <= 0:
+                del cart[product_id]
+            self._updated_at[cart_id] = time.time()
+    
+    def remove(self, cart_id, product_id):
+        with self._lock:
+            cart = self._get(cart_id)
+            if cart is not None:
+                cart.pop(product_id, None)
+                self._updated_at[cart_id] = time.time()
+    
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+            self._updated_at.pop(cart_id, None)
+    
+    def purge(self, max_age_days=7):
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            stale = [cart_id for cart_id, updated_at in self._updated_at.items() if updated_at < cutoff]
+            count = 0
+            for cart_id in stale:
+                count += len(self._carts.pop(cart_id, None) or {})
+                del self._updated_at[cart_id]
+            return count
+
+
+def create_cart_store(backend=CART_BACKEND):
+    """Tạo cart store theo tên backend"""
+    if backend == 'memory':
+        return MemoryCartStore()
+    if backend == 'sqlite':
+        return SQLiteCartStore()
+    raise ValueError(f'Backend giỏ hàng không hợp lệ: {backend}')
+
+
+cart_store = create_cart_store()
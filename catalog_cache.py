@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import database
+from database import get_db, get_version
+
+# Thời gian (giây) dùng lại phiên bản đã đọc trước khi hỏi lại SQLite.
+# Tiến trình khác (admin/customer) sửa sản phẩm sẽ được thấy sau tối đa khoảng này.
+VERSION_CHECK_INTERVAL = float(os.environ.get('CATALOG_VERSION_CHECK', 1.0))
+
+
+class CatalogCache:
+    """Cache danh mục sản phẩm trong bộ nhớ, đồng bộ qua bảng cache_versions"""
+    
+    def __init__(self, check_interval=VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = None
+        self._checked_at = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    
+    def _load(self, db, version):
+        """Đọc toàn bộ sản phẩm và dựng các index"""
+        rows = db.execute('SELECT * FROM products ORDER BY id').fetchall()
+        
+        available = [row for row in rows if row['is_available']]
+        by_category = {}
+        for row in available:
+            by_category.setdefault(row['category'], []).append(row)
+        
+        return {
+            'database': database.DATABASE,
+            'version': version,
+            'by_id': {row['id']: row for row in rows},
+            'available': sorted(available, key=lambda row: (row['created_at'] or '', row['id']), reverse=True),
+            'by_category': by_category,
+            'categories': list(by_category)
+        }
+    
+    def get(self):
+        """Lấy snapshot danh mục, nạp lại nếu phiên bản đã thay đổi"""
+        data = self._data
+        now = time.monotonic()
+        
+        if data is not None and data['database'] != database.DATABASE:
+            data = None
+        
+        # Trong khoảng check_interval, tin dùng snapshot hiện có
+        if data is not None and now - self._checked_at < self.check_interval:
+            self.stats['hits'] += 1
+            return data
+        
+        db = get_db()
+        version = get_version(db, 'catalog')
+        self._checked_at = now
+        if data is not None and data['version'] == version:
+            self.stats['hits'] += 1
+            return data
+        
+        with self._lock:
+            data = self._data
+            if data is None or data['database'] != database.DATABASE or data['version'] != version:
+                self.stats['misses'] += 1
+                data = self._data = self._load(db, version)
+            else:
+                self.stats['hits'] += 1
+        return data
+    
+    def invalidate(self):
+        """Xóa snapshot (gọi sau khi sản phẩm được ghi)"""
+        with self._lock:
+            self._data = None
+            self._checked_at = 0
+            self.stats['invalidations'] += 1
+    
+    def get_stats(self):
+        """Lấy thống kê hit/miss"""
+        stats = dict(self.stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0
+        data = self._data
+        stats['version'] = data['version'] if data else None
+        stats['products'] = len(data['by_id']) if data else 0
+        return stats
+
+
+class VersionClock:
+    """Nhớ bảng cache_versions trong bộ nhớ để kiểm tra ETag không cần hỏi SQLite mỗi request"""
+    
+    def __init__(self, check_interval=VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._versions = None
+        self._database = None
+        self._checked_at = 0
+    
+    def get(self, *names):
+        """Lấy [(name, version, updated_at)] của các phiên bản cần dùng"""
+        versions = self._versions
+        now = time.monotonic()
+        if (versions is None or self._database != database.DATABASE
+                or now - self._checked_at >= self.check_interval):
+            db = get_db()
+            rows = db.execute('SELECT name, version, updated_at FROM cache_versions').fetchall()
+            versions = self._versions = {
+                row['name']: (row['version'], float(row['updated_at']) if row['updated_at'] else None)
+                for row in rows
+            }
+            self._database = database.DATABASE
+            self._checked_at = now
+        return [(name,) + versions.get(name, (0, None)) for name in names]
+    
+    def invalidate(self):
+        """Đọc lại ở lần gọi sau (gọi sau khi ghi trong tiến trình này)"""
+        self._checked_at = 0
+
+
+catalog_cache = CatalogCache()
+version_clock = VersionClock()
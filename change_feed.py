@@ -0,0 +1,190 @@
+"""
+Luồng thay đổi đơn hàng dùng chung cho mọi tab dashboard admin (Server-Sent Events)
+- Order.create_many/update_status ghi sự kiện vào bảng change_log trong cùng transaction
+- Mỗi tiến trình admin có một thread đọc change_log (chỉ chạy khi có người nghe)
+  rồi chia sự kiện cho các subscriber, thay vì mỗi tab tự gọi lại API biểu đồ
+- Khi kết nối (hoặc nối lại), client nhận một snapshot rồi chỉ nhận phần thay đổi
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import database
+from database import apply_pragmas
+
+# Chu kỳ (giây) đọc sự kiện mới từ change_log
+POLL_INTERVAL = float(os.environ.get('CHANGE_FEED_POLL', 0.5))
+
+# Gửi comment giữ kết nối sau mỗi khoảng im lặng này (giây)
+HEARTBEAT_INTERVAL = 15
+
+# Số kết nối SSE tối đa mỗi tiến trình (mỗi kết nối giữ một thread của server)
+MAX_SUBSCRIBERS = int(os.environ.get('CHANGE_FEED_MAX_SUBSCRIBERS', 50))
+
+# Phần luồng của server có số luồng cố định (waitress) dành cho SSE, còn lại cho request thường
+SSE_THREAD_SHARE = 0.5
+
+# Số sự kiện tối đa chờ gửi cho một client, client chậm hơn sẽ bị ngắt để nối lại
+QUEUE_SIZE = 1000
+
+# Số sự kiện đọc mỗi lần
+BATCH_SIZE = 500
+
+
+def subscriber_limit(server_threads, max_subscribers=MAX_SUBSCRIBERS):
+    """Số kết nối SSE tối đa khi server có server_threads luồng (None: server không giới hạn luồng)"""
+    if server_threads is None:
+        return max_subscribers
+    return min(max_subscribers, int(server_threads * SSE_THREAD_SHARE))
+
+
+class Subscription:
+    """Hàng đợi sự kiện của một kết nối SSE"""
+    
+    def __init__(self, start_id):
+        self.start_id = start_id
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.closed = False
+    
+    def close(self):
+        """Ngắt kết nối: bỏ sự kiện đang chờ và báo generator dừng"""
+        self.closed = True
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put_nowait(None)
+
+
+class ChangeFeed:
+    """Đọc change_log bằng một thread mỗi tiến trình và phát cho các subscriber"""
+    
+    def __init__(self, poll_interval=POLL_INTERVAL, max_subscribers=MAX_SUBSCRIBERS):
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._subscribers = set()
+        self._last_id = None
+        self._thread = None
+        self._pid = None
+        self.stats = {'events': 0, 'polls': 0, 'dropped': 0, 'errors': 0}
+    
+    def subscribe(self, db, limit=None):
+        """Đăng ký nhận sự kiện mới hơn MAX(id) hiện tại, None nếu đã đủ kết nối
+        (limit: giới hạn riêng của server, mặc định max_subscribers)"""
+        latest = db.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+        if limit is None:
+            limit = self.max_subscribers
+        with self._cond:
+            if len(self._subscribers) >= min(limit, self.max_subscribers):
+                return None
+            if self._last_id is None:
+                self._last_id = latest
+            subscription = Subscription(self._last_id)
+            self._subscribers.add(subscription)
+            self._ensure_thread()
+            self._cond.notify()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._cond:
+            self._subscribers.discard(subscription)
+    
+    def _ensure_thread(self):
+        # Thread không sống qua fork: tạo lại trong tiến trình worker
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='ChangeFeed')
+            self._thread.start()
+    
+    def _connect(self):
+        conn = sqlite3.connect(database.DATABASE, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+    
+    def _run(self):
+        conn = None
+        path = None
+        while True:
+            with self._cond:
+                while not self._subscribers:
+                    # Không ai nghe: dừng đọc, lần đăng ký sau sẽ lấy lại MAX(id)
+                    self._last_id = None
+                    self._cond.wait()
+                after = self._last_id
+            
+            try:
+                if conn is None or path != database.DATABASE:
+                    if conn is not None:
+                        conn.close()
+                    path = database.DATABASE
+                    conn = self._connect()
+                rows = conn.execute(
+                    'SELECT id, topic, payload FROM change_log WHERE id > ? ORDER BY id LIMIT ?',
+                    (after, BATCH_SIZE)
+                ).fetchall()
+                self.stats['polls'] += 1
+            except sqlite3.Error as e:
+                self.stats['errors'] += 1
+                print(f"[FEED] Đọc change_log lỗi: {e}")
+                rows = []
+            
+            if rows:
+                self._dispatch(rows)
+            if len(rows) < BATCH_SIZE:
+                time.sleep(self.poll_interval)
+    
+    def _dispatch(self, rows):
+        with self._cond:
+            for subscription in list(self._subscribers):
+                for row in rows:
+                    if row[0] <= subscription.start_id:
+                        continue
+                    try:
+                        subscription.queue.put_nowait(row)
+                    except queue.Full:
+                        self._subscribers.discard(subscription)
+                        subscription.close()
+                        self.stats['dropped'] += 1
+                        break
+            self._last_id = rows[-1][0]
+            self.stats['events'] += len(rows)
+    
+    def stream(self, subscription, snapshot, snapshot_id):
+        """Generator SSE: snapshot trước, sau đó các sự kiện có id > snapshot_id"""
+        yield 'retry: 3000\n' + format_event('snapshot', json.dumps(snapshot, ensure_ascii=False), snapshot_id)
+        while True:
+            try:
+                row = subscription.queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            if row is None:
+                return
+            event_id, topic, payload = row
+            # Đã nằm trong snapshot
+            if event_id <= snapshot_id:
+                continue
+            yield format_event(topic, payload, event_id)
+    
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['subscribers'] = len(self._subscribers)
+        stats['last_id'] = self._last_id
+        return stats
+
+
+def format_event(event, data, event_id=None):
+    """Định dạng một sự kiện SSE"""
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.extend(f'data: {line}' for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+change_feed = ChangeFeed()
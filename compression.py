@@ -0,0 +1,231 @@
+"""
+Middleware WSGI nén response (brotli nếu có cài, không thì gzip) cho cả 2 app
+- Chỉ nén HTML/JSON/CSS/JS/CSV... lớn hơn COMPRESSION_MIN_SIZE, bỏ qua response đã có Content-Encoding
+  (file .br/.gz của build_assets.py), ảnh/font đã nén, SSE và response 206/304/HEAD
+- Response có Content-Length được nén một lần; response stream (xuất đơn hàng) được nén từng khối
+  và flush sau mỗi khối để client nhận dữ liệu ngay
+- Dữ liệu app gửi qua write() của start_response được giữ lại và nén cùng body
+- Số byte trước/sau khi nén ghi vào metrics (xem /metrics)
+"""
+
+import os
+import zlib
+from werkzeug.http import parse_accept_header
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Không nén response nhỏ hơn ngưỡng này (byte): gói TCP đầu tiên đã chứa đủ
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Mức nén cho response động: ưu tiên tốc độ (asset tĩnh đã nén tối đa khi build)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Loại nội dung dạng văn bản nên nén
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+}
+
+# SSE phải gửi từng sự kiện ngay, không qua bộ nén
+SKIP_TYPES = {'text/event-stream'}
+
+# Mã trạng thái không có body hoặc body là một đoạn của file (Range)
+SKIP_STATUS = {'204', '206', '304'}
+
+
+def choose_encoding(accept_encoding):
+    """Chọn 'br' hoặc 'gzip' theo header Accept-Encoding, None nếu client không nhận bản nén"""
+    if not accept_encoding:
+        return None
+    accept = parse_accept_header(accept_encoding)
+    gzip_quality = accept['gzip']
+    if brotli is not None and accept['br'] and accept['br'] >= gzip_quality:
+        return 'br'
+    return 'gzip' if gzip_quality else None
+
+
+class _Compressor:
+    """Bộ nén theo luồng với cùng giao diện cho gzip và brotli"""
+    
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.flush
+            self.finish = self._compressor.finish
+        else:
+            # wbits=31: định dạng gzip (header + CRC), không phải zlib thô
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self._compressor.flush
+
+
+class _CompressedStream:
+    """Body nén từng khối của response stream, ghi metrics khi server đóng response"""
+    
+    def __init__(self, body, encoding, app_name):
+        self.body = body
+        self.encoding = encoding
+        self.app_name = app_name
+        self.bytes_in = 0
+        self.bytes_out = 0
+    
+    def __iter__(self):
+        compressor = _Compressor(self.encoding)
+        for chunk in self.body:
+            if not chunk:
+                continue
+            self.bytes_in += len(chunk)
+            data = compressor.compress(chunk) + compressor.flush()
+            self.bytes_out += len(data)
+            yield data
+        data = compressor.finish()
+        self.bytes_out += len(data)
+        yield data
+    
+    def close(self):
+        # stream_with_context dọn request context trong close() của body gốc
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            _record(self.app_name, self.encoding, self.bytes_in, self.bytes_out)
+
+
+def _record(app_name, encoding, bytes_in, bytes_out):
+    metrics.inc('http_compressed_responses_total', app=app_name, encoding=encoding)
+    metrics.inc('http_compression_bytes_in_total', bytes_in, app=app_name, encoding=encoding)
+    metrics.inc('http_compression_bytes_out_total', bytes_out, app=app_name, encoding=encoding)
+    metrics.inc('http_compression_bytes_saved_total', bytes_in - bytes_out, app=app_name, encoding=encoding)
+
+
+class _WrittenBody:
+    """Body gốc với các khối app đã gửi qua hàm write() của start_response (PEP 3333) đứng trước"""
+    
+    def __init__(self, written, body):
+        self.written = written
+        self.body = body
+    
+    def __iter__(self):
+        yield from self.written
+        yield from self.body
+    
+    def close(self):
+        if hasattr(self.body, 'close'):
+            self.body.close()
+
+
+def _get_header(headers, name):
+    name = name.lower()
+    return next((value for key, value in headers if key.lower() == name), None)
+
+
+def _set_headers(headers, encoding, length=None):
+    """Header của bản nén: Content-Encoding, Vary, Content-Length mới và ETag yếu"""
+    result = []
+    vary = None
+    for key, value in headers:
+        lower = key.lower()
+        if lower == 'content-length':
+            continue
+        if lower == 'vary':
+            vary = value
+            continue
+        # Nội dung byte đã khác bản gốc nên ETag mạnh phải chuyển thành ETag yếu
+        if lower == 'etag' and not value.startswith('W/'):
+            value = 'W/' + value
+        result.append((key, value))
+    
+    if vary is None:
+        vary = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower() and vary.strip() != '*':
+        vary += ', Accept-Encoding'
+    result.append(('Vary', vary))
+    result.append(('Content-Encoding', encoding))
+    if length is not None:
+        result.append(('Content-Length', str(length)))
+    return result
+
+
+class CompressionMiddleware:
+    """Nén response của app WSGI (app Flask gọi start_response trước khi trả body)"""
+    
+    def __init__(self, wsgi_app, app_name, min_size=COMPRESSION_MIN_SIZE):
+        self.wsgi_app = wsgi_app
+        self.app_name = app_name
+        self.min_size = min_size
+    
+    def _skip_reason(self, environ, status, headers):
+        """Lý do không nén response (None nếu nên nén)"""
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return 'head'
+        if status.split(' ', 1)[0] in SKIP_STATUS:
+            return 'status'
+        if _get_header(headers, 'Content-Encoding'):
+            return 'encoded'
+        cache_control = _get_header(headers, 'Cache-Control') or ''
+        if 'no-transform' in cache_control.lower():
+            return 'no_transform'
+        content_type = (_get_header(headers, 'Content-Type') or '').split(';')[0].strip().lower()
+        if content_type in SKIP_TYPES or content_type not in COMPRESSIBLE_TYPES:
+            return 'type'
+        length = _get_header(headers, 'Content-Length')
+        if length is not None and int(length) < self.min_size:
+            return 'small'
+        return None
+    
+    def __call__(self, environ, start_response):
+        encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+        
+        captured = []
+        written = []
+        
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            # Chưa biết có nén hay không nên giữ lại, gửi cùng body khi app trả về
+            return written.append
+        
+        body = self.wsgi_app(environ, capture)
+        status, headers, exc_info = captured
+        if written:
+            body = _WrittenBody(written, body)
+        
+        reason = self._skip_reason(environ, status, headers)
+        if reason is not None:
+            metrics.inc('http_compression_skipped_total', app=self.app_name, reason=reason)
+            start_response(status, headers, exc_info)
+            return body
+        
+        if _get_header(headers, 'Content-Length') is None:
+            start_response(status, _set_headers(headers, encoding), exc_info)
+            return _CompressedStream(body, encoding, self.app_name)
+        
+        # Biết trước kích thước: nén cả body một lần
+        try:
+            data = b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        compressor = _Compressor(encoding)
+        compressed = compressor.compress(data) + compressor.finish()
+        if len(compressed) >= len(data):
+            metrics.inc('http_compression_skipped_total', app=self.app_name, reason='ratio')
+            start_response(status, headers, exc_info)
+            return [data]
+        
+        _record(self.app_name, encoding, len(data), len(compressed))
+        start_response(status, _set_headers(headers, encoding, len(compressed)), exc_info)
+        return [compressed]
+
+
+def init_app(app, name):
+    """Bọc wsgi_app của app Flask bằng middleware nén"""
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, name)
@@ -0,0 +1,152 @@
+"""
+Snapshot số liệu dashboard admin (trang dashboard, API biểu đồ, snapshot SSE dùng chung)
+- Nhóm đơn hàng (bảng tổng hợp, đơn gần đây, ID cuối của change_log) đọc trong một transaction
+- Nhóm đánh giá và nhóm sản phẩm/top bán chạy chạy song song trên kết nối khác của pool
+- Kết quả nhớ tối đa DASHBOARD_TTL giây và bị bỏ khi phiên bản 'orders'/'reviews'/'catalog' đổi;
+  nhiều request cùng lúc chỉ có một request tính lại
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import database
+from database import get_db
+from catalog_cache import version_clock
+from models import Product, Order, Review
+
+# Thời gian (giây) dùng lại snapshot
+DASHBOARD_TTL = float(os.environ.get('DASHBOARD_TTL', 5))
+
+# Số ngày doanh thu, số sản phẩm bán chạy, số đơn/đánh giá gần đây trong snapshot
+REVENUE_DAYS = 30
+TOP_PRODUCTS = 10
+RECENT_ORDERS = 10
+RECENT_REVIEWS = 5
+
+# Phiên bản dữ liệu quyết định snapshot còn dùng được không
+VERSION_NAMES = ('orders', 'reviews', 'catalog')
+
+# Các khóa gửi cho dashboard trực tiếp (JSON)
+LIVE_KEYS = ('stats', 'orders_today', 'orders_week', 'orders_month', 'periods', 'revenue', 'status')
+
+
+def _load_orders():
+    """Số liệu đơn hàng trong cùng một transaction đọc"""
+    db = get_db()
+    # SAVEPOINT mở transaction đọc, hoặc lồng vào transaction người gọi đang mở (không commit hộ)
+    db.execute('SAVEPOINT dashboard_orders')
+    try:
+        return {
+            'change_id': db.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0],
+            'stats': Order.get_statistics(),
+            'recent_orders': Order.get_all(limit=RECENT_ORDERS),
+            'orders_today': Order.get_orders_today(),
+            'orders_week': Order.get_orders_this_week(),
+            'orders_month': Order.get_orders_this_month(),
+            'periods': Order.get_periods(),
+            'revenue': Order.get_revenue_by_date(REVENUE_DAYS),
+            'status': {row['status']: row['count'] for row in Order.get_orders_by_status()}
+        }
+    finally:
+        db.execute('RELEASE dashboard_orders')
+
+
+def _load_reviews():
+    return {
+        'recent_reviews': Review.get_recent(RECENT_REVIEWS),
+        'review_stats': Review.get_statistics()
+    }
+
+
+def _load_products():
+    return {
+        'total_products': Product.count(),
+        'top_products': Order.get_top_products(TOP_PRODUCTS)
+    }
+
+
+def _run_in_context(app, func):
+    # App context riêng: get_db() lấy kết nối khác trong pool và trả lại khi xong
+    with app.app_context():
+        return func()
+
+
+class DashboardService:
+    """Tính và nhớ snapshot dashboard của tiến trình hiện tại"""
+    
+    def __init__(self, ttl=DASHBOARD_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._key = None
+        self._computed_at = 0
+        self._executor = None
+        self._pid = None
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def _get_executor(self):
+        # Thread không sống qua fork: tạo lại trong tiến trình worker
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='dashboard')
+        return self._executor
+    
+    def _fresh(self, key, min_change_id):
+        snapshot = self._snapshot
+        if snapshot is None or self._key != key or time.monotonic() - self._computed_at >= self.ttl:
+            return None
+        if min_change_id is not None and snapshot['change_id'] < min_change_id:
+            return None
+        return snapshot
+    
+    def _compute(self):
+        parallel = (_load_reviews, _load_products)
+        # Chỉ chạy song song khi pool còn đủ kết nối rảnh, tránh chờ kết nối khi server đang bận
+        pool = database.get_pool().get_stats()
+        if pool['size'] - pool['in_use'] < len(parallel):
+            snapshot = _load_orders()
+            for func in parallel:
+                snapshot.update(func())
+        else:
+            app = current_app._get_current_object()
+            executor = self._get_executor()
+            futures = [executor.submit(_run_in_context, app, func) for func in parallel]
+            snapshot = _load_orders()
+            for future in futures:
+                snapshot.update(future.result())
+        snapshot['computed_at'] = time.time()
+        return snapshot
+    
+    def get(self, min_change_id=None):
+        """Lấy snapshot (dict), tính lại nếu hết hạn, dữ liệu đổi hoặc cũ hơn min_change_id"""
+        key = (database.DATABASE,) + tuple(version for _, version, _ in version_clock.get(*VERSION_NAMES))
+        snapshot = self._fresh(key, min_change_id)
+        if snapshot is not None:
+            self.stats['hits'] += 1
+            return snapshot
+        
+        with self._lock:
+            # Request khác có thể vừa tính xong trong lúc chờ khóa
+            snapshot = self._fresh(key, min_change_id)
+            if snapshot is None:
+                self.stats['misses'] += 1
+                snapshot = self._compute()
+                self._snapshot = snapshot
+                self._key = key
+                self._computed_at = time.monotonic()
+            else:
+                self.stats['hits'] += 1
+        return snapshot
+    
+    def live(self, min_change_id=None):
+        """Phần snapshot cho dashboard trực tiếp và ID sự kiện cuối cùng đã tính vào"""
+        snapshot = self.get(min_change_id)
+        return {key: snapshot[key] for key in LIVE_KEYS}, snapshot['change_id']
+    
+    def invalidate(self):
+        self._snapshot = None
+
+
+dashboard_service = DashboardService()
@@ -1,20 +1,663 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
 from flask import g
+from query_trace import trace_connection
 
 DATABASE = 'food_ordering.db'
 
+# Số kết nối tối đa trong pool (đặt qua biến môi trường DB_POOL_SIZE)
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+# Thời gian tối đa (giây) chờ kết nối rảnh khi pool đã dùng hết
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+# Các bộ PRAGMA áp dụng khi mở kết nối (theo đúng thứ tự khai báo)
+PRAGMA_PROFILES = {
+    # WAL: người đọc (admin) không bị chặn bởi người ghi (đặt hàng)
+    'default': [
+        ('busy_timeout', 5000),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', -16000),       # ~16MB page cache mỗi kết nối
+        ('mmap_size', 134217728),     # 128MB
+        ('temp_store', 'MEMORY'),
+        ('wal_autocheckpoint', 4000), # Phần lớn checkpoint do WalCheckpointer làm
+        ('journal_size_limit', 67108864), # Cắt file WAL về 64MB khi ghi lại từ đầu
+    ],
+    # Giống default nhưng fsync mỗi lần commit
+    'durable': [
+        ('busy_timeout', 5000),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'FULL'),
+        ('cache_size', -16000),
+        ('mmap_size', 134217728),
+        ('temp_store', 'MEMORY'),
+        ('journal_size_limit', 67108864),
+    ],
+    # Chỉ dùng khi nạp dữ liệu hàng loạt với kết nối độc quyền (generate_data.py):
+    # journal trong RAM, không fsync. Mất điện giữa chừng có thể hỏng file, chạy lại từ đầu.
+    'bulk_load': [
+        ('busy_timeout', 5000),
+        ('journal_mode', 'MEMORY'),
+        ('synchronous', 'OFF'),
+        ('cache_size', -262144),      # ~256MB
+        ('temp_store', 'MEMORY'),
+    ],
+}
+
+# Bộ PRAGMA đang dùng (đặt qua biến môi trường DB_PRAGMA_PROFILE)
+PRAGMA_PROFILE = os.environ.get('DB_PRAGMA_PROFILE', 'default')
+
+# File lưu trữ đơn hàng cũ (đặt qua DB_ARCHIVE), mặc định orders_archive.db cạnh file database chính.
+# Mọi kết nối trong pool gắn file này với tên schema 'archive'.
+ARCHIVE_DATABASE = os.environ.get('DB_ARCHIVE')
+
+# Số sự kiện gần nhất giữ lại trong change_log (dashboard trực tiếp)
+CHANGE_LOG_KEEP = 10000
+
+# Chu kỳ (giây) checkpoint WAL định kỳ
+CHECKPOINT_INTERVAL = float(os.environ.get('DB_CHECKPOINT_INTERVAL', 60))
+
+
+def apply_pragmas(conn, profile=None):
+    """Áp dụng bộ PRAGMA cho kết nối"""
+    for name, value in PRAGMA_PROFILES[profile or PRAGMA_PROFILE]:
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+# Schema của file lưu trữ: đơn hàng đã xong/hủy chuyển từ bảng chính sang,
+# product_sales cộng dồn số lượng/doanh thu đơn hoàn thành đã lưu trữ (cho top bán chạy)
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive.orders (
+        id INTEGER PRIMARY KEY,
+        customer_name TEXT NOT NULL,
+        customer_phone TEXT NOT NULL,
+        customer_address TEXT NOT NULL,
+        total_amount REAL NOT NULL,
+        status TEXT,
+        created_at TIMESTAMP,
+        archived_at REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS archive.order_items (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS archive.product_sales (
+        product_id INTEGER PRIMARY KEY,
+        total_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )''',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archive_orders_created ON orders (created_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archive_orders_status_created ON orders (status, created_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archive_items_order ON order_items (order_id)',
+]
+
+def archive_path(database=None):
+    """Đường dẫn file lưu trữ đơn hàng của database"""
+    if ARCHIVE_DATABASE:
+        return ARCHIVE_DATABASE
+    return os.path.join(os.path.dirname(database or DATABASE), 'orders_archive.db')
+
+def attach_archive(conn, database=None):
+    """Gắn file lưu trữ vào kết nối (schema 'archive'), tạo bảng nếu chưa có"""
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_path(database),))
+    conn.execute('PRAGMA archive.journal_mode = WAL').fetchall()
+    conn.execute('PRAGMA archive.synchronous = NORMAL')
+    for sql in ARCHIVE_SCHEMA:
+        conn.execute(sql)
+
+def has_archive(db):
+    """Kết nối đã gắn file lưu trữ chưa"""
+    return any(row[1] == 'archive' for row in db.execute('PRAGMA database_list').fetchall())
+
+
+class ConnectionPool:
+    """Pool kết nối SQLite dùng chung trong một tiến trình (thread-safe)"""
+    
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.stats = {
+            'hits': 0,        # Lấy được kết nối có sẵn
+            'misses': 0,      # Phải mở kết nối mới
+            'waits': 0,       # Phải chờ vì pool đã đầy
+            'wait_time': 0.0, # Tổng thời gian chờ (giây)
+            'discarded': 0    # Kết nối hỏng bị loại bỏ
+        }
+    
+    def _connect(self):
+        """Mở kết nối mới và làm nóng schema"""
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        attach_archive(conn, self.database)
+        conn.execute('SELECT name FROM sqlite_master').fetchall()
+        return conn
+    
+    def _is_healthy(self, conn):
+        """Kiểm tra kết nối còn dùng được không"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+    
+    def _discard(self, conn):
+        """Đóng kết nối hỏng và trả lại chỗ trống cho pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self.stats['discarded'] += 1
+    
+    def _reserve(self):
+        """Giữ chỗ để mở kết nối mới nếu chưa đạt giới hạn"""
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return True
+        return False
+    
+    def _open(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        self._count('misses')
+        return conn
+    
+    def acquire(self):
+        """Lấy một kết nối đã kiểm tra sức khỏe từ pool"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        
+        while True:
+            # Ưu tiên kết nối rảnh (LIFO để giữ cache nóng)
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            
+            if conn is None and self._reserve():
+                return self._open()
+            
+            if conn is None:
+                # Pool đã đầy, chờ kết nối được trả về
+                remaining = deadline - time.monotonic()
+                if not waited:
+                    self._count('waits')
+                    waited = True
+                start = time.monotonic()
+                try:
+                    conn = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        'Hết thời gian chờ kết nối database từ pool'
+                    )
+                finally:
+                    self._count('wait_time', time.monotonic() - start)
+            
+            if self._is_healthy(conn):
+                self._count('hits')
+                return conn
+            self._discard(conn)
+    
+    def release(self, conn):
+        """Trả kết nối về pool"""
+        if os.getpid() != self.pid:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+    
+    def warm(self, count=None):
+        """Mở sẵn các kết nối để request đầu tiên không phải chờ"""
+        count = self.size if count is None else min(count, self.size)
+        conns = []
+        while len(conns) < count and self._reserve():
+            conns.append(self._open())
+        for conn in conns:
+            self._idle.put(conn)
+    
+    def close(self):
+        """Đóng toàn bộ kết nối rảnh"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def get_stats(self):
+        """Lấy thống kê pool"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Lấy pool kết nối của tiến trình hiện tại"""
+    global _pool
+    pool = _pool
+    # Tạo pool mới nếu chưa có, sau khi fork hoặc khi đổi file database
+    if pool is None or pool.pid != os.getpid() or pool.database != DATABASE:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.pid != os.getpid() or pool.database != DATABASE:
+                if pool is not None and pool.pid == os.getpid():
+                    pool.close()
+                pool = _pool = ConnectionPool(DATABASE)
+    return pool
+
+class WalCheckpointer(threading.Thread):
+    """Thread nền checkpoint file WAL định kỳ và khi pool rảnh.
+    
+    Chỉ dùng PASSIVE: không chờ người đọc và không chặn người ghi. Pool rảnh chỉ là trạng thái
+    của tiến trình này, các worker khác (run.py --workers) vẫn có thể đang ghi, nên không dùng
+    TRUNCATE/RESTART. File WAL được SQLite cắt về journal_size_limit khi ghi lại từ đầu.
+    """
+    
+    def __init__(self, interval=CHECKPOINT_INTERVAL, tick=5):
+        super().__init__(daemon=True, name='WalCheckpointer')
+        self.interval = interval
+        self.tick = tick
+        self._stop_event = threading.Event()
+        self.stats = {'passive': 0, 'errors': 0}
+    
+    def checkpoint(self):
+        """Chạy checkpoint PASSIVE trên kết nối riêng, không lấy từ pool"""
+        conn = sqlite3.connect(DATABASE, timeout=1)
+        try:
+            return conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        finally:
+            conn.close()
+    
+    def run(self):
+        last = time.monotonic()
+        checkpointed = None
+        while not self._stop_event.wait(self.tick):
+            wal_path = DATABASE + '-wal'
+            try:
+                wal = os.stat(wal_path)
+            except OSError:
+                continue
+            # PASSIVE không làm rỗng file WAL: bỏ qua nếu không có gì ghi thêm từ lần trước
+            signature = (wal.st_size, wal.st_mtime_ns)
+            if wal.st_size == 0 or signature == checkpointed:
+                continue
+            idle = get_pool().get_stats()['in_use'] == 0
+            due = time.monotonic() - last >= self.interval
+            if not idle and not due:
+                continue
+            try:
+                self.checkpoint()
+                self.stats['passive'] += 1
+                checkpointed = signature
+            except sqlite3.Error as e:
+                self.stats['errors'] += 1
+                print(f"[DB] Checkpoint WAL lỗi: {e}")
+            last = time.monotonic()
+    
+    def stop(self):
+        self._stop_event.set()
+
+
+_checkpointer = None
+
+def start_checkpointer(interval=CHECKPOINT_INTERVAL):
+    """Khởi động thread checkpoint WAL (mỗi tiến trình một thread)"""
+    global _checkpointer
+    with _pool_lock:
+        if _checkpointer is None or not _checkpointer.is_alive():
+            _checkpointer = WalCheckpointer(interval)
+            _checkpointer.start()
+    return _checkpointer
+
 def get_db():
     """Lấy kết nối database"""
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        g.db_pool = get_pool()
+        # Kết nối được bọc để đo thời gian từng truy vấn (xem query_trace.py)
+        g.db = trace_connection(g.db_pool.acquire())
     return g.db
 
 def close_db(e=None):
-    """Đóng kết nối database"""
+    """Trả kết nối database về pool"""
     db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
+    trace = g.pop('db_trace', None)
+    if trace is not None:
+        trace.finish()
     if db is not None:
-        db.close()
+        pool.release(getattr(db, 'raw', db))
+
+# Bỏ chữ đ/Đ (unicode61 không coi nét gạch là dấu) trước khi đưa vào FTS5
+FTS_FOLD_SQL = "replace(replace({0}, 'đ', 'd'), 'Đ', 'D')"
+
+# Bảng tổng hợp đơn hàng theo ngày/tháng và trạng thái (key, biểu thức SQL)
+ORDER_ROLLUPS = [
+    ('order_daily_rollup', 'day', "DATE(created_at)"),
+    ('order_monthly_rollup', 'month', "strftime('%Y-%m', created_at)"),
+]
+
+def apply_order_rollup(db, order_id, sign=1, last_id=None):
+    """Cộng (sign=1) hoặc trừ (sign=-1) đơn hàng order_id (hoặc dải order_id..last_id)
+    vào bảng tổng hợp. Gọi trong cùng transaction với thao tác ghi đơn hàng."""
+    last_id = order_id if last_id is None else last_id
+    for table, key, expr in ORDER_ROLLUPS:
+        db.execute(
+            f'''INSERT INTO {table} ({key}, status, order_count, revenue)
+                SELECT {expr}, status, ? * COUNT(*), ? * SUM(total_amount) 
+                FROM orders WHERE id BETWEEN ? AND ? AND status IS NOT NULL
+                GROUP BY {expr}, status
+                ON CONFLICT({key}, status) DO UPDATE SET
+                    order_count = order_count + excluded.order_count,
+                    revenue = revenue + excluded.revenue''',
+            (sign, sign, order_id, last_id)
+        )
+
+def rebuild_order_rollups(db):
+    """Dựng lại bảng tổng hợp từ toàn bộ lịch sử đơn hàng, kể cả đơn đã lưu trữ (không commit)"""
+    source = 'main.orders'
+    if has_archive(db):
+        # Đơn có ở cả hai nơi (lưu trữ bị ngắt giữa chừng) chỉ tính bản trong bảng chính
+        source = '''(SELECT created_at, status, total_amount FROM main.orders
+                     UNION ALL
+                     SELECT created_at, status, total_amount FROM archive.orders a
+                     WHERE NOT EXISTS (SELECT 1 FROM main.orders h WHERE h.id = a.id))'''
+    for table, key, expr in ORDER_ROLLUPS:
+        db.execute(f'DELETE FROM {table}')
+        db.execute(
+            f'''INSERT INTO {table} ({key}, status, order_count, revenue)
+                SELECT {expr}, status, COUNT(*), SUM(total_amount)
+                FROM {source} 
+                WHERE status IS NOT NULL
+                GROUP BY {expr}, status'''
+        )
+
+def _create_order_rollups(db):
+    """Tạo bảng tổng hợp đơn hàng và nạp dữ liệu từ lịch sử"""
+    for table, key, expr in ORDER_ROLLUPS:
+        db.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} TEXT NOT NULL,
+                status TEXT NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY ({key}, status)
+            ) WITHOUT ROWID
+        ''')
+    rebuild_order_rollups(db)
+
+# Cột đếm số đánh giá theo từng mức sao trong product_rating_stats
+STAR_COLUMNS = [f'star_{star}' for star in range(1, 6)]
+
+def apply_rating_stats(db, review_id, sign=1):
+    """Cộng (sign=1) hoặc trừ (sign=-1) một đánh giá vào product_rating_stats.
+    Gọi trong cùng transaction với thao tác ghi đánh giá."""
+    stars = ', '.join(f'? * (rating = {star})' for star in range(1, 6))
+    updates = ', '.join(f'{col} = {col} + excluded.{col}' for col in STAR_COLUMNS)
+    db.execute(
+        f'''INSERT INTO product_rating_stats (product_id, review_count, rating_sum, {', '.join(STAR_COLUMNS)})
+            SELECT product_id, ?, ? * rating, {stars} FROM reviews WHERE id = ?
+            ON CONFLICT(product_id) DO UPDATE SET
+                review_count = review_count + excluded.review_count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                {updates}''',
+        (sign,) * 7 + (review_id,)
+    )
+
+def rebuild_rating_stats(db):
+    """Dựng lại product_rating_stats từ bảng reviews (không commit)"""
+    stars = ', '.join(f'SUM(rating = {star})' for star in range(1, 6))
+    db.execute('DELETE FROM product_rating_stats')
+    db.execute(
+        f'''INSERT INTO product_rating_stats (product_id, review_count, rating_sum, {', '.join(STAR_COLUMNS)})
+            SELECT product_id, COUNT(*), SUM(rating), {stars}
+            FROM reviews 
+            GROUP BY product_id'''
+    )
+
+def _create_rating_stats(db):
+    """Tạo bảng thống kê đánh giá theo sản phẩm và nạp dữ liệu cũ"""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS product_rating_stats (
+            product_id INTEGER PRIMARY KEY,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            star_1 INTEGER NOT NULL DEFAULT 0,
+            star_2 INTEGER NOT NULL DEFAULT 0,
+            star_3 INTEGER NOT NULL DEFAULT 0,
+            star_4 INTEGER NOT NULL DEFAULT 0,
+            star_5 INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    rebuild_rating_stats(db)
+
+def _create_product_fts(db):
+    """Tạo bảng FTS5 cho sản phẩm và trigger đồng bộ với bảng products"""
+    try:
+        db.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description, category,
+                tokenize = "unicode61 remove_diacritics 2"
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite không có FTS5: Product.search so khớp bỏ dấu trên danh mục trong bộ nhớ
+        print(f"⚠️  Không hỗ trợ FTS5 ({e}), tìm kiếm sẽ không xếp hạng theo bm25")
+        return
+    
+    values = ', '.join(FTS_FOLD_SQL.format(f'new.{col}') for col in ('name', 'description', 'category'))
+    insert = f'''INSERT INTO products_fts (rowid, name, description, category)
+                  VALUES (new.id, {values});'''
+    
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            {insert}
+        END
+    ''')
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update
+        AFTER UPDATE OF name, description, category ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+            {insert}
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+        END
+    ''')
+    
+    # Đánh chỉ mục cho sản phẩm đã có
+    columns = ', '.join(FTS_FOLD_SQL.format(col) for col in ('name', 'description', 'category'))
+    db.execute('DELETE FROM products_fts')
+    db.execute(f'''INSERT INTO products_fts (rowid, name, description, category)
+                   SELECT id, {columns} FROM products''')
+
+_fts5_cache = {}
+
+def has_fts5(db):
+    """Kiểm tra bảng tìm kiếm FTS5 có dùng được không (chưa tạo bảng, hoặc database tạo trên máy có FTS5
+    nhưng SQLite hiện tại không có module fts5)"""
+    if DATABASE not in _fts5_cache:
+        try:
+            db.execute('SELECT 1 FROM products_fts LIMIT 0').fetchall()
+            _fts5_cache[DATABASE] = True
+        except sqlite3.OperationalError:
+            _fts5_cache[DATABASE] = False
+    return _fts5_cache[DATABASE]
+
+# Các bước nâng cấp schema, phiên bản hiện tại lưu trong PRAGMA user_version.
+# Mỗi bước là (phiên bản, mô tả, danh sách câu SQL hoặc hàm nhận kết nối).
+# Chỉ thêm bước mới vào cuối danh sách, không sửa các bước đã phát hành.
+MIGRATIONS = [
+    (1, 'Index cho các cột lọc thường dùng', [
+        # Order.get_by_status: lọc theo trạng thái, sắp xếp theo thời gian
+        'CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at)',
+        # Order.get_all: sắp xếp theo thời gian
+        'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at)',
+        # JOIN order_items theo đơn hàng / theo sản phẩm
+        'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)',
+        'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id, quantity, price)',
+        # Review.get_by_product và Review.get_average_rating
+        'CREATE INDEX IF NOT EXISTS idx_reviews_product_created ON reviews (product_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_reviews_product_rating ON reviews (product_id, rating)',
+        # Product.get_by_category và Product.get_categories
+        'CREATE INDEX IF NOT EXISTS idx_products_available_category ON products (is_available, category)',
+    ]),
+    (2, 'Tìm kiếm toàn văn sản phẩm (FTS5)', _create_product_fts),
+    (3, 'Bảng phiên bản dữ liệu để các tiến trình đồng bộ cache', [
+        '''CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        )''',
+        "INSERT OR IGNORE INTO cache_versions (name, version, updated_at) VALUES ('catalog', 1, strftime('%s', 'now'))",
+    ]),
+    # Giữ số thứ tự phiên bản: thống kê đơn hàng đọc bảng tổng hợp (migration 5)
+    # nên không cần index (status, total_amount)
+    (4, 'Thống kê đơn hàng theo trạng thái (không cần index riêng)', []),
+    (5, 'Bảng tổng hợp đơn hàng theo ngày/tháng', _create_order_rollups),
+    (6, 'Bảng thống kê đánh giá theo sản phẩm', _create_rating_stats),
+    (7, 'Index phân trang đánh giá theo thời gian', [
+        'CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews (created_at)',
+    ]),
+    (8, 'Bảng giỏ hàng phía server', [
+        '''CREATE TABLE IF NOT EXISTS cart_items (
+            cart_id TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (cart_id, product_id)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_cart_items_updated ON cart_items (updated_at)',
+    ]),
+    (9, 'Phiên bản dữ liệu cho đánh giá và đơn hàng (ETag)', [
+        "INSERT OR IGNORE INTO cache_versions (name, version, updated_at) VALUES ('reviews', 1, strftime('%s', 'now'))",
+        "INSERT OR IGNORE INTO cache_versions (name, version, updated_at) VALUES ('orders', 1, strftime('%s', 'now'))",
+    ]),
+    (10, 'Nhật ký thay đổi đơn hàng cho dashboard trực tiếp (SSE)', [
+        '''CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )''',
+    ]),
+]
+
+def require_no_transaction(db, operation):
+    """Báo lỗi nếu kết nối còn transaction chưa commit: thao tác tự mở transaction riêng (BEGIN IMMEDIATE)
+    không được commit hộ, cũng không được nằm trong transaction mà người gọi có thể rollback"""
+    if db.in_transaction:
+        raise RuntimeError(f'{operation}: kết nối đang có transaction chưa commit')
+
+def get_schema_version(db):
+    """Lấy phiên bản schema hiện tại"""
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db):
+    """Nâng cấp schema lên phiên bản mới nhất, trả về các phiên bản đã áp dụng"""
+    require_no_transaction(db, 'migrate')
+    
+    current = get_schema_version(db)
+    applied = []
+    
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        # Mỗi bước chạy trong một transaction riêng
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if callable(steps):
+                steps(db)
+            else:
+                for sql in steps:
+                    db.execute(sql)
+            db.execute(f'PRAGMA user_version = {version}')
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        applied.append(version)
+        _fts5_cache.pop(DATABASE, None)
+        print(f"✅ Migration {version}: {description}")
+    
+    # Cập nhật thống kê cho query planner sau khi nâng cấp
+    if applied:
+        db.execute('ANALYZE')
+        db.commit()
+    
+    return applied
+
+def bump_version(db, name):
+    """Tăng phiên bản dữ liệu (gọi trong transaction ghi, trước khi commit)"""
+    db.execute(
+        '''INSERT INTO cache_versions (name, version, updated_at) VALUES (?, 1, ?)
+           ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at''',
+        (name, time.time())
+    )
+
+def log_change(db, topic, payload_sql, params=()):
+    """Ghi sự kiện vào change_log (gọi trong transaction ghi, trước khi commit).
+    
+    payload_sql là câu SELECT trả về một cột JSON, mỗi dòng thành một sự kiện.
+    """
+    db.execute(
+        f'''INSERT INTO change_log (topic, payload, created_at)
+            SELECT ?, payload, ? FROM ({payload_sql})''',
+        (topic, time.time()) + tuple(params)
+    )
+    # Chỉ giữ các sự kiện gần nhất (client nối lại luôn nhận snapshot mới)
+    db.execute(
+        'DELETE FROM change_log WHERE id <= (SELECT MAX(id) FROM change_log) - ?',
+        (CHANGE_LOG_KEEP,)
+    )
+
+def get_version(db, name):
+    """Lấy phiên bản dữ liệu hiện tại"""
+    row = db.execute(
+        'SELECT version FROM cache_versions WHERE name = ?',
+        (name,)
+    ).fetchone()
+    return row['version'] if row else 0
 
 def init_db():
     """Khởi tạo database và dữ liệu mẫu"""
@@ -75,6 +718,9 @@ def init_db():
         )
     ''')
     
+    # Nâng cấp schema (index, ...) cho database mới lẫn database cũ
+    migrate(db)
+    
     # Kiểm tra xem đã có dữ liệu chưa
     count = db.execute('SELECT COUNT(*) FROM products').fetchone()[0]
     
@@ -134,6 +780,7 @@ def init_db():
             INSERT INTO products (name, description, price, image_url, category)
             VALUES (?, ?, ?, ?, ?)
         ''', sample_products)
+        bump_version(db, 'catalog')
         
         print("✅ Đã thêm dữ liệu mẫu")
     
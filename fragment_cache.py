@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+import database
+from catalog_cache import version_clock
+
+# Dung lượng tối đa (byte) của các đoạn HTML đã render giữ trong bộ nhớ
+FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+
+# Thời gian sống (giây) của một đoạn HTML, kể cả khi phiên bản danh mục chưa đổi
+FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+
+
+class FragmentCache:
+    """Cache LRU cho đoạn HTML đã render, có TTL và giới hạn dung lượng"""
+    
+    def __init__(self, max_bytes=FRAGMENT_CACHE_MAX_BYTES, ttl=FRAGMENT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def get(self, key):
+        """Lấy đoạn HTML còn hạn, None nếu không có"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+    
+    def set(self, key, value):
+        """Lưu đoạn HTML, bỏ các đoạn ít dùng nhất khi vượt dung lượng"""
+        size = len(key) + len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+    
+    def _pop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self):
+        """Lấy thống kê hit/miss và dung lượng đang dùng"""
+        stats = dict(self.stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0
+        stats['entries'] = len(self._entries)
+        stats['bytes'] = self._bytes
+        return stats
+
+
+def catalog_version():
+    """Phiên bản danh mục hiện tại (kèm đường dẫn database) dùng trong khóa cache"""
+    return f"{database.DATABASE}:{version_clock.get('catalog')[0][1]}"
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """Thẻ {% cache key1, key2 %}...{% endcache %}: chỉ render lại khi danh mục đổi hoặc hết TTL.
+    
+    Khóa gồm tên template, dòng của thẻ, các key truyền vào và phiên bản danh mục.
+    Không đặt nội dung riêng từng người dùng (giỏ hàng, session) bên trong thẻ.
+    """
+    tags = {'cache'}
+    
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=fragment_cache, fragment_cache_version=catalog_version)
+    
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        keys = []
+        while parser.stream.current.type != 'block_end':
+            if keys:
+                parser.stream.expect('comma')
+            keys.append(parser.parse_expression())
+        
+        args = [nodes.Const(f'{parser.name}:{lineno}'), nodes.List(keys)]
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+    
+    def _render(self, location, keys, caller):
+        env = self.environment
+        key = f'{location}:{env.fragment_cache_version()}:{keys!r}'
+        value = env.fragment_cache.get(key)
+        if value is None:
+            value = caller()
+            env.fragment_cache.set(key, value)
+        return value
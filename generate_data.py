@@ -0,0 +1,235 @@
+"""
+Sinh dữ liệu lớn (hàng triệu đơn hàng, chi tiết đơn, đánh giá) để thử tải và benchmark
+- Độ phổ biến sản phẩm lệch kiểu Zipf, đơn hàng theo giờ cao điểm trưa/tối và cuối tuần
+- Trạng thái theo tuổi đơn: đơn cũ đã xong/hủy, đơn mới còn chờ/đang xử lý
+- Cùng --seed và --end-date luôn ra cùng dữ liệu
+- Nạp bằng executemany trong transaction lớn với PRAGMA 'bulk_load', xong thì dựng lại bảng tổng hợp
+
+Chạy: python generate_data.py [--orders 1000000] [--reviews 100000] [--days 365] [--seed 42]
+                              [--end-date 2026-01-01] [--database food_ordering.db]
+Nên dừng server trước khi chạy (script cần ghi độc quyền).
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+import sqlite3
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import database
+from database import apply_pragmas, attach_archive, bump_version, rebuild_order_rollups, rebuild_rating_stats
+
+SURNAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Hoàng', 'Minh', 'Ngọc', 'Thanh', 'Quốc', 'Thu', 'Gia', 'Hữu']
+GIVEN_NAMES = ['An', 'Bình', 'Cường', 'Dung', 'Em', 'Phương', 'Giang', 'Hà', 'Hùng', 'Linh',
+               'Minh', 'Nga', 'Oanh', 'Phúc', 'Quân', 'Sơn', 'Tâm', 'Uyên', 'Vy', 'Yến']
+STREETS = ['Nguyễn Huệ', 'Lê Lợi', 'Hai Bà Trưng', 'Điện Biên Phủ', 'Võ Văn Tần', 'Cách Mạng Tháng 8',
+           'Nguyễn Thị Minh Khai', 'Pasteur', 'Lý Tự Trọng', 'Trần Hưng Đạo']
+DISTRICTS = ['Q1', 'Q3', 'Q5', 'Q10', 'Bình Thạnh', 'Phú Nhuận', 'Tân Bình', 'Gò Vấp', 'Thủ Đức']
+COMMENTS = {
+    5: ['Món ăn rất ngon, đúng khẩu vị!', 'Tuyệt vời! Sẽ quay lại.', 'Giao nhanh, đồ ăn nóng hổi.'],
+    4: ['Ngon, giá hợp lý.', 'Khá ổn, phần hơi ít.', 'Chất lượng tốt.'],
+    3: ['Bình thường.', 'Tạm được, giá hơi cao.', ''],
+    2: ['Không như kỳ vọng.', 'Giao hơi chậm, đồ ăn nguội.'],
+    1: ['Rất tệ.', 'Thất vọng, sẽ không đặt lại.'],
+}
+
+# Tỉ trọng đơn theo giờ trong ngày: cao điểm trưa 11-13h và tối 18-20h
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.4, 1.5, 3, 3.5, 3, 4, 9, 10, 7, 3.5, 3, 4, 7, 10, 9, 6, 4, 2.5, 1.5]
+
+# Số món và số lượng mỗi món
+ITEM_COUNT_WEIGHTS = [35, 30, 18, 10, 7]
+QUANTITY_WEIGHTS = [70, 22, 8]
+
+def cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+def pick(rng, cum_weights):
+    """Chọn chỉ số theo trọng số cộng dồn (nhanh hơn rng.choices cho từng lần)"""
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+def generate_timestamps(rng, count, days, end):
+    """Sinh thời điểm đặt hàng (giây trước `end`), tăng dần theo ngày, trọng số giờ và cuối tuần, sắp xếp tăng dần"""
+    day_weights = []
+    for day in range(days):
+        date = end - timedelta(days=days - day)
+        growth = 0.6 + 0.4 * day / max(days - 1, 1)
+        weekend = 1.25 if date.weekday() >= 5 else 1.0
+        day_weights.append(growth * weekend)
+    day_cum = cumulative(day_weights)
+    hour_cum = cumulative(HOUR_WEIGHTS)
+    
+    total_seconds = days * 86400
+    offsets = array('d')
+    for _ in range(count):
+        day = pick(rng, day_cum)
+        hour = pick(rng, hour_cum)
+        offsets.append(day * 86400 + hour * 3600 + rng.random() * 3600)
+    offsets = array('d', sorted(offsets))
+    return offsets, end - timedelta(seconds=total_seconds)
+
+def pick_status(rng, age_seconds):
+    """Trạng thái theo tuổi đơn hàng"""
+    if age_seconds < 3600:
+        return rng.choice(['pending', 'pending', 'processing', 'processing', 'completed'])
+    if age_seconds < 86400:
+        return rng.choice(['processing', 'completed', 'completed', 'completed', 'cancelled'])
+    return 'cancelled' if rng.random() < 0.1 else 'completed'
+
+def customer(rng):
+    name = f"{rng.choice(SURNAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+    phone = f"09{rng.randrange(10**8):08d}"
+    address = f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(DISTRICTS)}, TP.HCM"
+    return name, phone, address
+
+def generate(conn, orders, reviews, days, seed, end, batch_size):
+    rng = random.Random(seed)
+    
+    products = conn.execute('SELECT id, price FROM products WHERE is_available = 1 ORDER BY id').fetchall()
+    if not products:
+        raise SystemExit("❌ Không có sản phẩm nào, hãy chạy init_db trước")
+    
+    # Độ phổ biến lệch kiểu Zipf: sản phẩm hạng r có trọng số 1/r^1.1 (thứ hạng xáo theo seed)
+    ranked = list(products)
+    rng.shuffle(ranked)
+    product_cum = cumulative([1 / (rank + 1) ** 1.1 for rank in range(len(ranked))])
+    # Mỗi sản phẩm có chất lượng riêng quyết định điểm đánh giá trung bình
+    quality = {row['id']: rng.uniform(3.2, 4.8) for row in ranked}
+    
+    item_cum = cumulative(ITEM_COUNT_WEIGHTS)
+    quantity_cum = cumulative(QUANTITY_WEIGHTS)
+    
+    print(f"🕒 Đang sinh {orders:,} mốc thời gian trong {days} ngày...")
+    offsets, start = generate_timestamps(rng, orders, days, end)
+    total_seconds = days * 86400
+    
+    # ID tiếp theo theo sqlite_sequence: không trùng ID đơn đã chuyển sang file lưu trữ
+    first_id, first_item_id = (
+        conn.execute(
+            f'''SELECT MAX(COALESCE((SELECT MAX(id) FROM main.{table}), 0),
+                          COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = '{table}'), 0)) + 1'''
+        ).fetchone()[0]
+        for table in ('orders', 'order_items')
+    )
+    
+    print(f"📦 Đang nạp {orders:,} đơn hàng (mỗi transaction {batch_size:,} đơn)...")
+    started = time.perf_counter()
+    item_id = first_item_id
+    for batch_start in range(0, orders, batch_size):
+        order_rows = []
+        item_rows = []
+        for index in range(batch_start, min(batch_start + batch_size, orders)):
+            order_id = first_id + index
+            offset = offsets[index]
+            lines = {}
+            for _ in range(pick(rng, item_cum) + 1):
+                product = ranked[pick(rng, product_cum)]
+                lines[product['id']] = (product['price'], pick(rng, quantity_cum) + 1)
+            total = 0
+            for product_id, (price, quantity) in lines.items():
+                item_rows.append((item_id, order_id, product_id, quantity, price))
+                item_id += 1
+                total += price * quantity
+            
+            created_at = (start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+            order_rows.append((order_id, *customer(rng), total,
+                               pick_status(rng, total_seconds - offset), created_at))
+        
+        conn.execute('BEGIN')
+        conn.executemany(
+            '''INSERT INTO orders (id, customer_name, customer_phone, customer_address, total_amount, status, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            order_rows
+        )
+        conn.executemany(
+            '''INSERT INTO order_items (id, order_id, product_id, quantity, price)
+               VALUES (?, ?, ?, ?, ?)''',
+            item_rows
+        )
+        conn.commit()
+        done = min(batch_start + batch_size, orders)
+        print(f"   {done:>12,} đơn | {item_id - first_item_id:>12,} dòng chi tiết | "
+              f"{done / (time.perf_counter() - started):>9,.0f} đơn/giây")
+    
+    if reviews:
+        print(f"⭐ Đang nạp {reviews:,} đánh giá...")
+        review_rows = []
+        conn.execute('BEGIN')
+        for _ in range(reviews):
+            index = rng.randrange(orders) if orders else None
+            product = ranked[pick(rng, product_cum)]
+            rating = min(5, max(1, round(rng.gauss(quality[product['id']], 0.9))))
+            if index is None:
+                created = end - timedelta(seconds=rng.random() * total_seconds)
+                order_id = None
+            else:
+                # Đánh giá sau khi đặt hàng vài giờ tới vài ngày, không vượt quá end
+                review_offset = min(offsets[index] + rng.uniform(1800, 3 * 86400), total_seconds)
+                created = start + timedelta(seconds=review_offset)
+                order_id = first_id + index
+            review_rows.append((product['id'], order_id, ' '.join(customer(rng)[0].split()[::2]),
+                                rating, rng.choice(COMMENTS[rating]), created.strftime('%Y-%m-%d %H:%M:%S')))
+            if len(review_rows) >= batch_size:
+                conn.executemany(
+                    '''INSERT INTO reviews (product_id, order_id, customer_name, rating, comment, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    review_rows
+                )
+                review_rows = []
+        if review_rows:
+            conn.executemany(
+                '''INSERT INTO reviews (product_id, order_id, customer_name, rating, comment, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                review_rows
+            )
+        conn.commit()
+    
+    print("🔄 Đang dựng lại bảng tổng hợp đơn hàng và thống kê đánh giá...")
+    conn.execute('BEGIN')
+    rebuild_order_rollups(conn)
+    rebuild_rating_stats(conn)
+    bump_version(conn, 'orders')
+    bump_version(conn, 'reviews')
+    conn.commit()
+    conn.execute('ANALYZE')
+    print(f"✅ Xong sau {time.perf_counter() - started:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Sinh dữ liệu lớn để thử tải')
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--reviews', type=int, default=None, help='Mặc định bằng 10%% số đơn')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', help='Ngày kết thúc YYYY-MM-DD (mặc định hôm nay, cố định để dữ liệu giống hệt)')
+    parser.add_argument('--batch', type=int, default=50000, help='Số đơn mỗi transaction')
+    parser.add_argument('--database', default=database.DATABASE)
+    args = parser.parse_args()
+    
+    reviews = args.orders // 10 if args.reviews is None else args.reviews
+    end = datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date else \
+        datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    
+    # Tạo schema/migration và sản phẩm mẫu bằng đường đi bình thường
+    from app import app
+    database.DATABASE = args.database
+    with app.app_context():
+        database.init_db()
+    database.get_pool().close()
+    
+    conn = sqlite3.connect(args.database, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, 'bulk_load')
+    # Dựng lại bảng tổng hợp cần cả đơn đã lưu trữ
+    attach_archive(conn, args.database)
+    try:
+        generate(conn, args.orders, reviews, args.days, args.seed, end, args.batch)
+    finally:
+        # Trả file về chế độ WAL cho server
+        apply_pragmas(conn, 'default')
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import time
+from email.utils import formatdate
+from functools import wraps
+from flask import request, session, make_response
+from catalog_cache import version_clock
+
+# Thời gian (giây) proxy/CDN được dùng lại response JSON công khai mà không hỏi lại server
+SHARED_MAX_AGE = int(os.environ.get('HTTP_SHARED_MAX_AGE', 10))
+
+
+def cart_token():
+    """Trạng thái giỏ hàng trong cookie (cart_id + số lần sửa), dùng cho ETag trang HTML"""
+    return f"{session.get('cart_id', '')}.{session.get('cart_rev', 0)}"
+
+
+def touch_cart():
+    """Đánh dấu giỏ hàng đã đổi để ETag của các trang HTML thay đổi theo"""
+    session['cart_rev'] = session.get('cart_rev', 0) + 1
+
+
+def conditional(*names, per_cart=False):
+    """Decorator gắn ETag/Last-Modified theo phiên bản dữ liệu và trả 304 khi client đã có bản mới nhất.
+    
+    names: các phiên bản trong bảng cache_versions mà response phụ thuộc ('catalog', 'reviews', 'orders').
+    per_cart: trang HTML có badge giỏ hàng, ETag kèm trạng thái giỏ và chỉ cho cache riêng (private).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            versions = version_clock.get(*names)
+            tag = '-'.join(f'{name}{version}' for name, version, _ in versions)
+            if per_cart:
+                tag += '-' + hashlib.md5(cart_token().encode()).hexdigest()[:12]
+            
+            # Trang có giỏ hàng thay đổi theo cookie nên không dùng Last-Modified.
+            # Last-Modified chỉ chính xác đến giây: lấy giây kế tiếp sau lần ghi cuối và chỉ gửi khi giây đó
+            # đã qua, để mọi lần ghi sau response này đều có Last-Modified lớn hơn (không trả 304 cũ)
+            updated = [updated_at for _, _, updated_at in versions if updated_at]
+            last_modified = int(max(updated)) + 1 if updated and not per_cart else None
+            if last_modified and time.time() < last_modified:
+                last_modified = None
+            
+            # Client đã có bản mới nhất: trả 304, không render template, không truy vấn DB
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(tag)
+            elif last_modified and request.if_modified_since:
+                not_modified = request.if_modified_since.timestamp() >= last_modified
+            else:
+                not_modified = False
+            
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(tag, weak=True)
+            if last_modified:
+                response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+            if per_cart:
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+            else:
+                response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={SHARED_MAX_AGE}'
+            return response
+        return decorated_function
+    return decorator
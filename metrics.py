@@ -0,0 +1,404 @@
+"""
+Metrics dạng Prometheus cho cả 2 app, gộp đúng khi chạy nhiều worker (run.py --workers N)
+- Mỗi tiến trình ghi giá trị vào file mmap riêng trong METRICS_DIR (pid_<pid>.db)
+- /metrics đọc tất cả file và cộng lại; gauge chỉ tính tiến trình còn sống. Route chỉ có ở app admin,
+  cần đăng nhập admin hoặc header Authorization: Bearer <METRICS_TOKEN> (cho Prometheus)
+- Ghi metric chỉ là tra dict + struct.pack_into dưới một lock ngắn, không có syscall
+- /metrics/queries (cùng cách xác thực) trả JSON histogram theo câu SQL và slow-query log kèm
+  EXPLAIN QUERY PLAN (query_trace.query_stats), mỗi tiến trình chép ra queries_<pid>.json
+"""
+
+import hmac
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from flask import Response, g, jsonify, request
+from query_trace import SLOW_QUERY_KEEP, query_stats
+
+# Thư mục chứa file metrics của các tiến trình (xóa khi khởi động run.py)
+METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'foodorder-metrics')
+
+# Token cho Prometheus gọi /metrics không cần đăng nhập (không đặt thì chỉ admin đã đăng nhập xem được)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Chu kỳ (giây) chép thống kê cache trong bộ nhớ vào file metrics
+CACHE_SYNC_INTERVAL = 1.0
+
+# name: (loại, mô tả, các mốc histogram)
+METRICS = {
+    'http_requests_total': ('counter', 'Số request HTTP theo app, endpoint và mã trạng thái', None),
+    'http_request_duration_seconds': ('histogram', 'Thời gian xử lý request theo endpoint',
+                                      (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'http_requests_in_flight': ('gauge', 'Số request đang xử lý', None),
+    'db_queries_total': ('counter', 'Số truy vấn SQLite', None),
+    'db_query_seconds_total': ('counter', 'Tổng thời gian truy vấn SQLite (giây)', None),
+    'cache_hits_total': ('counter', 'Số lần trúng cache', None),
+    'cache_misses_total': ('counter', 'Số lần trượt cache', None),
+    'orders_created_total': ('counter', 'Số đơn hàng đã tạo', None),
+    'cart_size_lines': ('histogram', 'Số món khác nhau trong giỏ sau khi thêm', (1, 2, 3, 5, 8, 13, 21, 34)),
+    'http_compressed_responses_total': ('counter', 'Số response đã nén theo app và encoding', None),
+    'http_compression_bytes_in_total': ('counter', 'Số byte response trước khi nén', None),
+    'http_compression_bytes_out_total': ('counter', 'Số byte response sau khi nén', None),
+    'http_compression_bytes_saved_total': ('counter', 'Số byte tiết kiệm được nhờ nén', None),
+    'http_compression_skipped_total': ('counter', 'Số response không nén theo lý do', None),
+}
+
+_HEADER = struct.Struct('i4x')
+_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+
+class MmapValues:
+    """File mmap chứa các cặp (khóa, số thực) của một tiến trình.
+    
+    Mỗi entry: độ dài khóa (int32), khóa utf-8 đệm tới bội số 8, giá trị (double).
+    8 byte đầu file lưu số byte đã dùng.
+    """
+    
+    def __init__(self, path, initial_size=64 * 1024):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < initial_size:
+            self._file.truncate(initial_size)
+            size = initial_size
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._positions = {key: pos for key, _, pos in self._entries(self._map, self._used)}
+    
+    @staticmethod
+    def _entries(data, used):
+        pos = _HEADER.size
+        while pos < used:
+            length = _LENGTH.unpack_from(data, pos)[0]
+            pos += _LENGTH.size
+            key = bytes(data[pos:pos + length]).decode('utf-8')
+            pos += length + (-(_LENGTH.size + length) % 8)
+            yield key, _VALUE.unpack_from(data, pos)[0], pos
+            pos += _VALUE.size
+    
+    def _position(self, key):
+        pos = self._positions.get(key)
+        if pos is None:
+            encoded = key.encode('utf-8')
+            padding = -(_LENGTH.size + len(encoded)) % 8
+            size = _LENGTH.size + len(encoded) + padding + _VALUE.size
+            while self._used + size > self._capacity:
+                self._grow()
+            _LENGTH.pack_into(self._map, self._used, len(encoded))
+            self._map[self._used + _LENGTH.size:self._used + _LENGTH.size + len(encoded)] = encoded
+            pos = self._used + size - _VALUE.size
+            _VALUE.pack_into(self._map, pos, 0.0)
+            self._used += size
+            _HEADER.pack_into(self._map, 0, self._used)
+            self._positions[key] = pos
+        return pos
+    
+    def _grow(self):
+        self._map.close()
+        self._capacity *= 2
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+    
+    def add(self, key, amount):
+        pos = self._position(key)
+        _VALUE.pack_into(self._map, pos, _VALUE.unpack_from(self._map, pos)[0] + amount)
+    
+    def set(self, key, value):
+        _VALUE.pack_into(self._map, self._position(key), value)
+    
+    @classmethod
+    def read(cls, path):
+        """Đọc toàn bộ (khóa, giá trị) của một file"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            return []
+        used = _HEADER.unpack_from(data, 0)[0]
+        return [(key, value) for key, value, _ in cls._entries(data, used)]
+
+
+class MetricsWriter:
+    """Ghi metric của tiến trình hiện tại (tạo lại sau khi fork)"""
+    
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.pid = None
+        self._values = None
+        self._lock = threading.Lock()
+    
+    def _store(self):
+        if self.pid != os.getpid():
+            with self._lock:
+                if self.pid != os.getpid():
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._values = MmapValues(os.path.join(self.directory, f'pid_{os.getpid()}.db'))
+                    self.pid = os.getpid()
+        return self._values
+    
+    def add(self, key, amount=1):
+        store = self._store()
+        with self._lock:
+            store.add(key, amount)
+    
+    def set(self, key, value):
+        store = self._store()
+        with self._lock:
+            store.set(key, value)
+
+
+_writer = MetricsWriter()
+
+
+_keys = {}
+
+
+def _key(name, labels, suffix=''):
+    """Khóa lưu trong file (nhớ sẵn để không phải json.dumps mỗi lần ghi)"""
+    cache_key = (name, suffix) + tuple(labels.items())
+    key = _keys.get(cache_key)
+    if key is None:
+        key = _keys[cache_key] = json.dumps([name + suffix, sorted(labels.items())], ensure_ascii=False)
+    return key
+
+
+def inc(name, amount=1, **labels):
+    """Tăng counter/gauge"""
+    _writer.add(_key(name, labels), amount)
+
+
+def set_value(name, value, **labels):
+    """Đặt giá trị tuyệt đối của tiến trình này (cộng dồn giữa các tiến trình khi xuất)"""
+    _writer.set(_key(name, labels), value)
+
+
+def observe(name, value, **labels):
+    """Ghi một giá trị vào histogram"""
+    buckets = METRICS[name][2]
+    le = next((bound for bound in buckets if value <= bound), '+Inf')
+    _writer.add(_key(name, dict(labels, le=str(le)), '_bucket'), 1)
+    _writer.add(_key(name, labels, '_sum'), value)
+    _writer.add(_key(name, labels, '_count'), 1)
+
+
+def clear_dir(directory=METRICS_DIR):
+    """Xóa file metrics cũ (gọi một lần khi khởi động, trước khi fork worker)"""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if (name.startswith('pid_') and name.endswith('.db')) or \
+                (name.startswith('queries_') and name.endswith('.json')):
+            os.remove(os.path.join(directory, name))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory=METRICS_DIR):
+    """Cộng giá trị của mọi tiến trình: {(tên mẫu, labels): giá trị}"""
+    samples = {}
+    if not os.path.isdir(directory):
+        return samples
+    for filename in os.listdir(directory):
+        if not (filename.startswith('pid_') and filename.endswith('.db')):
+            continue
+        alive = _pid_alive(int(filename[4:-3]))
+        for key, value in MmapValues.read(os.path.join(directory, filename)):
+            sample, labels = json.loads(key)
+            labels = tuple(tuple(pair) for pair in labels)
+            if METRICS.get(sample, (None,))[0] == 'gauge' and not alive:
+                continue
+            samples[(sample, labels)] = samples.get((sample, labels), 0) + value
+    return samples
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def generate_latest(directory=METRICS_DIR):
+    """Xuất metrics theo định dạng text exposition của Prometheus"""
+    samples = collect(directory)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            for (sample, labels), value in sorted(samples.items()):
+                if sample == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value:g}')
+            continue
+        
+        # Bucket lưu rời từng khoảng, khi xuất cộng dồn theo le
+        series = sorted({labels for (sample, labels) in samples if sample == name + '_count'})
+        for labels in series:
+            running = 0
+            for bound in list(buckets) + ['+Inf']:
+                le = str(bound)
+                running += samples.get((name + '_bucket', tuple(sorted(labels + (('le', le),)))), 0)
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {running:g}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {samples.get((name + "_sum", labels), 0):g}')
+            lines.append(f'{name}_count{_format_labels(labels)} {samples.get((name + "_count", labels), 0):g}')
+    
+    # Tỉ lệ trúng cache tính từ các counter đã cộng
+    lines.append('# HELP cache_hit_ratio Tỉ lệ trúng cache')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    for (sample, labels), hits in sorted(samples.items()):
+        if sample == 'cache_hits_total':
+            total = hits + samples.get(('cache_misses_total', labels), 0)
+            lines.append(f'cache_hit_ratio{_format_labels(labels)} {hits / total if total else 0:g}')
+    return '\n'.join(lines) + '\n'
+
+
+_last_cache_sync = 0.0
+
+
+def _sync_cache_stats():
+    """Chép thống kê cache (đếm trong bộ nhớ của tiến trình) vào file metrics, tối đa 1 lần/giây"""
+    global _last_cache_sync
+    now = time.monotonic()
+    if now - _last_cache_sync < CACHE_SYNC_INTERVAL:
+        return
+    _last_cache_sync = now
+    
+    from catalog_cache import catalog_cache
+    from fragment_cache import fragment_cache
+    from database import get_pool
+    pool = get_pool().get_stats()
+    for cache, hits, misses in (
+        ('catalog', catalog_cache.stats['hits'], catalog_cache.stats['misses']),
+        ('fragment', fragment_cache.stats['hits'], fragment_cache.stats['misses']),
+        ('db_pool', pool['hits'], pool['misses']),
+    ):
+        set_value('cache_hits_total', hits, cache=cache)
+        set_value('cache_misses_total', misses, cache=cache)
+    write_query_stats()
+
+
+def write_query_stats(directory=METRICS_DIR):
+    """Chép thống kê truy vấn của tiến trình (query_trace.query_stats) ra queries_<pid>.json"""
+    data = {'statements': query_stats.snapshot(), 'slow_queries': list(query_stats.slow_queries.copy())}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'queries_{os.getpid()}.json')
+    tmp = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def collect_queries(directory=METRICS_DIR, top=None):
+    """Gộp thống kê truy vấn của mọi tiến trình: câu SQL theo tổng thời gian giảm dần
+    và các truy vấn chậm mới nhất"""
+    statements = {}
+    slow_queries = []
+    filenames = os.listdir(directory) if os.path.isdir(directory) else []
+    for filename in filenames:
+        if not (filename.startswith('queries_') and filename.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for entry in data['statements']:
+            total = statements.get(entry['sql'])
+            if total is None:
+                statements[entry['sql']] = dict(entry, buckets=dict(entry['buckets']))
+                continue
+            for field in ('count', 'total_ms', 'rows'):
+                total[field] += entry[field]
+            total['max_ms'] = max(total['max_ms'], entry['max_ms'])
+            for le, count in entry['buckets'].items():
+                total['buckets'][le] = total['buckets'].get(le, 0) + count
+        slow_queries.extend(data['slow_queries'])
+    
+    result = sorted(statements.values(), key=lambda entry: entry['total_ms'], reverse=True)[:top]
+    for entry in result:
+        entry['avg_ms'] = round(entry['total_ms'] / entry['count'], 3)
+        entry['total_ms'] = round(entry['total_ms'], 3)
+        entry['max_ms'] = round(entry['max_ms'], 3)
+    slow_queries.sort(key=lambda entry: entry['at'], reverse=True)
+    return {'statements': result, 'slow_queries': slow_queries[:SLOW_QUERY_KEEP]}
+
+
+def init_app(app, name):
+    """Gắn đo request cho app (route /metrics đăng ký riêng bằng add_endpoint)"""
+    
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        inc('http_requests_in_flight', app=name)
+    
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        observe('http_request_duration_seconds', time.perf_counter() - start, app=name, endpoint=endpoint)
+        inc('http_requests_total', app=name, endpoint=endpoint, status=str(response.status_code))
+        
+        trace = g.get('db_trace')
+        if trace is not None:
+            trace.finish()
+            inc('db_queries_total', trace.count, app=name)
+            inc('db_query_seconds_total', trace.total_time, app=name)
+        _sync_cache_stats()
+        return response
+    
+    @app.teardown_request
+    def _end_request(e=None):
+        inc('http_requests_in_flight', -1, app=name)
+
+
+def _token_authorized():
+    if not METRICS_TOKEN:
+        return False
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+
+def add_endpoint(app, auth):
+    """Đăng ký route /metrics (số liệu gộp của mọi worker cả 2 app), bảo vệ bằng decorator `auth`
+    (vd. login_required của admin); request có Bearer METRICS_TOKEN đúng thì không cần đăng nhập"""
+    
+    def metrics_response():
+        return Response(generate_latest(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    
+    protected = auth(metrics_response)
+    
+    @app.route('/metrics')
+    def metrics():
+        """Metrics dạng text cho Prometheus"""
+        if _token_authorized():
+            return metrics_response()
+        return protected()
+    
+    def queries_response():
+        # Tiến trình đang trả lời chép số liệu mới nhất, các worker khác chép sau mỗi request (tối đa 1 lần/giây)
+        write_query_stats()
+        return jsonify(collect_queries(top=request.args.get('top', 50, type=int)))
+    
+    protected_queries = auth(queries_response)
+    
+    @app.route('/metrics/queries')
+    def metrics_queries():
+        """Histogram thời gian theo câu SQL và slow-query log của mọi worker (?top=N câu tốn thời gian nhất)"""
+        if _token_authorized():
+            return queries_response()
+        return protected_queries()
@@ -1,42 +1,117 @@
-from database import get_db
+import re
+import time
+import unicodedata
+from database import (get_db, has_fts5, bump_version, apply_order_rollup, rebuild_order_rollups,
+                      log_change, apply_rating_stats, rebuild_rating_stats, require_no_transaction, STAR_COLUMNS)
+from catalog_cache import catalog_cache, version_clock
+import metrics
+
+# Các trường JSON của sự kiện đơn hàng trong change_log (xem change_feed.py)
+ORDER_EVENT_FIELDS = ("'id', o.id, 'customer_name', o.customer_name, 'customer_phone', o.customer_phone, "
+                      "'total_amount', o.total_amount, 'status', o.status, 'created_at', o.created_at")
+
+# Các cột của một đánh giá trả về cho trang sản phẩm và API
+REVIEW_FIELDS = ('id', 'product_id', 'order_id', 'customer_name', 'rating', 'comment', 'created_at')
+
+def encode_cursor(row):
+    """Tạo cursor phân trang từ (created_at, id) của dòng cuối trang"""
+    return f"{row['created_at']}|{row['id']}"
+
+def decode_cursor(cursor):
+    """Tách cursor thành (created_at, id), báo ValueError nếu không hợp lệ"""
+    created_at, sep, row_id = cursor.rpartition('|')
+    if not sep:
+        raise ValueError('Cursor không hợp lệ')
+    return created_at, int(row_id)
+
+def split_page(rows, limit):
+    """Tách kết quả lấy dư 1 dòng thành (trang hiện tại, cursor trang sau)"""
+    rows = list(rows)
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+def _keyset(alias, after, limit, conditions=(), params=()):
+    """Tạo WHERE/ORDER BY/LIMIT cho phân trang keyset theo (created_at, id) giảm dần"""
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        conditions.append(f'({alias}.created_at, {alias}.id) < (?, ?)')
+        params.extend(decode_cursor(after))
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+    params.append(-1 if limit is None else limit)
+    return f'{where}ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT ?', params
+
+def _fts_query(keyword):
+    """Chuyển từ khóa người dùng thành câu truy vấn FTS5 (khớp tiền tố từng từ)"""
+    keyword = keyword.replace('đ', 'd').replace('Đ', 'D')
+    words = re.findall(r'\w+', keyword)
+    return ' '.join(f'"{word}"*' for word in words)
+
+def fold_words(text):
+    """Tách từ, bỏ dấu và đ→d, chữ thường (như tokenizer unicode61 remove_diacritics của FTS5)"""
+    text = unicodedata.normalize('NFD', (text or '').replace('đ', 'd').replace('Đ', 'D'))
+    return re.findall(r'\w+', ''.join(ch for ch in text if not unicodedata.combining(ch)).lower())
+
+# Trọng số cột khi xếp hạng, giống bm25(products_fts, 10.0, 1.0, 3.0)
+SEARCH_WEIGHTS = (('name', 10.0), ('category', 3.0), ('description', 1.0))
+
+def _search_catalog(products, words):
+    """Tìm khi không có FTS5: mọi từ phải là tiền tố của một từ trong sản phẩm, tên khớp xếp trước"""
+    if not words:
+        return []
+    results = []
+    for product in products:
+        columns = [(weight, fold_words(product[column])) for column, weight in SEARCH_WEIGHTS]
+        score = 0.0
+        for word in words:
+            weight = max((weight for weight, tokens in columns
+                          if any(token.startswith(word) for token in tokens)), default=None)
+            if weight is None:
+                break
+            score += weight
+        else:
+            results.append((score, product))
+    results.sort(key=lambda item: item[0], reverse=True)
+    return [product for _, product in results]
 
 class Product:
     """Model cho sản phẩm"""
     
     @staticmethod
-    def get_all():
-        """Lấy tất cả sản phẩm còn bán"""
+    def get_all(after=None, limit=None):
+        """Lấy sản phẩm còn bán, mới nhất trước (phân trang theo cursor)"""
+        products = catalog_cache.get()['available']
+        start = 0
+        if after:
+            # Danh sách đã sắp xếp giảm dần theo (created_at, id)
+            key = decode_cursor(after)
+            while start < len(products) and (products[start]['created_at'], products[start]['id']) >= key:
+                start += 1
+        end = None if limit is None else start + limit
+        return products[start:end]
+    
+    @staticmethod
+    def count():
+        """Đếm sản phẩm còn bán (không nạp danh mục)"""
         db = get_db()
-        return db.execute(
-            'SELECT * FROM products WHERE is_available = 1 ORDER BY created_at DESC'
-        ).fetchall()
+        return db.execute('SELECT COUNT(*) FROM products WHERE is_available = 1').fetchone()[0]
     
     @staticmethod
     def get_by_id(product_id):
         """Lấy sản phẩm theo ID"""
-        db = get_db()
-        return db.execute(
-            'SELECT * FROM products WHERE id = ?', 
-            (product_id,)
-        ).fetchone()
+        return catalog_cache.get()['by_id'].get(product_id)
     
     @staticmethod
     def get_by_category(category):
         """Lấy sản phẩm theo danh mục"""
-        db = get_db()
-        return db.execute(
-            'SELECT * FROM products WHERE category = ? AND is_available = 1',
-            (category,)
-        ).fetchall()
+        return list(catalog_cache.get()['by_category'].get(category, []))
     
     @staticmethod
     def get_categories():
         """Lấy danh sách các danh mục"""
-        db = get_db()
-        result = db.execute(
-            'SELECT DISTINCT category FROM products WHERE is_available = 1'
-        ).fetchall()
-        return [row['category'] for row in result]
+        return list(catalog_cache.get()['categories'])
     
     @staticmethod
     def create(name, description, price, image_url, category):
@@ -47,7 +122,10 @@ class Product:
                VALUES (?, ?, ?, ?, ?)''',
             (name, description, price, image_url, category)
         )
+        bump_version(db, 'catalog')
         db.commit()
+        catalog_cache.invalidate()
+        version_clock.invalidate()
         return cursor.lastrowid
     
     @staticmethod
@@ -60,7 +138,10 @@ class Product:
                WHERE id=?''',
             (name, description, price, image_url, category, product_id)
         )
+        bump_version(db, 'catalog')
         db.commit()
+        catalog_cache.invalidate()
+        version_clock.invalidate()
     
     @staticmethod
     def delete(product_id):
@@ -70,18 +151,29 @@ class Product:
             'UPDATE products SET is_available=0 WHERE id=?',
             (product_id,)
         )
+        bump_version(db, 'catalog')
         db.commit()
+        catalog_cache.invalidate()
+        version_clock.invalidate()
     
     @staticmethod
     def search(keyword):
-        """Tìm kiếm sản phẩm"""
+        """Tìm kiếm sản phẩm (không phân biệt dấu, xếp hạng theo bm25)"""
         db = get_db()
-        keyword = f'%{keyword}%'
-        return db.execute(
-            '''SELECT * FROM products 
-               WHERE (name LIKE ? OR description LIKE ?) AND is_available = 1''',
-            (keyword, keyword)
-        ).fetchall()
+        query = _fts_query(keyword)
+        
+        if query and has_fts5(db):
+            # Tên sản phẩm quan trọng hơn danh mục và mô tả
+            return db.execute(
+                '''SELECT p.* FROM products_fts 
+                   JOIN products p ON p.id = products_fts.rowid 
+                   WHERE products_fts MATCH ? AND p.is_available = 1 
+                   ORDER BY bm25(products_fts, 10.0, 1.0, 3.0)''',
+                (query,)
+            ).fetchall()
+        
+        # Không có FTS5: LIKE không bỏ được dấu ("pho" không khớp "Phở") nên so khớp trên danh mục đã cache
+        return _search_catalog(catalog_cache.get()['available'], fold_words(keyword))
 
 
 class Order:
@@ -89,61 +181,137 @@ class Order:
     
     @staticmethod
     def create(customer_name, customer_phone, customer_address, cart_items):
-        """Tạo đơn hàng mới"""
-        db = get_db()
+        """Tạo đơn hàng mới (giá lấy từ database, không dùng giá trong giỏ hàng)"""
+        return Order.create_many([{
+            'customer_name': customer_name,
+            'customer_phone': customer_phone,
+            'customer_address': customer_address,
+            'items': cart_items
+        }])[0]
+    
+    @staticmethod
+    def _get_prices(db, product_ids, chunk_size=500):
+        """Lấy giá hiện tại của các sản phẩm còn bán (dict theo product_id)"""
+        product_ids = list(product_ids)
+        prices = {}
+        for i in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[i:i + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            result = db.execute(
+                f'SELECT id, price FROM products WHERE is_available = 1 AND id IN ({placeholders})',
+                chunk
+            ).fetchall()
+            prices.update((row['id'], row['price']) for row in result)
+        return prices
+    
+    @staticmethod
+    def create_many(orders):
+        """Tạo nhiều đơn hàng trong một transaction (dùng cho checkout, import, replay).
         
-        # Tính tổng tiền
-        total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
+        Mỗi đơn là dict gồm customer_name, customer_phone, customer_address,
+        items (list dict có id, quantity) và tùy chọn status, created_at.
+        Trả về danh sách ID đơn hàng theo đúng thứ tự.
+        """
+        db = get_db()
+        orders = list(orders)
+        if not orders:
+            return []
         
-        # Tạo đơn hàng
-        cursor = db.execute(
-            '''INSERT INTO orders (customer_name, customer_phone, customer_address, total_amount) 
-               VALUES (?, ?, ?, ?)''',
-            (customer_name, customer_phone, customer_address, total_amount)
-        )
-        order_id = cursor.lastrowid
+        require_no_transaction(db, 'Order.create_many')
         
-        # Thêm chi tiết đơn hàng
-        for item in cart_items:
-            db.execute(
-                '''INSERT INTO order_items (order_id, product_id, quantity, price) 
+        # Khóa ghi ngay từ đầu để giá đọc được và đơn ghi vào nhất quán
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            product_ids = {int(item['id']) for order in orders for item in order['items']}
+            prices = Order._get_prices(db, product_ids)
+            
+            order_ids = []
+            order_items = []
+            for order in orders:
+                if not order['items']:
+                    raise ValueError('Đơn hàng không có sản phẩm nào')
+                
+                lines = []
+                for item in order['items']:
+                    product_id = int(item['id'])
+                    quantity = int(item['quantity'])
+                    if product_id not in prices:
+                        raise ValueError(f'Sản phẩm #{product_id} không tồn tại hoặc đã ngừng bán')
+                    if quantity <= 0:
+                        raise ValueError('Số lượng không hợp lệ')
+                    lines.append((product_id, quantity, prices[product_id]))
+                
+                # Tính tổng tiền
+                total_amount = sum(price * quantity for _, quantity, price in lines)
+                
+                # Tạo đơn hàng
+                cursor = db.execute(
+                    '''INSERT INTO orders (customer_name, customer_phone, customer_address, total_amount,
+                                           status, created_at)
+                       VALUES (?, ?, ?, ?, COALESCE(?, 'pending'), COALESCE(?, CURRENT_TIMESTAMP))''',
+                    (order['customer_name'], order['customer_phone'], order['customer_address'],
+                     total_amount, order.get('status'), order.get('created_at'))
+                )
+                order_id = cursor.lastrowid
+                order_ids.append(order_id)
+                order_items.extend((order_id, product_id, quantity, price) for product_id, quantity, price in lines)
+            
+            # Thêm chi tiết của tất cả đơn hàng trong một lần
+            db.executemany(
+                '''INSERT INTO order_items (order_id, product_id, quantity, price)
                    VALUES (?, ?, ?, ?)''',
-                (order_id, item['id'], item['quantity'], item['price'])
+                order_items
             )
+            
+            # Trong transaction ghi, ID đơn hàng vừa tạo là một dải liên tục
+            apply_order_rollup(db, order_ids[0], 1, order_ids[-1])
+            log_change(db, 'order_created',
+                       f'''SELECT json_object({ORDER_EVENT_FIELDS}) AS payload FROM orders o
+                           WHERE o.id BETWEEN ? AND ? ORDER BY o.id''',
+                       (order_ids[0], order_ids[-1]))
+            bump_version(db, 'orders')
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
-        db.commit()
-        return order_id
+        version_clock.invalidate()
+        metrics.inc('orders_created_total', len(order_ids))
+        return order_ids
     
     @staticmethod
-    def get_all():
-        """Lấy tất cả đơn hàng"""
+    def get_all(after=None, limit=None):
+        """Lấy đơn hàng mới nhất trước (phân trang theo cursor)"""
         db = get_db()
+        clause, params = _keyset('o', after, limit)
         return db.execute(
-            '''SELECT o.*, COUNT(oi.id) as item_count 
-               FROM orders o 
-               LEFT JOIN order_items oi ON o.id = oi.order_id 
-               GROUP BY o.id 
-               ORDER BY o.created_at DESC'''
+            f'''SELECT o.*,
+                      (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
+               FROM orders o
+               {clause}''',
+            params
         ).fetchall()
     
     @staticmethod
     def get_by_id(order_id):
         """Lấy đơn hàng theo ID"""
         db = get_db()
-        order = db.execute(
-            'SELECT * FROM orders WHERE id = ?', 
-            (order_id,)
-        ).fetchone()
-        
-        if order:
-            items = db.execute(
-                '''SELECT oi.*, p.name, p.image_url 
-                   FROM order_items oi 
-                   JOIN products p ON oi.product_id = p.id 
-                   WHERE oi.order_id = ?''',
+        # Tìm ở bảng chính trước, không có thì tìm trong file lưu trữ
+        for schema in ('main', 'archive'):
+            order = db.execute(
+                f'SELECT * FROM {schema}.orders WHERE id = ?', 
                 (order_id,)
-            ).fetchall()
-            return order, items
+            ).fetchone()
+            
+            if order:
+                items = db.execute(
+                    f'''SELECT oi.*, p.name, p.image_url 
+                        FROM {schema}.order_items oi 
+                        JOIN products p ON oi.product_id = p.id 
+                        WHERE oi.order_id = ?''',
+                    (order_id,)
+                ).fetchall()
+                return order, items
         
         return None, []
     
@@ -151,24 +319,40 @@ class Order:
     def update_status(order_id, status):
         """Cập nhật trạng thái đơn hàng"""
         db = get_db()
+        old = db.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()
+        if old is None and db.execute('SELECT 1 FROM archive.orders WHERE id = ?', (order_id,)).fetchone():
+            raise ValueError(f'Đơn hàng #{order_id} đã được lưu trữ, không thể đổi trạng thái')
+        # Chuyển đơn hàng sang trạng thái mới trong bảng tổng hợp (cùng transaction)
+        apply_order_rollup(db, order_id, -1)
         db.execute(
             'UPDATE orders SET status = ? WHERE id = ?',
             (status, order_id)
         )
+        apply_order_rollup(db, order_id, 1)
+        if old is not None and old['status'] != status:
+            log_change(db, 'status_changed',
+                       f"SELECT json_object('old_status', ?, {ORDER_EVENT_FIELDS}) AS payload FROM orders o WHERE o.id = ?",
+                       (old['status'], order_id))
+        bump_version(db, 'orders')
         db.commit()
+        version_clock.invalidate()
     
     @staticmethod
-    def get_by_status(status):
-        """Lấy đơn hàng theo trạng thái"""
+    def get_by_status(status, after=None, limit=None):
+        """Lấy đơn hàng theo trạng thái (phân trang theo cursor)"""
         db = get_db()
+        clause, params = _keyset('o', after, limit, ['o.status = ?'], [status])
         return db.execute(
-            'SELECT * FROM orders WHERE status = ? ORDER BY created_at DESC',
-            (status,)
+            f'''SELECT o.*,
+                      (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
+               FROM orders o
+               {clause}''',
+            params
         ).fetchall()
     
     @staticmethod
     def get_statistics():
-        """Lấy thống kê đơn hàng"""
+        """Lấy thống kê đơn hàng (một lần quét bảng tổng hợp theo tháng)"""
         db = get_db()
         stats = {
             'total': 0,
@@ -179,23 +363,20 @@ class Order:
             'revenue': 0
         }
         
-        # Tổng đơn hàng
-        result = db.execute('SELECT COUNT(*) as count FROM orders').fetchone()
-        stats['total'] = result['count']
-        
-        # Đơn hàng theo trạng thái
-        for status in ['pending', 'processing', 'completed', 'cancelled']:
-            result = db.execute(
-                'SELECT COUNT(*) as count FROM orders WHERE status = ?',
-                (status,)
-            ).fetchone()
-            stats[status] = result['count']
-        
-        # Doanh thu (chỉ tính đơn hoàn thành)
+        # Đếm mọi trạng thái có trong bảng và cộng tiền trong cùng một lượt
         result = db.execute(
-            'SELECT SUM(total_amount) as revenue FROM orders WHERE status = "completed"'
-        ).fetchone()
-        stats['revenue'] = result['revenue'] or 0
+            """SELECT status, SUM(order_count) as count, SUM(revenue) as amount
+               FROM order_monthly_rollup 
+               GROUP BY status"""
+        ).fetchall()
+        
+        for row in result:
+            stats['total'] += row['count']
+            # Doanh thu (chỉ tính đơn hoàn thành)
+            if row['status'] == 'completed':
+                stats['revenue'] = row['amount'] or 0
+            if row['status'] not in ('total', 'revenue'):
+                stats[row['status']] = row['count']
         
         return stats
     
@@ -204,30 +385,42 @@ class Order:
         """Lấy số đơn hàng hôm nay"""
         db = get_db()
         result = db.execute(
-            """SELECT COUNT(*) as count FROM orders 
-               WHERE DATE(created_at) = DATE('now', 'localtime')"""
+            """SELECT SUM(order_count) as count FROM order_daily_rollup 
+               WHERE day = DATE('now', 'localtime')"""
         ).fetchone()
-        return result['count'] if result else 0
+        return result['count'] or 0
     
     @staticmethod
     def get_orders_this_week():
         """Lấy số đơn hàng tuần này"""
         db = get_db()
         result = db.execute(
-            """SELECT COUNT(*) as count FROM orders 
-               WHERE DATE(created_at) >= DATE('now', 'localtime', '-7 days')"""
+            """SELECT SUM(order_count) as count FROM order_daily_rollup 
+               WHERE day >= DATE('now', 'localtime', '-7 days')"""
         ).fetchone()
-        return result['count'] if result else 0
+        return result['count'] or 0
     
     @staticmethod
     def get_orders_this_month():
         """Lấy số đơn hàng tháng này"""
         db = get_db()
         result = db.execute(
-            """SELECT COUNT(*) as count FROM orders 
-               WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now', 'localtime')"""
+            """SELECT SUM(order_count) as count FROM order_monthly_rollup 
+               WHERE month = strftime('%Y-%m', 'now', 'localtime')"""
         ).fetchone()
-        return result['count'] if result else 0
+        return result['count'] or 0
+    
+    @staticmethod
+    def get_periods():
+        """Mốc của số đơn hôm nay/tuần này/tháng này (cùng điều kiện với 3 hàm trên),
+        để dashboard trực tiếp biết đơn mới thuộc khoảng nào theo created_at"""
+        db = get_db()
+        row = db.execute(
+            """SELECT DATE('now', 'localtime') as today,
+                      DATE('now', 'localtime', '-7 days') as week,
+                      strftime('%Y-%m', 'now', 'localtime') as month"""
+        ).fetchone()
+        return dict(row)
     
     @staticmethod
     def get_revenue_by_date(days=7):
@@ -244,14 +437,13 @@ class Order:
             dates.append(date)
             revenues[date] = 0
         
-        # Lấy dữ liệu thực từ database
+        # Lấy dữ liệu từ bảng tổng hợp theo ngày
         result = db.execute(
-            """SELECT DATE(created_at) as date, SUM(total_amount) as revenue
-               FROM orders 
+            """SELECT day as date, revenue
+               FROM order_daily_rollup 
                WHERE status = 'completed' 
-               AND DATE(created_at) >= DATE('now', 'localtime', '-' || ? || ' days')
-               GROUP BY DATE(created_at)
-               ORDER BY date ASC""",
+               AND day >= DATE('now', 'localtime', '-' || ? || ' days')
+               ORDER BY day ASC""",
             (days,)
         ).fetchall()
         
@@ -268,8 +460,8 @@ class Order:
         """Lấy số lượng đơn hàng theo trạng thái (dùng cho pie chart)"""
         db = get_db()
         result = db.execute(
-            """SELECT status, COUNT(*) as count 
-               FROM orders 
+            """SELECT status, SUM(order_count) as count 
+               FROM order_monthly_rollup 
                GROUP BY status
                HAVING count > 0"""
         ).fetchall()
@@ -287,13 +479,21 @@ class Order:
     def get_top_products(limit=10):
         """Lấy top sản phẩm bán chạy (dùng cho bar chart)"""
         db = get_db()
+        # Đơn đã lưu trữ lấy từ bảng cộng dồn archive.product_sales thay vì quét lại
         result = db.execute(
-            """SELECT p.name, SUM(oi.quantity) as total_sold, SUM(oi.quantity * oi.price) as revenue
-               FROM order_items oi
-               JOIN products p ON oi.product_id = p.id
-               JOIN orders o ON oi.order_id = o.id
-               WHERE o.status = 'completed'
-               GROUP BY oi.product_id, p.name
+            """SELECT p.name, SUM(s.total_sold) as total_sold, SUM(s.revenue) as revenue
+               FROM (
+                   SELECT oi.product_id, SUM(oi.quantity) as total_sold, SUM(oi.quantity * oi.price) as revenue
+                   FROM main.order_items oi
+                   JOIN main.orders o ON oi.order_id = o.id
+                   WHERE o.status = 'completed'
+                   GROUP BY oi.product_id
+                   UNION ALL
+                   SELECT product_id, total_sold, revenue FROM archive.product_sales
+               ) s
+               JOIN products p ON s.product_id = p.id
+               GROUP BY s.product_id, p.name
+               HAVING total_sold > 0
                ORDER BY total_sold DESC
                LIMIT ?""",
             (limit,)
@@ -310,15 +510,165 @@ class Order:
         """Lấy doanh thu theo tháng"""
         db = get_db()
         result = db.execute(
-            """SELECT strftime('%Y-%m', created_at) as month, SUM(total_amount) as revenue
-               FROM orders 
+            """SELECT substr(day, 1, 7) as month, SUM(revenue) as revenue
+               FROM order_daily_rollup 
                WHERE status = 'completed'
-               AND DATE(created_at) >= DATE('now', '-' || ? || ' months')
-               GROUP BY strftime('%Y-%m', created_at)
+               AND day >= DATE('now', '-' || ? || ' months')
+               GROUP BY substr(day, 1, 7)
                ORDER BY month ASC""",
             (months,)
         ).fetchall()
         return result
+    
+    @staticmethod
+    def iter_export(status=None, date_from=None, date_to=None, batch_size=1000):
+        """Duyệt đơn hàng (kể cả đã lưu trữ) kèm từng dòng chi tiết và tên sản phẩm (cũ trước),
+        đọc từng lô bằng fetchmany.
+        
+        date_from/date_to là chuỗi YYYY-MM-DD (tính cả hai đầu). Thứ tự lấy theo index
+        (status, created_at) / (created_at) nên SQLite không phải sắp xếp, bộ nhớ không tăng theo số dòng.
+        """
+        db = get_db()
+        conditions = []
+        params = []
+        if status:
+            conditions.append('o.status = ?')
+            params.append(status)
+        if date_from:
+            conditions.append('o.created_at >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append("o.created_at < DATE(?, '+1 day')")
+            params.append(date_to)
+        # Đơn có ở cả hai nơi (lưu trữ bị ngắt giữa chừng) chỉ lấy bản trong bảng chính
+        archive_conditions = conditions + ['NOT EXISTS (SELECT 1 FROM main.orders h WHERE h.id = o.id)']
+        select = '''SELECT o.id as order_id, o.created_at, o.status, o.customer_name, o.customer_phone,
+                           o.customer_address, o.total_amount, oi.id as item_id, oi.product_id,
+                           p.name as product_name, oi.quantity, oi.price
+                    FROM {schema}.orders o
+                    JOIN {schema}.order_items oi ON oi.order_id = o.id
+                    LEFT JOIN products p ON p.id = oi.product_id
+                    {where}'''
+        
+        # Hai nhánh đều đã theo thứ tự index, SQLite trộn (merge) chứ không sắp xếp lại
+        cursor = db.execute(
+            select.format(schema='main', where=f"WHERE {' AND '.join(conditions)}" if conditions else '')
+            + ' UNION ALL '
+            + select.format(schema='archive', where=f"WHERE {' AND '.join(archive_conditions)}")
+            + ' ORDER BY 2, 1, 8',
+            params + params
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _add_archived_sales(db, schema, condition, sign):
+        """Cộng (sign=1) hoặc trừ (sign=-1) đơn hoàn thành thỏa `condition` (bí danh o) vào archive.product_sales"""
+        db.execute(
+            f'''INSERT INTO archive.product_sales (product_id, total_sold, revenue)
+                SELECT oi.product_id, ? * SUM(oi.quantity), ? * SUM(oi.quantity * oi.price)
+                FROM {schema}.order_items oi
+                JOIN {schema}.orders o ON o.id = oi.order_id
+                WHERE o.status = 'completed' AND {condition}
+                GROUP BY oi.product_id
+                ON CONFLICT(product_id) DO UPDATE SET
+                    total_sold = total_sold + excluded.total_sold,
+                    revenue = revenue + excluded.revenue''',
+            (sign, sign)
+        )
+    
+    @staticmethod
+    def archive(before, batch_size=5000):
+        """Chuyển tối đa batch_size đơn đã hoàn thành/hủy tạo trước `before` sang file lưu trữ.
+        
+        Chép sang archive rồi mới xóa khỏi bảng chính, mỗi bước một transaction: ở chế độ WAL
+        transaction nhiều file không nguyên tử giữa các file, nên nếu bị ngắt giữa chừng chỉ để lại
+        bản trùng (lần chạy sau dọn nốt), không bao giờ mất đơn. Bảng tổng hợp giữ nguyên vì vẫn
+        tính cả đơn đã lưu trữ. Trả về số đơn đã chuyển.
+        """
+        db = get_db()
+        require_no_transaction(db, 'Order.archive')
+        db.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+        batch = 'o.id IN (SELECT id FROM temp.archive_batch)'
+        
+        # Bước 1: chép sang archive (bỏ qua đơn đã chép ở lần chạy bị ngắt trước)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM temp.archive_batch')
+            db.execute(
+                """INSERT INTO temp.archive_batch (id)
+                   SELECT id FROM main.orders
+                   WHERE status IN ('completed', 'cancelled') AND created_at < ?
+                   LIMIT ?""",
+                (before, batch_size)
+            )
+            new = f'{batch} AND o.id NOT IN (SELECT id FROM archive.orders)'
+            Order._add_archived_sales(db, 'main', new, 1)
+            db.execute(
+                f'''INSERT INTO archive.order_items (id, order_id, product_id, quantity, price)
+                    SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price
+                    FROM main.order_items oi
+                    JOIN main.orders o ON o.id = oi.order_id
+                    WHERE {new}'''
+            )
+            db.execute(
+                f'''INSERT INTO archive.orders (id, customer_name, customer_phone, customer_address,
+                                                total_amount, status, created_at, archived_at)
+                    SELECT o.id, o.customer_name, o.customer_phone, o.customer_address,
+                           o.total_amount, o.status, o.created_at, ?
+                    FROM main.orders o
+                    WHERE {new}''',
+                (time.time(),)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        # Bước 2: xóa khỏi bảng chính các đơn đã có bản lưu trữ
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Đơn bị đổi trạng thái giữa hai bước: bỏ bản lưu trữ, giữ ở bảng chính
+            stale = f'{batch} AND EXISTS (SELECT 1 FROM main.orders h WHERE h.id = o.id AND h.status IS NOT o.status)'
+            Order._add_archived_sales(db, 'archive', stale, -1)
+            db.execute(f'DELETE FROM archive.order_items WHERE order_id IN (SELECT o.id FROM archive.orders o WHERE {stale})')
+            db.execute(f'DELETE FROM archive.orders WHERE id IN (SELECT o.id FROM archive.orders o WHERE {stale})')
+            
+            db.execute(
+                '''DELETE FROM main.order_items
+                   WHERE order_id IN (SELECT id FROM temp.archive_batch)
+                   AND order_id IN (SELECT id FROM archive.orders)'''
+            )
+            count = db.execute(
+                '''DELETE FROM main.orders
+                   WHERE id IN (SELECT id FROM temp.archive_batch)
+                   AND id IN (SELECT id FROM archive.orders)'''
+            ).rowcount
+            if count:
+                bump_version(db, 'orders')
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        version_clock.invalidate()
+        return count
+    
+    @staticmethod
+    def rebuild_rollups():
+        """Dựng lại bảng tổng hợp theo ngày/tháng từ toàn bộ đơn hàng"""
+        db = get_db()
+        db.execute('BEGIN IMMEDIATE')
+        rebuild_order_rollups(db)
+        bump_version(db, 'orders')
+        db.commit()
+        version_clock.invalidate()
 
 
 class Review:
@@ -333,29 +683,34 @@ class Review:
                VALUES (?, ?, ?, ?, ?)''',
             (product_id, order_id, customer_name, rating, comment)
         )
+        apply_rating_stats(db, cursor.lastrowid)
+        bump_version(db, 'reviews')
         db.commit()
+        version_clock.invalidate()
         return cursor.lastrowid
     
     @staticmethod
-    def get_by_product(product_id):
-        """Lấy tất cả đánh giá của sản phẩm"""
+    def get_by_product(product_id, after=None, limit=None):
+        """Lấy đánh giá của sản phẩm, mới nhất trước (phân trang theo cursor)"""
         db = get_db()
+        clause, params = _keyset('r', after, limit, ['r.product_id = ?'], [product_id])
         return db.execute(
-            '''SELECT * FROM reviews 
-               WHERE product_id = ? 
-               ORDER BY created_at DESC''',
-            (product_id,)
+            f'''SELECT r.* FROM reviews r
+               {clause}''',
+            params
         ).fetchall()
     
     @staticmethod
-    def get_all():
-        """Lấy tất cả đánh giá"""
+    def get_all(after=None, limit=None):
+        """Lấy đánh giá mới nhất trước (phân trang theo cursor)"""
         db = get_db()
+        clause, params = _keyset('r', after, limit)
         return db.execute(
-            '''SELECT r.*, p.name as product_name, p.image_url as product_image
+            f'''SELECT r.*, p.name as product_name, p.image_url as product_image
                FROM reviews r
                JOIN products p ON r.product_id = p.id
-               ORDER BY r.created_at DESC'''
+               {clause}''',
+            params
         ).fetchall()
     
     @staticmethod
@@ -366,56 +721,116 @@ class Review:
             '''SELECT r.*, p.name as product_name, p.image_url as product_image
                FROM reviews r
                JOIN products p ON r.product_id = p.id
-               ORDER BY r.created_at DESC
+               ORDER BY r.created_at DESC, r.id DESC
                LIMIT ?''',
             (limit,)
         ).fetchall()
     
+    @staticmethod
+    def _rating_info(row):
+        """Chuyển một dòng product_rating_stats thành điểm trung bình và số đánh giá"""
+        if not row or not row['review_count']:
+            return {'average': 0, 'count': 0}
+        return {
+            'average': round(row['rating_sum'] / row['review_count'], 1),
+            'count': row['review_count']
+        }
+    
     @staticmethod
     def get_average_rating(product_id):
         """Lấy điểm đánh giá trung bình của sản phẩm"""
         db = get_db()
         result = db.execute(
-            '''SELECT AVG(rating) as avg_rating, COUNT(*) as review_count
-               FROM reviews 
+            '''SELECT review_count, rating_sum
+               FROM product_rating_stats 
                WHERE product_id = ?''',
             (product_id,)
         ).fetchone()
         
-        return {
-            'average': round(result['avg_rating'], 1) if result['avg_rating'] else 0,
-            'count': result['review_count']
-        }
+        return Review._rating_info(result)
+    
+    @staticmethod
+    def get_ratings(product_ids, chunk_size=500):
+        """Lấy điểm trung bình của nhiều sản phẩm cùng lúc (dict theo product_id)"""
+        db = get_db()
+        product_ids = list(dict.fromkeys(product_ids))
+        ratings = {product_id: {'average': 0, 'count': 0} for product_id in product_ids}
+        
+        for i in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[i:i + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            result = db.execute(
+                f'''SELECT product_id, review_count, rating_sum
+                    FROM product_rating_stats 
+                    WHERE product_id IN ({placeholders})''',
+                chunk
+            ).fetchall()
+            for row in result:
+                ratings[row['product_id']] = Review._rating_info(row)
+        
+        return ratings
+    
+    @staticmethod
+    def get_summary(product_id, after=None, limit=None):
+        """Lấy điểm trung bình và một trang đánh giá của sản phẩm trong một truy vấn"""
+        db = get_db()
+        clause, params = _keyset('r', after, limit, ['r.product_id = ?'], [product_id])
+        # Luôn có ít nhất một dòng (kể cả khi chưa có đánh giá) nhờ LEFT JOIN từ dòng gốc
+        rows = db.execute(
+            f'''SELECT s.review_count, s.rating_sum, page.*
+                FROM (SELECT ? AS product_id) base
+                LEFT JOIN product_rating_stats s ON s.product_id = base.product_id
+                LEFT JOIN (SELECT r.* FROM reviews r
+                           {clause}) page ON 1
+                ORDER BY page.created_at DESC, page.id DESC''',
+            [product_id] + params
+        ).fetchall()
+        
+        reviews = [
+            {key: row[key] for key in REVIEW_FIELDS}
+            for row in rows if row['id'] is not None
+        ]
+        return Review._rating_info(rows[0]), reviews
     
     @staticmethod
     def delete(review_id):
         """Xóa đánh giá"""
         db = get_db()
+        apply_rating_stats(db, review_id, -1)
         db.execute('DELETE FROM reviews WHERE id = ?', (review_id,))
+        bump_version(db, 'reviews')
         db.commit()
+        version_clock.invalidate()
     
     @staticmethod
     def get_statistics():
         """Thống kê đánh giá"""
         db = get_db()
+        stars = ', '.join(f'SUM({col}) as {col}' for col in STAR_COLUMNS)
+        result = db.execute(
+            f'''SELECT SUM(review_count) as total, SUM(rating_sum) as rating_sum, {stars}
+                FROM product_rating_stats'''
+        ).fetchone()
         
-        # Tổng số đánh giá
-        total = db.execute('SELECT COUNT(*) as count FROM reviews').fetchone()['count']
+        total = result['total'] or 0
         
         # Đánh giá theo rating
         rating_dist = {}
         for rating in range(1, 6):
-            count = db.execute(
-                'SELECT COUNT(*) as count FROM reviews WHERE rating = ?',
-                (rating,)
-            ).fetchone()['count']
-            rating_dist[rating] = count
-        
-        # Điểm trung bình
-        avg = db.execute('SELECT AVG(rating) as avg FROM reviews').fetchone()['avg']
+            rating_dist[rating] = result[f'star_{rating}'] or 0
         
         return {
             'total': total,
-            'average': round(avg, 1) if avg else 0,
+            'average': round(result['rating_sum'] / total, 1) if total else 0,
             'distribution': rating_dist
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def rebuild_rating_stats():
+        """Dựng lại bảng thống kê đánh giá từ toàn bộ reviews"""
+        db = get_db()
+        db.execute('BEGIN IMMEDIATE')
+        rebuild_rating_stats(db)
+        bump_version(db, 'reviews')
+        db.commit()
+        version_clock.invalidate()
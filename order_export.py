@@ -0,0 +1,67 @@
+"""
+Định dạng dữ liệu xuất đơn hàng cho kế toán (CSV mỗi dòng chi tiết một dòng, NDJSON mỗi đơn một dòng)
+Các hàm nhận iterator dòng từ Order.iter_export và trả về generator chuỗi để stream,
+bộ nhớ chỉ giữ một lô dòng (CSV) hoặc một đơn hàng (NDJSON) tại một thời điểm.
+"""
+
+import csv
+import io
+import json
+
+# Số dòng ghi vào buffer trước khi gửi một khối
+CHUNK_ROWS = 500
+
+CSV_COLUMNS = ['order_id', 'created_at', 'status', 'customer_name', 'customer_phone', 'customer_address',
+               'total_amount', 'item_id', 'product_id', 'product_name', 'quantity', 'price', 'line_total']
+
+ORDER_FIELDS = ['created_at', 'status', 'customer_name', 'customer_phone', 'customer_address', 'total_amount']
+
+
+def iter_csv(rows):
+    """CSV UTF-8 có BOM (Excel đọc đúng tiếng Việt)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([row[column] for column in CSV_COLUMNS[:-1]] + [row['quantity'] * row['price']])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_orders(rows):
+    """Gộp các dòng liên tiếp cùng order_id thành một đơn hàng có danh sách items"""
+    order = None
+    for row in rows:
+        if order is None or order['id'] != row['order_id']:
+            if order is not None:
+                yield order
+            order = {'id': row['order_id']}
+            order.update((field, row[field]) for field in ORDER_FIELDS)
+            order['items'] = []
+        order['items'].append({
+            'id': row['item_id'],
+            'product_id': row['product_id'],
+            'product_name': row['product_name'],
+            'quantity': row['quantity'],
+            'price': row['price']
+        })
+    if order is not None:
+        yield order
+
+
+def iter_ndjson(rows):
+    """Mỗi đơn hàng một dòng JSON"""
+    lines = []
+    for order in iter_orders(rows):
+        lines.append(json.dumps(order, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
@@ -0,0 +1,359 @@
+"""
+Chạy ứng dụng WSGI theo mô hình pre-fork: 1 tiến trình giám sát + N worker mỗi app
+- Socket lắng nghe được mở 1 lần ở tiến trình giám sát, các worker dùng chung
+- Worker chạy bằng waitress nếu đã cài, nếu không dùng server đa luồng của Werkzeug
+- SIGHUP: tạo lớp worker mới (nạp lại code) rồi dừng êm lớp cũ
+- SIGTERM/SIGINT: dừng êm tất cả worker
+- Worker chết hoặc không gửi heartbeat quá WORKER_TIMEOUT giây sẽ được thay thế. Heartbeat chỉ được gửi
+  khi vòng lặp server còn chạy và chưa phải mọi luồng đều kẹt trong view, nên worker treo cũng bị thay
+"""
+
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+try:
+    from waitress import create_server as waitress_create_server
+except ImportError:
+    waitress_create_server = None
+
+# Số luồng xử lý request trong mỗi worker
+WORKER_THREADS = int(os.environ.get('PREFORK_THREADS', 8))
+
+# Worker gửi heartbeat mỗi HEARTBEAT_INTERVAL giây, quá WORKER_TIMEOUT giây không thấy thì bị thay.
+# View chưa trả về sau WORKER_TIMEOUT giây bị coi là kẹt (trừ khi worker còn luồng rảnh)
+HEARTBEAT_INTERVAL = float(os.environ.get('PREFORK_HEARTBEAT', 2))
+WORKER_TIMEOUT = float(os.environ.get('PREFORK_TIMEOUT', 30))
+
+# Thời gian chờ worker xử lý nốt request khi dừng/nạp lại
+GRACEFUL_TIMEOUT = float(os.environ.get('PREFORK_GRACEFUL_TIMEOUT', 10))
+
+# Worker chết sớm hơn khoảng này sau khi khởi động thì đợi trước khi tạo lại (tránh vòng lặp crash)
+RESPAWN_BACKOFF = 1.0
+
+
+def load_app(target):
+    """Import app từ chuỗi 'module:biến', ví dụ 'app:app'"""
+    module_name, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module_name), attr or 'app')
+
+
+def create_socket(host, port, backlog=2048):
+    """Mở socket lắng nghe dùng chung cho các worker"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Listener:
+    """Một app WSGI chạy trên một cổng với `workers` tiến trình"""
+    
+    def __init__(self, name, target, host, port, workers, checkpointer=False):
+        self.name = name
+        self.target = target
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.checkpointer = checkpointer
+        self.sock = None
+
+
+class Worker:
+    """Thông tin một worker mà tiến trình giám sát theo dõi"""
+    
+    def __init__(self, pid, listener, slot, generation, beat_fd):
+        self.pid = pid
+        self.listener = listener
+        self.slot = slot
+        self.generation = generation
+        self.beat_fd = beat_fd
+        self.started_at = self.last_beat = time.monotonic()
+
+
+class WorkerHealth:
+    """Middleware WSGI theo dõi worker còn phục vụ được không: vòng lặp server còn quay
+    (tick) và số view kẹt quá WORKER_TIMEOUT giây chưa chiếm hết các luồng.
+    
+    Chỉ tính thời gian đến khi view trả về: response stream (SSE dashboard, file xuất đơn hàng)
+    đang gửi dữ liệu thì không phải kẹt dù mở rất lâu. threads=None khi server không giới hạn
+    số luồng (Werkzeug): view kẹt không làm hết luồng, chỉ còn kiểm tra vòng lặp server.
+    """
+    
+    def __init__(self, app, threads=WORKER_THREADS):
+        self.app = app
+        self.threads = threads
+        self.loop_at = time.monotonic()
+        self._active = {}
+        self._lock = threading.Lock()
+    
+    def tick(self):
+        """Gọi từ vòng lặp chính của server mỗi lần nhận/chờ kết nối"""
+        self.loop_at = time.monotonic()
+    
+    def __call__(self, environ, start_response):
+        token = object()
+        with self._lock:
+            self._active[token] = time.monotonic()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            with self._lock:
+                del self._active[token]
+    
+    def healthy(self, now):
+        if now - self.loop_at > WORKER_TIMEOUT:
+            return False
+        if self.threads is None:
+            return True
+        with self._lock:
+            stuck = sum(1 for started in self._active.values() if now - started > WORKER_TIMEOUT)
+        return stuck < self.threads
+
+
+class Supervisor:
+    """Tiến trình giám sát: fork worker, nạp lại khi SIGHUP, thay worker hỏng"""
+    
+    def __init__(self, listeners, setup=None):
+        self.listeners = listeners
+        self.setup = setup
+        self.workers = {}
+        self.generation = 0
+        self._pending = []  # (thời điểm, listener, slot) chờ tạo lại
+        self._reload = False
+        self._stopping = False
+    
+    # ------------------------------------------------------------------
+    # Tiến trình giám sát
+    # ------------------------------------------------------------------
+    
+    def run(self):
+        for listener in self.listeners:
+            listener.sock = create_socket(listener.host, listener.port)
+        
+        if not self._run_setup():
+            raise RuntimeError('Khởi tạo database thất bại, không tạo worker')
+        
+        signal.signal(signal.SIGHUP, lambda *args: setattr(self, '_reload', True))
+        signal.signal(signal.SIGTERM, lambda *args: setattr(self, '_stopping', True))
+        signal.signal(signal.SIGINT, lambda *args: setattr(self, '_stopping', True))
+        
+        self._spawn_generation()
+        for listener in self.listeners:
+            print(f"✅ {listener.name}: http://{listener.host}:{listener.port} "
+                  f"({listener.workers} worker, {'waitress' if waitress_create_server else 'werkzeug'})")
+        
+        while not self._stopping:
+            self._read_heartbeats(timeout=1.0)
+            self._reap()
+            self._kill_stuck()
+            self._respawn_pending()
+            if self._reload:
+                self._reload = False
+                self._do_reload()
+        
+        self._shutdown()
+    
+    def _run_setup(self):
+        """Chạy hàm khởi tạo (init_db...) trong tiến trình con để tiến trình giám sát không import app"""
+        if self.setup is None:
+            return True
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.setup()
+                code = 0
+            except Exception as e:
+                print(f"❌ Lỗi khởi tạo: {e}")
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status) == 0
+    
+    def _spawn_generation(self):
+        self.generation += 1
+        for listener in self.listeners:
+            for slot in range(listener.workers):
+                self._spawn(listener, slot)
+    
+    def _spawn(self, listener, slot):
+        beat_r, beat_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(beat_r)
+            code = 1
+            try:
+                self._worker_main(listener, slot, beat_w)
+                code = 0
+            except Exception as e:
+                print(f"❌ Worker {listener.name}#{slot} lỗi: {e}")
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        
+        os.close(beat_w)
+        self.workers[pid] = Worker(pid, listener, slot, self.generation, beat_r)
+    
+    def _read_heartbeats(self, timeout):
+        fds = {worker.beat_fd: worker for worker in self.workers.values()}
+        if not fds:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select(list(fds), [], [], timeout)
+        now = time.monotonic()
+        for fd in readable:
+            try:
+                os.read(fd, 64)
+            except OSError:
+                continue
+            fds[fd].last_beat = now
+    
+    def _reap(self):
+        """Thu dọn worker đã thoát, lên lịch tạo lại nếu thuộc lớp hiện tại"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.beat_fd)
+            if self._stopping or worker.generation != self.generation:
+                continue
+            
+            code = os.waitstatus_to_exitcode(status)
+            print(f"⚠️  Worker {worker.listener.name}#{worker.slot} (pid {pid}) đã dừng (mã {code}), đang tạo lại...")
+            delay = RESPAWN_BACKOFF if time.monotonic() - worker.started_at < RESPAWN_BACKOFF else 0
+            self._pending.append((time.monotonic() + delay, worker.listener, worker.slot))
+    
+    def _kill_stuck(self):
+        """Worker không gửi heartbeat quá WORKER_TIMEOUT bị coi là treo"""
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if now - worker.last_beat > WORKER_TIMEOUT:
+                print(f"⚠️  Worker {worker.listener.name}#{worker.slot} (pid {worker.pid}) không phản hồi, buộc dừng")
+                self._signal(worker.pid, signal.SIGKILL)
+                worker.last_beat = now
+    
+    def _respawn_pending(self):
+        now = time.monotonic()
+        due = [item for item in self._pending if item[0] <= now]
+        self._pending = [item for item in self._pending if item[0] > now]
+        for _, listener, slot in due:
+            self._spawn(listener, slot)
+    
+    def _do_reload(self):
+        """Nạp lại: chạy lại khởi tạo, tạo lớp worker mới rồi dừng êm lớp cũ"""
+        print("🔄 Đang nạp lại worker...")
+        if not self._run_setup():
+            print("❌ Khởi tạo thất bại, giữ nguyên các worker đang chạy")
+            return
+        old = [worker.pid for worker in self.workers.values()]
+        self._pending = []
+        self._spawn_generation()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+    
+    def _shutdown(self):
+        print("\n🛑 Đang dừng các worker...")
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+        self._reap()
+        
+        for listener in self.listeners:
+            listener.sock.close()
+    
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+    
+    # ------------------------------------------------------------------
+    # Tiến trình worker
+    # ------------------------------------------------------------------
+    
+    def _worker_main(self, listener, slot, beat_fd):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        
+        # Không giữ socket và pipe của app/worker khác
+        for other in self.listeners:
+            if other is not listener:
+                other.sock.close()
+        for worker in self.workers.values():
+            os.close(worker.beat_fd)
+        
+        app = load_app(listener.target)
+        threads = WORKER_THREADS if waitress_create_server else None
+        # Cho app biết số luồng xử lý request (vd. giới hạn kết nối SSE của dashboard)
+        if hasattr(app, 'config'):
+            app.config['SERVER_THREADS'] = threads
+        health = WorkerHealth(app, threads)
+        
+        # Mỗi worker có pool kết nối riêng, mở sẵn trước khi nhận request
+        from database import get_pool, start_checkpointer
+        get_pool().warm()
+        if listener.checkpointer and slot == 0:
+            start_checkpointer()
+        
+        threading.Thread(target=self._heartbeat, args=(beat_fd, health), daemon=True, name='Heartbeat').start()
+        
+        if waitress_create_server is not None:
+            server = waitress_create_server(health, sockets=[listener.sock], threads=WORKER_THREADS)
+            # Vòng lặp asyncore của waitress gọi readable() của server mỗi vòng (tối đa 1 giây/lần)
+            readable = server.readable
+            
+            def readable_tick():
+                health.tick()
+                return readable()
+            
+            server.readable = readable_tick
+            signal.signal(signal.SIGTERM, lambda *args: server.close())
+            try:
+                server.run()
+            finally:
+                server.task_dispatcher.shutdown(timeout=GRACEFUL_TIMEOUT)
+        else:
+            from werkzeug.serving import make_server
+            server = make_server(listener.host, listener.port, health, threaded=True, fd=listener.sock.fileno())
+            # serve_forever gọi service_actions() sau mỗi lần poll (0.5 giây)
+            server.service_actions = health.tick
+            # Chờ các luồng đang xử lý request xong khi dừng
+            server.daemon_threads = False
+            signal.signal(signal.SIGTERM,
+                          lambda *args: threading.Thread(target=server.shutdown, daemon=True).start())
+            server.serve_forever()
+            server.server_close()
+    
+    @staticmethod
+    def _heartbeat(beat_fd, health):
+        """Gửi heartbeat khi worker còn phục vụ được, worker treo thì im lặng để bị thay"""
+        while True:
+            if health.healthy(time.monotonic()):
+                try:
+                    os.write(beat_fd, b'.')
+                except OSError:
+                    return
+            time.sleep(HEARTBEAT_INTERVAL)
@@ -0,0 +1,263 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import g
+
+# Bật/tắt đo thời gian truy vấn (đặt DB_TRACE=0 để tắt)
+TRACE_ENABLED = os.environ.get('DB_TRACE', '1') != '0'
+
+# Truy vấn chạy lâu hơn ngưỡng này (ms) được ghi vào slow-query log kèm EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 100))
+
+# Số truy vấn chậm gần nhất giữ lại để xem
+SLOW_QUERY_KEEP = 50
+
+# Số truy vấn tối đa giữ chi tiết trong một trace (script chạy lâu không bị phình bộ nhớ)
+TRACE_LIMIT = 500
+
+# Số câu SQL khác nhau tối đa có histogram riêng, còn lại gộp vào '<other>'
+MAX_STATEMENTS = 500
+
+# Các mốc histogram thời gian (ms)
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+def normalize_sql(sql):
+    """Rút gọn SQL làm khóa thống kê: gộp khoảng trắng và danh sách IN (?, ?, ...)"""
+    return _IN_LIST.sub('(?, ...)', _WHITESPACE.sub(' ', sql).strip())
+
+
+class QueryRecord:
+    """Một lần execute: SQL, số tham số, thời gian (kể cả lúc fetch) và số dòng"""
+    __slots__ = ('sql', 'params', 'param_count', 'elapsed', 'rows', 'done')
+    
+    def __init__(self, sql, params, param_count):
+        self.sql = sql
+        self.params = params
+        self.param_count = param_count
+        self.elapsed = 0.0
+        self.rows = 0
+        self.done = False
+    
+    def to_dict(self):
+        return {
+            'sql': normalize_sql(self.sql),
+            'params': self.param_count,
+            'ms': round(self.elapsed * 1000, 3),
+            'rows': self.rows
+        }
+
+
+class RequestTrace:
+    """Các truy vấn của một request (hoặc một app context khi chạy script)"""
+    
+    def __init__(self):
+        self.records = []
+        self.count = 0
+        self.total_time = 0.0
+    
+    def add(self, record):
+        self.count += 1
+        if len(self.records) < TRACE_LIMIT:
+            self.records.append(record)
+    
+    def finish(self):
+        """Chốt các truy vấn chưa fetch hết (gọi khi request kết thúc)"""
+        for record in self.records:
+            if not record.done:
+                query_stats.finish(record, self)
+    
+    def summary(self):
+        return {'queries': self.count, 'db_ms': round(self.total_time * 1000, 3)}
+
+
+class QueryStats:
+    """Histogram thời gian theo câu SQL và slow-query log (dùng chung cả tiến trình)"""
+    
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._statements = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+    
+    def finish(self, record, trace=None, conn=None):
+        """Ghi nhận truy vấn đã xong vào trace, histogram và slow log"""
+        if record.done:
+            return
+        record.done = True
+        if trace is not None:
+            trace.total_time += record.elapsed
+        
+        key = normalize_sql(record.sql)
+        elapsed_ms = record.elapsed * 1000
+        bucket = next(i for i, bound in enumerate(BUCKETS_MS) if elapsed_ms <= bound)
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    key = '<other>'
+                    entry = self._statements.get(key)
+                if entry is None:
+                    entry = self._statements[key] = {
+                        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                        'buckets': [0] * len(BUCKETS_MS)
+                    }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['rows'] += record.rows
+            entry['buckets'][bucket] += 1
+            if elapsed_ms > entry['max_ms']:
+                entry['max_ms'] = elapsed_ms
+        
+        if elapsed_ms >= self.slow_ms:
+            self._log_slow(record, conn)
+    
+    def _log_slow(self, record, conn):
+        plan = []
+        if conn is not None and record.sql.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + record.sql, record.params)]
+            except sqlite3.Error:
+                pass
+        
+        entry = record.to_dict()
+        entry['plan'] = plan
+        entry['at'] = time.time()
+        self.slow_queries.append(entry)
+        
+        print(f"[DB] 🐢 Truy vấn chậm {entry['ms']:.1f}ms ({entry['rows']} dòng): {entry['sql'][:300]}")
+        for line in plan:
+            print(f"[DB]    └─ {line}")
+    
+    def snapshot(self, top=None):
+        """Lấy thống kê theo câu SQL, sắp xếp theo tổng thời gian giảm dần"""
+        with self._lock:
+            items = [(sql, dict(entry, buckets=list(entry['buckets']))) for sql, entry in self._statements.items()]
+        items.sort(key=lambda item: item[1]['total_ms'], reverse=True)
+        result = []
+        for sql, entry in items[:top]:
+            entry['sql'] = sql
+            entry['avg_ms'] = round(entry['total_ms'] / entry['count'], 3)
+            entry['buckets'] = dict(zip([str(b) for b in BUCKETS_MS[:-1]] + ['+Inf'], entry['buckets']))
+            result.append(entry)
+        return result
+    
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+        self.slow_queries.clear()
+
+
+query_stats = QueryStats()
+
+
+class TracedCursor:
+    """Cursor ghi thêm thời gian fetch và số dòng trả về vào QueryRecord"""
+    
+    def __init__(self, cursor, record, trace, conn):
+        self._cursor = cursor
+        self._record = record
+        self._trace = trace
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+    
+    def _fetched(self, start, rows, exhausted):
+        record = self._record
+        record.elapsed += time.perf_counter() - start
+        record.rows += rows
+        if exhausted:
+            query_stats.finish(record, self._trace, self._conn)
+    
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+    
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size if size is not None else self._cursor.arraysize)
+        self._fetched(start, len(rows), not rows)
+        return rows
+    
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+    
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+    
+    def close(self):
+        self._cursor.close()
+        query_stats.finish(self._record, self._trace, self._conn)
+
+
+class TracedConnection:
+    """Bọc sqlite3.Connection: mỗi execute/executemany được đo và ghi vào trace của request"""
+    
+    def __init__(self, conn, trace):
+        self.raw = conn
+        self.trace = trace
+    
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+    
+    def _run(self, method, sql, params, explain_params, param_count):
+        record = QueryRecord(sql, explain_params, param_count)
+        self.trace.add(record)
+        start = time.perf_counter()
+        cursor = method(sql, params)
+        record.elapsed = time.perf_counter() - start
+        if cursor.description is None:
+            # Lệnh ghi/PRAGMA không trả dòng: chốt ngay
+            record.rows = max(cursor.rowcount, 0)
+            query_stats.finish(record, self.trace, self.raw)
+            return cursor
+        return TracedCursor(cursor, record, self.trace, self.raw)
+    
+    def execute(self, sql, params=()):
+        return self._run(self.raw.execute, sql, params, params, len(params))
+    
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        first = seq_of_params[0] if seq_of_params else ()
+        return self._run(self.raw.executemany, sql, seq_of_params, first, len(first) * len(seq_of_params))
+
+
+def trace_connection(conn):
+    """Bọc kết nối cho app context hiện tại (trả nguyên kết nối nếu tắt trace)"""
+    if not TRACE_ENABLED:
+        return conn
+    if 'db_trace' not in g:
+        g.db_trace = RequestTrace()
+    return TracedConnection(conn, g.db_trace)
+
+
+def get_trace():
+    """Trace của request hiện tại, None nếu request chưa dùng database"""
+    return g.get('db_trace')
+
+
+def server_timing(response):
+    """after_request: thêm header Server-Timing với số truy vấn và tổng thời gian DB"""
+    trace = g.get('db_trace')
+    if trace is not None:
+        trace.finish()
+        summary = trace.summary()
+        response.headers.add('Server-Timing', f'db;dur={summary["db_ms"]:.2f};desc="{summary["queries"]} queries"')
+    return response
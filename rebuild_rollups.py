@@ -0,0 +1,36 @@
+"""
+Script dựng lại bảng tổng hợp đơn hàng theo ngày/tháng từ lịch sử
+Chạy: python rebuild_rollups.py
+"""
+
+import time
+from app import app
+from models import Order
+from database import init_db
+
+def rebuild_rollups():
+    """Dựng lại order_daily_rollup và order_monthly_rollup"""
+    
+    with app.app_context():
+        print("\n" + "="*60)
+        print("🔄 DỰNG LẠI BẢNG TỔNG HỢP ĐƠN HÀNG")
+        print("="*60 + "\n")
+        
+        init_db()
+        
+        start = time.perf_counter()
+        Order.rebuild_rollups()
+        elapsed = time.perf_counter() - start
+        
+        stats = Order.get_statistics()
+        print(f"\n✅ Đã dựng lại trong {elapsed:.2f}s")
+        print(f"   - Tổng đơn hàng: {stats['total']}")
+        print(f"   - Doanh thu: {stats['revenue']:,.0f}₫\n")
+
+if __name__ == '__main__':
+    try:
+        rebuild_rollups()
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
@@ -1,24 +1,27 @@
 #!/usr/bin/env python3
 """
 Script để chạy cả 2 ứng dụng (Customer và Admin) cùng lúc
-Sử dụng: python run.py
+Sử dụng: python run.py                  (server phát triển, 2 thread trong 1 tiến trình)
+         python run.py --workers 4      (production: mỗi app 4 tiến trình worker, xem prefork.py)
 """
 
+import argparse
 import threading
 import webbrowser
 import time
 import sys
 import os
 
-# Import các app
-try:
-    from app import app as customer_app
-    from admin_app import app as admin_app
-    from database import init_db
-except ImportError as e:
-    print(f"❌ Lỗi import: {e}")
-    print("Vui lòng đảm bảo các file app.py và admin_app.py tồn tại!")
-    sys.exit(1)
+def import_apps():
+    """Import các app (gọi muộn để tiến trình giám sát pre-fork không giữ code cũ)"""
+    try:
+        from app import app as customer_app
+        from admin_app import app as admin_app
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Vui lòng đảm bảo các file app.py và admin_app.py tồn tại!")
+        sys.exit(1)
+    return customer_app, admin_app
 
 def print_banner():
     """In banner chào mừng"""
@@ -33,7 +36,7 @@ def print_banner():
     """
     print(banner)
 
-def run_customer_app():
+def run_customer_app(customer_app):
     """Chạy ứng dụng khách hàng"""
     try:
         print("🚀 Đang khởi động CUSTOMER APP...")
@@ -47,7 +50,7 @@ def run_customer_app():
     except Exception as e:
         print(f"❌ Lỗi Customer App: {e}")
 
-def run_admin_app():
+def run_admin_app(admin_app):
     """Chạy ứng dụng admin"""
     try:
         print("🔐 Đang khởi động ADMIN APP...")
@@ -95,9 +98,51 @@ def check_ports():
     
     return True
 
+def init_database(customer_app=None):
+    """Khởi tạo database và dọn giỏ hàng bỏ quên"""
+    from database import init_db
+    from cart_store import cart_store
+    if customer_app is None:
+        customer_app, _ = import_apps()
+    with customer_app.app_context():
+        init_db()
+        # Dọn giỏ hàng bỏ quên
+        purged = cart_store.purge()
+        if purged:
+            print(f"🧹 Đã xóa {purged} dòng giỏ hàng bỏ quên")
+
+def run_prefork(workers, host):
+    """Chế độ production: mỗi app chạy `workers` tiến trình dùng chung socket"""
+    if not hasattr(os, 'fork'):
+        print("❌ Chế độ --workers chỉ hỗ trợ Linux/macOS")
+        sys.exit(1)
+    from prefork import Supervisor, Listener
+    from metrics import clear_dir
+    
+    print_banner()
+    print(f"🚀 Chế độ production: {workers} worker mỗi app (pid giám sát {os.getpid()})")
+    print("   kill -HUP <pid> để nạp lại, Ctrl+C để dừng\n")
+    
+    # Metrics của lần chạy trước không còn ý nghĩa
+    clear_dir()
+    supervisor = Supervisor([
+        Listener('CUSTOMER APP', 'app:app', host, 5000, workers, checkpointer=True),
+        Listener('ADMIN APP', 'admin_app:app', host, 5001, workers),
+    ], setup=init_database)
+    try:
+        supervisor.run()
+    except OSError as e:
+        print(f"❌ Không thể mở cổng: {e}")
+        sys.exit(1)
+    print("\n👋 Cảm ơn bạn đã sử dụng Food Order System!")
+
 def main():
     """Hàm chính"""
     print_banner()
+    customer_app, admin_app = import_apps()
+    from database import get_pool, start_checkpointer
+    from metrics import clear_dir
+    clear_dir()
     
     # Kiểm tra ports
     print("🔍 Kiểm tra ports...")
@@ -110,9 +155,11 @@ def main():
     # Khởi tạo database
     print("\n📦 Khởi tạo database...")
     try:
-        with customer_app.app_context():
-            init_db()
-        print("✅ Database đã sẵn sàng!")
+        init_database(customer_app)
+        # Mở sẵn kết nối cho pool dùng chung của cả 2 server
+        get_pool().warm()
+        start_checkpointer()
+        print(f"✅ Database đã sẵn sàng! (pool {get_pool().size} kết nối)")
     except Exception as e:
         print(f"❌ Lỗi khởi tạo database: {e}")
         sys.exit(1)
@@ -122,8 +169,8 @@ def main():
     print("="*60)
     
     # Tạo threads
-    customer_thread = threading.Thread(target=run_customer_app, daemon=True, name="CustomerApp")
-    admin_thread = threading.Thread(target=run_admin_app, daemon=True, name="AdminApp")
+    customer_thread = threading.Thread(target=run_customer_app, args=(customer_app,), daemon=True, name="CustomerApp")
+    admin_thread = threading.Thread(target=run_admin_app, args=(admin_app,), daemon=True, name="AdminApp")
     browser_thread = threading.Thread(target=open_browsers, daemon=True, name="Browser")
     
     # Khởi động threads
@@ -165,8 +212,16 @@ def main():
         sys.exit(0)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Chạy Customer App (5000) và Admin App (5001)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Số tiến trình worker mỗi app (0 = server phát triển)')
+    parser.add_argument('--host', default='0.0.0.0')
+    args = parser.parse_args()
     try:
-        main()
+        if args.workers > 0:
+            run_prefork(args.workers, args.host)
+        else:
+            main()
     except Exception as e:
         print(f"\n❌ Lỗi nghiêm trọng: {e}")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Script test lưu trữ đơn hàng cũ (Order.archive)
+- Số đơn, file xuất và thống kê không đổi sau khi lưu trữ
+- Đơn đã lưu trữ vẫn xem được nhưng không đổi trạng thái được
+- Chạy lại lần hai không chuyển thêm đơn nào
+Chạy: python test_archive.py
+"""
+
+from datetime import datetime, timedelta
+from database import get_db
+from models import Order
+from testdb import temp_database
+from test_order_rollups import make_orders
+
+def count_orders(db):
+    return db.execute('''SELECT (SELECT COUNT(*) FROM main.orders) + (SELECT COUNT(*) FROM archive.orders
+                         WHERE id NOT IN (SELECT id FROM main.orders))''').fetchone()[0]
+
+def snapshot(db):
+    """Những gì người dùng thấy: số đơn, các dòng file xuất, thống kê, doanh thu, top bán chạy"""
+    return {
+        'orders': count_orders(db),
+        'export': [tuple(row) for row in Order.iter_export()],
+        'statistics': Order.get_statistics(),
+        'revenue': [tuple(row) for row in Order.get_revenue_by_date(60)],
+        'top': [tuple(row) for row in Order.get_top_products(100)],
+    }
+
+def test_archive():
+    """Lưu trữ đơn cũ không làm thay đổi dữ liệu nhìn thấy"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST LƯU TRỮ ĐƠN HÀNG")
+        print("="*60 + "\n")
+        
+        db = get_db()
+        Order.create_many(make_orders(200, seed=3))
+        before = snapshot(db)
+        print(f"📊 {before['orders']} đơn, {len(before['export'])} dòng xuất")
+        
+        # 1. Lưu trữ đơn hoàn thành/hủy cũ hơn 20 ngày
+        print("\n1️⃣  Lưu trữ đơn cũ...")
+        cutoff = (datetime.utcnow() - timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        moved = 0
+        while True:
+            count = Order.archive(cutoff, batch_size=30)
+            if not count:
+                break
+            moved += count
+        archived = db.execute('SELECT COUNT(*) FROM archive.orders').fetchone()[0]
+        assert moved > 0 and archived == moved, f'Đã chuyển {moved} đơn, archive có {archived}'
+        remaining = db.execute(
+            "SELECT COUNT(*) FROM main.orders WHERE status IN ('completed', 'cancelled') AND created_at < ?",
+            (cutoff,)
+        ).fetchone()[0]
+        assert remaining == 0, f'Còn {remaining} đơn cũ trong bảng chính'
+        print(f"   ✅ Đã chuyển {moved} đơn sang file lưu trữ")
+        
+        # 2. Dữ liệu nhìn thấy không đổi
+        print("\n2️⃣  So sánh trước/sau khi lưu trữ...")
+        after = snapshot(db)
+        for key in before:
+            assert after[key] == before[key], f'{key} thay đổi sau khi lưu trữ'
+        print(f"   ✅ Số đơn, {len(after['export'])} dòng xuất, thống kê, doanh thu và top bán chạy không đổi")
+        
+        # 3. Đơn đã lưu trữ: xem được, không đổi trạng thái được
+        print("\n3️⃣  Đơn đã lưu trữ...")
+        order_id = db.execute('SELECT id FROM archive.orders LIMIT 1').fetchone()[0]
+        order, items = Order.get_by_id(order_id)
+        assert order is not None and items, f'Không xem được đơn #{order_id}'
+        try:
+            Order.update_status(order_id, 'pending')
+        except ValueError as e:
+            print(f"   ✅ {e}")
+        else:
+            raise AssertionError(f'Đổi được trạng thái đơn đã lưu trữ #{order_id}')
+        assert Order.get_by_id(order_id)[0]['status'] == order['status']
+        assert snapshot(db) == before
+        
+        # 4. Chạy lại: không còn gì để chuyển
+        print("\n4️⃣  Chạy lưu trữ lần hai...")
+        assert Order.archive(cutoff, batch_size=30) == 0, 'Lần chạy thứ hai vẫn chuyển đơn'
+        assert db.execute('SELECT COUNT(*) FROM archive.orders').fetchone()[0] == archived
+        assert snapshot(db) == before
+        print("   ✅ Không chuyển thêm đơn nào")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_archive()
@@ -0,0 +1,105 @@
+"""
+Script test cart store phía server với cả hai backend (sqlite, memory)
+- Thêm, cộng/trừ số lượng, xóa sản phẩm, xóa giỏ, dọn giỏ bỏ quên
+- Chuyển giỏ hàng kiểu cũ (list trong cookie session) sang cart store khi khách quay lại
+Chạy: python test_cart_store.py
+"""
+
+import app as customer
+from cart_store import CartStore, create_cart_store
+from models import Product
+from testdb import temp_database
+
+BACKENDS = ['sqlite', 'memory']
+
+def check_operations(store, first, second):
+    """Các thao tác giỏ hàng của route add_to_cart / update_cart / checkout"""
+    cart_id = 'cart-a'
+    assert store.load(cart_id) == {}
+    
+    store.add(cart_id, first, 2)
+    store.add(cart_id, second, 1)
+    store.add(cart_id, first, 3)
+    assert store.load(cart_id) == {first: 5, second: 1}, store.load(cart_id)
+    
+    # Giảm số lượng, về 0 thì mất dòng
+    store.add(cart_id, first, -1)
+    store.add(cart_id, second, -1)
+    assert store.load(cart_id) == {first: 4}, store.load(cart_id)
+    
+    # Giỏ khác không bị ảnh hưởng
+    store.add('cart-b', second, 7)
+    store.remove(cart_id, first)
+    store.remove(cart_id, 999999)
+    assert store.load(cart_id) == {}
+    assert store.load('cart-b') == {second: 7}
+    
+    store.add(cart_id, first, 1)
+    store.clear('cart-b')
+    assert store.load('cart-b') == {}
+    assert store.load(cart_id) == {first: 1}
+    
+    # Giỏ mới sửa chưa bị dọn, hạn âm thì dọn hết
+    assert store.purge() == 0
+    assert store.load(cart_id) == {first: 1}
+    store.add('cart-b', second, 2)
+    assert store.purge(max_age_days=-1) == 2
+    assert store.load(cart_id) == {} and store.load('cart-b') == {}
+
+def get(client, path):
+    """Request trong app context riêng để không dùng chung g (giỏ hàng đã nạp) với context của test"""
+    with customer.app.app_context():
+        return client.get(path)
+
+def check_legacy_cart(store, first, second):
+    """Giỏ hàng kiểu cũ trong session được chuyển sang store ở request đầu tiên"""
+    old_store = customer.cart_store
+    customer.cart_store = store
+    try:
+        client = customer.app.test_client()
+        with client.session_transaction() as session:
+            session['cart'] = [{'id': first, 'quantity': 2}, {'id': second, 'quantity': 1}]
+        
+        response = get(client, '/cart')
+        assert response.status_code == 200, response.status_code
+        with client.session_transaction() as session:
+            assert 'cart' not in session, 'Giỏ hàng cũ vẫn nằm trong cookie'
+            cart_id = session['cart_id']
+        assert store.load(cart_id) == {first: 2, second: 1}, store.load(cart_id)
+        
+        # Request sau không cộng dồn lần nữa
+        get(client, '/cart')
+        assert store.load(cart_id) == {first: 2, second: 1}
+        store.clear(cart_id)
+    finally:
+        customer.cart_store = old_store
+
+def test_cart_store():
+    """Cả hai backend cho cùng kết quả"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST CART STORE")
+        print("="*60 + "\n")
+        
+        try:
+            CartStore()
+        except TypeError:
+            print("✅ CartStore là lớp trừu tượng")
+        else:
+            raise AssertionError('Tạo được CartStore trừu tượng')
+        
+        first, second = [product['id'] for product in Product.get_all()[:2]]
+        for backend in BACKENDS:
+            print(f"\n🛒 Backend {backend}...")
+            check_operations(create_cart_store(backend), first, second)
+            print("   ✅ Thêm, cập nhật, xóa, dọn giỏ bỏ quên")
+            check_legacy_cart(create_cart_store(backend), first, second)
+            print("   ✅ Chuyển giỏ hàng kiểu cũ trong session")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_cart_store()
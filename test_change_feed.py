@@ -0,0 +1,109 @@
+"""
+Script test luồng thay đổi đơn hàng cho dashboard (SSE /api/dashboard/stream)
+- Kết nối nhận snapshot rồi sự kiện order_created / status_changed
+- Giới hạn số kết nối theo số luồng của server (chừa luồng cho request thường)
+- Snapshot có mốc hôm nay/tuần/tháng để đơn nhập với created_at cũ không bị tính là đơn hôm nay
+Chạy: python test_change_feed.py
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from admin_app import app as admin
+from change_feed import change_feed, subscriber_limit, MAX_SUBSCRIBERS
+from models import Order, Product
+from testdb import temp_database
+
+def login(client):
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+def read_events(response, topic, timeout=10):
+    """Đọc sự kiện SSE đến khi gặp `topic`, trả về (topic, data) của các sự kiện đã đọc"""
+    events = []
+    deadline = time.monotonic() + timeout
+    for chunk in response.iter_encoded():
+        fields = dict(line.split(': ', 1) for line in chunk.decode().splitlines() if ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+            if fields['event'] == topic:
+                return events
+        assert time.monotonic() < deadline, f'Không nhận được sự kiện {topic}'
+    raise AssertionError(f'Stream đóng trước khi có sự kiện {topic}')
+
+def new_order(product_id, created_at=None):
+    order = {'customer_name': 'Khách SSE', 'customer_phone': '0900000000', 'customer_address': '1 Lê Lợi',
+             'items': [{'id': product_id, 'quantity': 2}]}
+    if created_at:
+        order['created_at'] = created_at
+    return Order.create_many([order])[0]
+
+def test_change_feed():
+    """Snapshot, sự kiện và giới hạn kết nối của dashboard trực tiếp"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST LUỒNG THAY ĐỔI DASHBOARD")
+        print("="*60 + "\n")
+        
+        product_id = Product.get_all()[0]['id']
+        client = admin.test_client()
+        login(client)
+        
+        # 1. Snapshot rồi sự kiện
+        print("1️⃣  Snapshot và sự kiện...")
+        response = client.get('/api/dashboard/stream', buffered=False)
+        try:
+            assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+            (topic, snapshot), = read_events(response, 'snapshot')
+            periods = snapshot['periods']
+            assert periods['today'] == datetime.now().strftime('%Y-%m-%d'), periods
+            assert periods['month'] == periods['today'][:7]
+            
+            order_id = new_order(product_id)
+            events = read_events(response, 'order_created')
+            assert events[-1][1]['id'] == order_id and events[-1][1]['status'] == 'pending'
+            
+            Order.update_status(order_id, 'completed')
+            events = read_events(response, 'status_changed')
+            assert events[-1][1]['old_status'] == 'pending' and events[-1][1]['status'] == 'completed'
+            print(f"   ✅ snapshot → order_created #{order_id} → status_changed")
+            
+            # Đơn nhập với ngày cũ: sự kiện mang created_at nằm ngoài các mốc
+            old_date = (datetime.utcnow() - timedelta(days=60)).strftime('%Y-%m-%d %H:%M:%S')
+            order_id = new_order(product_id, old_date)
+            events = read_events(response, 'order_created')
+            day = events[-1][1]['created_at'][:10]
+            assert day < periods['week'] and day[:7] != periods['month'], (day, periods)
+            print(f"   ✅ Đơn nhập ngày {day} nằm ngoài mốc tuần {periods['week']} / tháng {periods['month']}")
+        finally:
+            response.close()
+        assert change_feed.get_stats()['subscribers'] == 0, 'Đóng stream chưa hủy đăng ký'
+        
+        # 2. Giới hạn kết nối theo số luồng
+        print("\n2️⃣  Giới hạn kết nối...")
+        assert subscriber_limit(None) == MAX_SUBSCRIBERS
+        assert subscriber_limit(8) == 4 and subscriber_limit(2) == 1 and subscriber_limit(1) == 0
+        admin.config['SERVER_THREADS'] = 2
+        try:
+            first = client.get('/api/dashboard/stream', buffered=False)
+            second = client.get('/api/dashboard/stream', buffered=False)
+            try:
+                assert first.status_code == 200, first.status_code
+                assert second.status_code == 503, second.status_code
+            finally:
+                first.close()
+                second.close()
+            third = client.get('/api/dashboard/stream', buffered=False)
+            assert third.status_code == 200, 'Không nhận kết nối mới sau khi kết nối cũ đóng'
+            third.close()
+        finally:
+            admin.config.pop('SERVER_THREADS', None)
+        print("   ✅ 2 luồng: 1 kết nối SSE, kết nối thứ hai nhận 503")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_change_feed()
@@ -0,0 +1,143 @@
+"""
+Script test middleware nén response (compression.py)
+- Bỏ qua HEAD, 204, 304 và response đã có Content-Encoding (file .br/.gz build sẵn)
+- SSE đi thẳng, không qua bộ nén
+- Response stream không có Content-Length được nén từng khối, flush sau mỗi khối
+- Dữ liệu gửi qua write() của start_response được giữ lại và nén cùng body
+Chạy: python test_compression.py
+"""
+
+import gzip
+import zlib
+from werkzeug.test import EnvironBuilder
+from compression import CompressionMiddleware
+
+BODY = ('<p>Phở bò tái chín</p>\n' * 200).encode('utf-8')
+
+def make_app(status='200 OK', headers=(), body=(BODY,), written=()):
+    """App WSGI trả `body`, gửi trước các khối `written` qua write()"""
+    def app(environ, start_response):
+        write = start_response(status, list(headers))
+        for chunk in written:
+            write(chunk)
+        return body
+    return app
+
+def call(app, method='GET', accept_encoding='gzip'):
+    """Gọi app qua middleware, trả về (status, headers dạng dict, body iterable)"""
+    environ = EnvironBuilder(method=method, headers={'Accept-Encoding': accept_encoding}).get_environ()
+    response = {}
+    
+    def start_response(status, headers, exc_info=None):
+        response['status'], response['headers'] = status, dict(headers)
+        return lambda data: None
+    
+    body = CompressionMiddleware(app, 'test', min_size=100)(environ, start_response)
+    return response['status'], response['headers'], body
+
+def gunzip(data):
+    return zlib.decompress(data, 31)
+
+def html(**extra):
+    headers = {'Content-Type': 'text/html; charset=utf-8', 'Content-Length': str(len(BODY))}
+    headers.update(extra)
+    return list(headers.items())
+
+class Stream:
+    """Body stream ghi lại số khối đã được lấy ra và việc close()"""
+    
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.produced = 0
+        self.closed = False
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.produced += 1
+            yield chunk
+    
+    def close(self):
+        self.closed = True
+
+def test_compression():
+    """Các nhánh nén / không nén của CompressionMiddleware"""
+    print("\n" + "="*60)
+    print("🧪 TEST NÉN RESPONSE")
+    print("="*60 + "\n")
+    
+    # 1. Response có Content-Length được nén một lần
+    print("1️⃣  Response có kích thước...")
+    status, headers, body = call(make_app(headers=html(ETag='"abc"')))
+    data = b''.join(body)
+    assert headers['Content-Encoding'] == 'gzip' and headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Length'] == str(len(data)) and gunzip(data) == BODY
+    assert headers['ETag'] == 'W/"abc"', 'ETag mạnh phải thành ETag yếu sau khi nén'
+    status, headers, body = call(make_app(headers=html()), accept_encoding='')
+    assert 'Content-Encoding' not in headers and b''.join(body) == BODY
+    print(f"   ✅ {len(BODY)} → {len(data)} byte, ETag yếu; client không nhận gzip thì giữ nguyên")
+    
+    # 2. HEAD, 204, 304
+    print("\n2️⃣  HEAD / 204 / 304...")
+    status, headers, body = call(make_app(headers=html()), method='HEAD')
+    assert 'Content-Encoding' not in headers and headers['Content-Length'] == str(len(BODY))
+    for code in ('204 NO CONTENT', '304 NOT MODIFIED'):
+        status, headers, body = call(make_app(code, [('ETag', '"abc"')], body=[]))
+        assert status == code and 'Content-Encoding' not in headers and headers['ETag'] == '"abc"'
+        assert b''.join(body) == b''
+    print("   ✅ Không nén, header giữ nguyên")
+    
+    # 3. Body đã nén sẵn (file .gz của build_assets.py)
+    print("\n3️⃣  Response đã có Content-Encoding...")
+    encoded = gzip.compress(BODY)
+    headers_in = [('Content-Type', 'text/css'), ('Content-Length', str(len(encoded))),
+                  ('Content-Encoding', 'gzip'), ('Vary', 'Accept-Encoding')]
+    status, headers, body = call(make_app(headers=headers_in, body=[encoded]))
+    assert b''.join(body) == encoded and headers == dict(headers_in)
+    print("   ✅ Body và header giữ nguyên, không nén lần hai")
+    
+    # 4. SSE
+    print("\n4️⃣  SSE...")
+    events = Stream([b'event: snapshot\ndata: {}\n\n', b'data: ping\n\n' * 100])
+    status, headers, body = call(make_app(headers=[('Content-Type', 'text/event-stream')], body=events))
+    iterator = iter(body)
+    assert next(iterator) == b'event: snapshot\ndata: {}\n\n' and events.produced == 1
+    assert next(iterator) == b'data: ping\n\n' * 100
+    assert 'Content-Encoding' not in headers
+    body.close()
+    assert events.closed
+    print("   ✅ Từng sự kiện đi thẳng, không nén")
+    
+    # 5. Stream không có Content-Length (xuất đơn hàng)
+    print("\n5️⃣  Stream không có kích thước...")
+    rows = [f'{i},Khách {i},Phở bò,{i * 1000}\n'.encode('utf-8') * 20 for i in range(5)]
+    stream = Stream(rows)
+    status, headers, body = call(make_app(headers=[('Content-Type', 'text/csv; charset=utf-8')], body=stream))
+    assert headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in headers
+    assert stream.produced == 0, 'Middleware đọc trước body stream'
+    decompressor = zlib.decompressobj(31)
+    chunks = iter(body)
+    for i, row in enumerate(rows, 1):
+        # Sync flush: mỗi khối nén giải ra ngay đúng khối gốc, không chờ khối sau
+        assert decompressor.decompress(next(chunks)) == row and stream.produced == i
+    rest = b''.join(chunks)
+    assert decompressor.decompress(rest) == b'' and decompressor.eof
+    body.close()
+    assert stream.closed, 'Không gọi close() của body gốc'
+    print(f"   ✅ {len(rows)} khối, mỗi khối giải nén được ngay, close() chuyển tới body gốc")
+    
+    # 6. Dữ liệu gửi qua write()
+    print("\n6️⃣  write() của start_response...")
+    head, tail = BODY[:1000], BODY[1000:]
+    status, headers, body = call(make_app(headers=html(), body=[tail], written=[head[:500], head[500:]]))
+    data = b''.join(body)
+    assert gunzip(data) == BODY and headers['Content-Length'] == str(len(data))
+    status, headers, body = call(make_app(headers=html(), body=[tail], written=[head]), method='HEAD')
+    assert b''.join(body) == BODY, 'Dữ liệu write() bị mất khi không nén'
+    print("   ✅ Khối write() đứng trước body, nén cùng (và giữ lại khi không nén)")
+    
+    print("\n" + "="*60)
+    print("✅ KIỂM TRA HOÀN TẤT!")
+    print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_compression()
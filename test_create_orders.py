@@ -0,0 +1,115 @@
+"""
+Script test tạo đơn hàng hàng loạt (Order.create_many)
+- Giá lấy từ database, bỏ qua giá client gửi lên
+- Sản phẩm không tồn tại / số lượng <= 0 báo ValueError
+- Một đơn lỗi thì cả lô bị hủy: không còn đơn, dòng tổng hợp hay sự kiện change_log nào của lô
+- Không commit hộ transaction người gọi đang mở
+Chạy: python test_create_orders.py
+"""
+
+from database import get_db
+from dashboard import _load_orders
+from models import Order, Product
+from testdb import temp_database
+
+def order(items, name='Khách test'):
+    return {'customer_name': name, 'customer_phone': '0900000000', 'customer_address': '1 Lê Lợi', 'items': items}
+
+def snapshot(db):
+    """Số dòng của các bảng mà create_many ghi vào"""
+    return {
+        'orders': db.execute('SELECT COUNT(*) FROM orders').fetchone()[0],
+        'order_items': db.execute('SELECT COUNT(*) FROM order_items').fetchone()[0],
+        'change_log': db.execute('SELECT COUNT(*) FROM change_log').fetchone()[0],
+        'rollup': [tuple(row) for row in db.execute(
+            'SELECT day, status, order_count, revenue FROM order_daily_rollup ORDER BY day, status')],
+    }
+
+def expect_value_error(orders, message):
+    try:
+        Order.create_many(orders)
+    except ValueError as e:
+        print(f"   ✅ {message}: {e}")
+        return
+    raise AssertionError(f'{message}: không báo ValueError')
+
+def test_create_orders():
+    """Test giá phía server và rollback cả lô"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST TẠO ĐƠN HÀNG")
+        print("="*60 + "\n")
+        
+        db = get_db()
+        first, second = Product.get_all()[:2]
+        
+        # 1. Giá client gửi lên bị bỏ qua
+        print("1️⃣  Giá sửa ở client...")
+        order_id = Order.create('Khách test', '0900000000', '1 Lê Lợi', [
+            {'id': first['id'], 'quantity': 2, 'price': 1, 'name': first['name']},
+            {'id': second['id'], 'quantity': 1, 'price': 0},
+        ])
+        stored, items = Order.get_by_id(order_id)
+        expected = first['price'] * 2 + second['price']
+        assert stored['total_amount'] == expected, f"Tổng tiền {stored['total_amount']} != {expected}"
+        assert {item['product_id']: item['price'] for item in items} == \
+            {first['id']: first['price'], second['id']: second['price']}
+        print(f"   ✅ Tổng tiền lưu theo giá database: {stored['total_amount']:,.0f}₫")
+        
+        # 2. Dữ liệu không hợp lệ
+        print("\n2️⃣  Sản phẩm / số lượng không hợp lệ...")
+        before = snapshot(db)
+        expect_value_error([order([{'id': 999999, 'quantity': 1}])], 'Sản phẩm không tồn tại')
+        expect_value_error([order([{'id': first['id'], 'quantity': 0}])], 'Số lượng 0')
+        expect_value_error([order([{'id': first['id'], 'quantity': -3}])], 'Số lượng âm')
+        expect_value_error([order([])], 'Đơn không có sản phẩm')
+        assert snapshot(db) == before, 'Đơn lỗi vẫn ghi dữ liệu'
+        
+        # 3. Một đơn lỗi giữa lô: cả lô bị hủy
+        print("\n3️⃣  Lô có một đơn lỗi...")
+        batch = [order([{'id': first['id'], 'quantity': 1}], f'Khách {i}') for i in range(5)]
+        batch.insert(3, order([{'id': second['id'], 'quantity': 1}, {'id': 999999, 'quantity': 1}], 'Khách lỗi'))
+        expect_value_error(batch, 'Lô 6 đơn có 1 đơn lỗi')
+        after = snapshot(db)
+        assert after == before, f'Lô lỗi còn để lại dữ liệu: {before} -> {after}'
+        assert not db.in_transaction, 'Transaction chưa được rollback'
+        print("   ✅ Không còn đơn, dòng tổng hợp hay change_log nào của lô")
+        
+        # 4. Lô hợp lệ sau đó vẫn ghi bình thường
+        print("\n4️⃣  Lô hợp lệ sau lô lỗi...")
+        order_ids = Order.create_many(batch[:3] + batch[4:])
+        assert len(order_ids) == 5 and order_ids == sorted(order_ids)
+        after = snapshot(db)
+        assert after['orders'] == before['orders'] + 5
+        assert after['change_log'] == before['change_log'] + 5
+        print(f"   ✅ Đã tạo {len(order_ids)} đơn: #{order_ids[0]}..#{order_ids[-1]}")
+        
+        # 5. Người gọi đang có transaction: báo lỗi, không commit hộ
+        print("\n5️⃣  Transaction của người gọi...")
+        before = snapshot(db)
+        db.execute("UPDATE products SET price = price + 1000 WHERE id = ?", (first['id'],))
+        for name, call in (('create_many', lambda: Order.create_many(batch[:1])),
+                           ('archive', lambda: Order.archive('2100-01-01'))):
+            try:
+                call()
+            except RuntimeError as e:
+                print(f"   ✅ {name}: {e}")
+            else:
+                raise AssertionError(f'{name} chạy trong transaction của người gọi')
+            assert db.in_transaction, f'{name} đã commit/rollback transaction của người gọi'
+        # Snapshot dashboard đọc trong SAVEPOINT lồng, transaction người gọi vẫn mở
+        assert _load_orders()['stats']['total'] == before['orders']
+        assert db.in_transaction, 'Snapshot dashboard đã commit transaction của người gọi'
+        db.rollback()
+        price = db.execute('SELECT price FROM products WHERE id = ?', (first['id'],)).fetchone()[0]
+        assert price == first['price'], 'Thay đổi của người gọi đã bị commit'
+        assert snapshot(db) == before
+        print("   ✅ Transaction của người gọi vẫn mở và rollback được")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_create_orders()
@@ -0,0 +1,106 @@
+"""
+Script test cache đoạn HTML ({% cache %}, fragment_cache.py)
+- Khóa đổi khi phiên bản danh mục đổi (sửa sản phẩm ở tiến trình này hoặc worker khác)
+- Đoạn HTML hết TTL thì render lại
+- Vượt dung lượng tối đa (mặc định 8MB) thì bỏ đoạn ít dùng nhất
+Chạy: python test_fragment_cache.py
+"""
+
+import time
+from jinja2 import Environment
+from catalog_cache import version_clock
+from database import bump_version, get_db
+from fragment_cache import FragmentCache, FragmentCacheExtension
+from models import Product
+from testdb import temp_database
+
+MB = 1024 * 1024
+
+def make_template(cache):
+    """Template có một đoạn cache đếm số lần render"""
+    env = Environment(extensions=[FragmentCacheExtension])
+    env.fragment_cache = cache
+    renders = []
+    template = env.from_string('{% cache category %}{{ render(category) }}{% endcache %}')
+    template.globals['render'] = lambda category: renders.append(category) or f'{category}#{len(renders)}'
+    return template, renders
+
+def check_version_invalidation():
+    """Khóa có phiên bản danh mục: sửa sản phẩm thì render lại"""
+    template, renders = make_template(FragmentCache())
+    first = template.render(category='Phở')
+    assert template.render(category='Phở') == first and len(renders) == 1, 'Không dùng bản đã cache'
+    assert template.render(category='Bún') != first and len(renders) == 2, 'Key khác phải có đoạn riêng'
+    
+    product = Product.get_all()[0]
+    Product.update(product['id'], product['name'] + ' (mới)', product['description'], product['price'],
+                   product['image_url'], product['category'])
+    assert template.render(category='Phở') != first and len(renders) == 3, 'Không render lại sau khi sửa sản phẩm'
+    
+    # Worker khác tăng phiên bản: tiến trình này thấy sau chu kỳ kiểm tra của version_clock
+    db = get_db()
+    bump_version(db, 'catalog')
+    db.commit()
+    version_clock.invalidate()
+    template.render(category='Phở')
+    assert len(renders) == 4, 'Không render lại khi worker khác đổi danh mục'
+    print("   ✅ Render lại sau khi sửa sản phẩm và khi worker khác tăng phiên bản")
+
+def check_ttl():
+    """Đoạn hết hạn bị bỏ khi đọc và tính là miss"""
+    cache = FragmentCache(ttl=0.2)
+    cache.set('menu', '<ul>Phở</ul>')
+    assert cache.get('menu') == '<ul>Phở</ul>'
+    time.sleep(0.3)
+    assert cache.get('menu') is None
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['entries'] == 0 and stats['bytes'] == 0, 'Đoạn hết hạn vẫn chiếm dung lượng'
+    print("   ✅ Hết TTL thì trả None và giải phóng dung lượng")
+
+def check_eviction():
+    """Giới hạn 8MB: bỏ đoạn ít dùng nhất, không lưu đoạn lớn hơn giới hạn"""
+    cache = FragmentCache()
+    assert cache.max_bytes == 8 * MB
+    value = 'đ' * (MB // 2 - 8)  # 'đ' là 2 byte UTF-8: mỗi đoạn gần 1MB
+    for i in range(8):
+        cache.set(f'page:{i}', value)
+    assert cache.get_stats()['entries'] == 8 and cache.get_stats()['evictions'] == 0
+    
+    cache.get('page:0')  # vừa dùng: không bị bỏ
+    cache.set('page:8', value)
+    cache.set('page:9', value)
+    stats = cache.get_stats()
+    assert stats['bytes'] <= 8 * MB, stats
+    assert stats['evictions'] == 2 and stats['entries'] == 8, stats
+    assert cache.get('page:0') == value, 'Bỏ đoạn vừa được dùng'
+    assert cache.get('page:1') is None and cache.get('page:2') is None, 'Không bỏ đoạn ít dùng nhất'
+    assert cache.get('page:9') == value
+    
+    cache.set('huge', 'x' * (8 * MB + 1))
+    assert cache.get('huge') is None and cache.get_stats()['entries'] == 8, 'Đoạn quá lớn đẩy hết cache'
+    print(f"   ✅ {stats['bytes'] / MB:.2f}MB / 8MB, bỏ 2 đoạn ít dùng nhất, đoạn > 8MB không được lưu")
+
+def test_fragment_cache():
+    """Khóa theo phiên bản, TTL và giới hạn dung lượng"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST CACHE ĐOẠN HTML")
+        print("="*60 + "\n")
+        
+        print("1️⃣  Phiên bản danh mục...")
+        check_version_invalidation()
+        
+        print("\n2️⃣  TTL...")
+        check_ttl()
+        
+        print("\n3️⃣  Giới hạn dung lượng...")
+        check_eviction()
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_fragment_cache()
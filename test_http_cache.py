@@ -0,0 +1,94 @@
+"""
+Script test ETag / Last-Modified của các route dùng @conditional (http_cache.py)
+- If-None-Match khớp thì trả 304, dữ liệu đổi thì trả 200 với ETag mới
+- If-Modified-Since: lần ghi ngay sau response (cùng giây) không được để client nhận 304 cũ
+- Trang có giỏ hàng (per_cart): Vary: Cookie, cache riêng, ETag đổi khi giỏ hàng đổi
+Chạy: python test_http_cache.py
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+from app import app
+from models import Product, Review
+from testdb import temp_database
+
+def get(client, path, **headers):
+    """Request trong app context riêng (không dùng chung g với context của test)"""
+    with app.app_context():
+        return client.get(path, headers=headers)
+
+def wait_for_last_modified(client, path):
+    """Last-Modified chỉ được gửi khi giây chứa lần ghi cuối đã qua"""
+    deadline = time.monotonic() + 3
+    while True:
+        response = get(client, path)
+        if 'Last-Modified' in response.headers:
+            return response
+        assert time.monotonic() < deadline, 'Không có Last-Modified sau lần ghi'
+        time.sleep(0.1)
+
+def test_http_cache():
+    """Các nhánh 304 của decorator conditional"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST HTTP CACHE (ETag / Last-Modified)")
+        print("="*60 + "\n")
+        
+        client = app.test_client()
+        product_id = Product.get_all()[0]['id']
+        path = f'/api/product/{product_id}/rating'
+        
+        # 1. ETag
+        print("1️⃣  If-None-Match...")
+        response = get(client, path)
+        etag = response.headers['ETag']
+        assert response.status_code == 200 and etag.startswith('W/')
+        assert 'public' in response.headers['Cache-Control']
+        response = get(client, path, **{'If-None-Match': etag})
+        assert response.status_code == 304 and response.headers['ETag'] == etag and not response.data
+        Review.create(product_id, 'Khách test', 5, 'Ngon')
+        response = get(client, path, **{'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert response.get_json()['count'] == 1
+        print("   ✅ 304 khi ETag khớp, 200 với ETag mới sau khi có đánh giá")
+        
+        # 2. If-Modified-Since (không gửi ETag)
+        print("\n2️⃣  If-Modified-Since...")
+        response = wait_for_last_modified(client, path)
+        last_modified = response.headers['Last-Modified']
+        assert parsedate_to_datetime(last_modified).timestamp() <= time.time()
+        response = get(client, path, **{'If-Modified-Since': last_modified})
+        assert response.status_code == 304, response.status_code
+        # Ghi ngay sau response (thường cùng giây với Last-Modified client đang giữ)
+        Review.create(product_id, 'Khách test 2', 4, 'Được')
+        response = get(client, path, **{'If-Modified-Since': last_modified})
+        assert response.status_code == 200, 'Trả 304 cũ sau lần ghi cùng giây'
+        assert response.get_json()['count'] == 2
+        new_last_modified = response.headers.get('Last-Modified')
+        assert new_last_modified is None or \
+            parsedate_to_datetime(new_last_modified) > parsedate_to_datetime(last_modified)
+        print("   ✅ 304 khi chưa đổi, 200 khi có lần ghi ngay sau đó")
+        
+        # 3. Trang có giỏ hàng
+        print("\n3️⃣  Trang có giỏ hàng (per_cart)...")
+        response = get(client, '/')
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert 'Cookie' in response.headers['Vary'] and 'private' in response.headers['Cache-Control']
+        assert 'Last-Modified' not in response.headers
+        response = get(client, '/', **{'If-None-Match': etag})
+        assert response.status_code == 304 and 'Cookie' in response.headers['Vary']
+        with app.app_context():
+            response = client.post('/add_to_cart', data={'product_id': product_id, 'quantity': 1})
+        assert response.get_json()['success']
+        response = get(client, '/', **{'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        print("   ✅ Vary: Cookie, 304 khi giỏ không đổi, 200 sau khi thêm vào giỏ")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_http_cache()
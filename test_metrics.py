@@ -0,0 +1,148 @@
+"""
+Script test metrics nhiều tiến trình (metrics.py)
+- Mỗi tiến trình ghi file mmap pid_<pid>.db riêng, /metrics cộng giá trị của mọi file
+- Counter của tiến trình đã chết vẫn được cộng, gauge (vd. request đang xử lý) thì bỏ
+- Route /metrics cần đăng nhập admin hoặc Authorization: Bearer <METRICS_TOKEN>
+Chạy: python test_metrics.py
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import metrics
+from admin_app import app as admin
+from metrics import MetricsWriter, MmapValues, collect, generate_latest
+
+ORDERS = metrics._key('orders_created_total', {})
+IN_FLIGHT = metrics._key('http_requests_in_flight', {'app': 'customer'})
+
+def child_write(directory, ready, release):
+    """Chạy trong tiến trình con (fork): writer phải mở file của pid mới, giữ tiến trình sống đến khi release"""
+    writer = MetricsWriter(directory)
+    writer.add(ORDERS, 2)
+    writer.add(IN_FLIGHT, 1)
+    ready.set()
+    release.wait(10)
+
+def check_collect(directory):
+    """Cộng file của tiến trình này, một tiến trình con và một file của tiến trình đã chết"""
+    writer = MetricsWriter(directory)
+    writer.add(ORDERS, 3)
+    writer.add(IN_FLIGHT, 1)
+    
+    # File của tiến trình đã chết (pid không tồn tại): counter vẫn tính, gauge thì không
+    context = multiprocessing.get_context('fork')
+    finished = context.Process(target=int)
+    finished.start()
+    finished.join()
+    dead = MmapValues(os.path.join(directory, f'pid_{finished.pid}.db'))
+    dead.add(ORDERS, 5)
+    dead.set(IN_FLIGHT, 7)
+    duration = 'http_request_duration_seconds'
+    dead.add(metrics._key(duration, {'endpoint': 'index', 'le': '0.005'}, '_bucket'), 1)
+    dead.add(metrics._key(duration, {'endpoint': 'index', 'le': '0.1'}, '_bucket'), 2)
+    dead.add(metrics._key(duration, {'endpoint': 'index'}, '_count'), 3)
+    dead.add(metrics._key(duration, {'endpoint': 'index'}, '_sum'), 0.15)
+    
+    ready, release = context.Event(), context.Event()
+    child = context.Process(target=child_write, args=(directory, ready, release))
+    child.start()
+    try:
+        assert ready.wait(10), 'Tiến trình con không ghi metrics'
+        files = sorted(name for name in os.listdir(directory) if name.startswith('pid_'))
+        assert len(files) == 3, files
+        samples = collect(directory)
+        assert samples[('orders_created_total', ())] == 3 + 2 + 5
+        assert samples[('http_requests_in_flight', (('app', 'customer'),))] == 1 + 1, \
+            'Gauge phải là tổng của 2 tiến trình còn sống'
+    finally:
+        release.set()
+        child.join()
+    assert child.exitcode == 0
+    print(f"   ✅ {len(files)} file: counter = 3 + 2 + 5, gauge = 1 + 1 (bỏ 7 của pid đã chết)")
+    
+    samples = collect(directory)
+    assert samples[('orders_created_total', ())] == 10, 'Counter của tiến trình vừa thoát bị mất'
+    assert samples[('http_requests_in_flight', (('app', 'customer'),))] == 1
+    print("   ✅ Tiến trình con thoát: counter giữ nguyên, gauge của nó bị bỏ")
+    
+    text = generate_latest(directory)
+    assert 'orders_created_total 10\n' in text
+    # Bucket lưu rời từng khoảng, khi xuất cộng dồn theo le
+    assert f'{duration}_bucket{{endpoint="index",le="0.05"}} 1\n' in text
+    assert f'{duration}_bucket{{endpoint="index",le="0.1"}} 3\n' in text
+    assert f'{duration}_bucket{{endpoint="index",le="+Inf"}} 3\n' in text
+    assert f'{duration}_count{{endpoint="index"}} 3\n' in text
+    print("   ✅ Định dạng Prometheus: bucket cộng dồn theo le, _count/_sum")
+
+def check_mmap_values(directory):
+    """File mmap tự nới rộng và đọc lại đúng khóa/giá trị sau khi mở lại"""
+    path = os.path.join(directory, 'values.db')
+    values = MmapValues(path, initial_size=64)
+    for i in range(100):
+        values.add(f'khóa_{i}', i)
+    values.set('khóa_0', 0.5)
+    # Mở lại: vị trí các khóa đọc từ file, ghi thêm không tạo khóa trùng
+    MmapValues(path).add('khóa_1', 1)
+    reopened = dict(MmapValues.read(path))
+    assert len(reopened) == 100 and reopened['khóa_0'] == 0.5 and reopened['khóa_1'] == 2
+    assert reopened['khóa_99'] == 99
+    assert os.path.getsize(path) > 64
+    print("   ✅ 100 khóa (file nới từ 64 byte), đọc lại đúng sau khi mở lại")
+
+def check_endpoint():
+    """Đăng nhập admin hoặc Bearer METRICS_TOKEN mới xem được /metrics"""
+    client = admin.test_client()
+    old_token = metrics.METRICS_TOKEN
+    try:
+        metrics.METRICS_TOKEN = None
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret-token'})
+        assert response.status_code == 302 and '/login' in response.headers['Location'], \
+            'Không đặt METRICS_TOKEN thì Bearer nào cũng không được'
+        
+        metrics.METRICS_TOKEN = 'secret-token'
+        assert client.get('/metrics').status_code == 302
+        for header in ('Bearer wrong-token', 'Basic secret-token', 'secret-token', 'Bearer '):
+            response = client.get('/metrics', headers={'Authorization': header})
+            assert response.status_code == 302, header
+        response = client.get('/metrics', headers={'Authorization': 'bearer secret-token'})
+        assert response.status_code == 200 and response.mimetype == 'text/plain'
+        assert '# TYPE http_requests_total counter' in response.get_data(as_text=True)
+        print("   ✅ Không token / sai token / sai scheme → /login, Bearer đúng → 200")
+        
+        metrics.METRICS_TOKEN = None
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+        response = client.get('/metrics')
+        assert response.status_code == 200 and 'orders_created_total' in response.get_data(as_text=True)
+        print("   ✅ Admin đã đăng nhập → 200")
+    finally:
+        metrics.METRICS_TOKEN = old_token
+
+def test_metrics():
+    """Gộp metrics của nhiều tiến trình và xác thực route /metrics"""
+    print("\n" + "="*60)
+    print("🧪 TEST METRICS NHIỀU TIẾN TRÌNH")
+    print("="*60 + "\n")
+    
+    directory = tempfile.mkdtemp()
+    try:
+        print("1️⃣  File mmap...")
+        check_mmap_values(directory)
+        os.remove(os.path.join(directory, 'values.db'))
+        
+        print("\n2️⃣  Cộng file của các tiến trình...")
+        check_collect(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print("\n3️⃣  Xác thực /metrics...")
+    check_endpoint()
+    
+    print("\n" + "="*60)
+    print("✅ KIỂM TRA HOÀN TẤT!")
+    print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_metrics()
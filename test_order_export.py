@@ -0,0 +1,122 @@
+"""
+Script test xuất đơn hàng (order_export.py, /orders/export.<fmt>)
+- Đơn đã lưu trữ có trong file xuất, đơn nằm ở cả hai nơi (lưu trữ bị ngắt) chỉ xuất một lần
+- CSV có BOM ở đầu file (một lần), NDJSON mỗi đơn một dòng
+- Dữ liệu được gửi thành nhiều khối CHUNK_ROWS dòng
+Chạy: python test_order_export.py
+"""
+
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+import order_export
+from admin_app import app as admin
+from database import get_db
+from models import Order
+from order_export import iter_csv, iter_ndjson
+from testdb import temp_database
+from test_order_rollups import make_orders
+
+CHUNK = 50
+
+def interrupt_archive(db, order_id):
+    """Giả lập lần lưu trữ bị ngắt: đơn đã chép sang archive nhưng chưa xóa khỏi bảng chính"""
+    db.execute('''INSERT INTO archive.orders (id, customer_name, customer_phone, customer_address, total_amount,
+                                             status, created_at, archived_at)
+                  SELECT id, customer_name, customer_phone, customer_address, total_amount, status, created_at, ?
+                  FROM main.orders WHERE id = ?''', (time.time(), order_id))
+    db.execute('''INSERT INTO archive.order_items (id, order_id, product_id, quantity, price)
+                  SELECT id, order_id, product_id, quantity, price FROM main.order_items WHERE order_id = ?''',
+               (order_id,))
+    db.commit()
+
+def check_csv(expected_items, archived_ids):
+    chunks = list(iter_csv(Order.iter_export()))
+    text = ''.join(chunks)
+    assert text.startswith('\ufeff') and text.count('\ufeff') == 1, 'BOM phải có đúng một lần ở đầu file'
+    rows = list(csv.DictReader(io.StringIO(text[1:])))
+    items = [(int(row['order_id']), int(row['item_id'])) for row in rows]
+    assert len(items) == len(set(items)), 'Có dòng chi tiết bị xuất hai lần'
+    assert set(items) == expected_items, 'Thiếu hoặc thừa dòng chi tiết'
+    assert archived_ids <= {order_id for order_id, _ in items}, 'Thiếu đơn đã lưu trữ'
+    for row in rows[:20]:
+        assert float(row['line_total']) == int(row['quantity']) * float(row['price'])
+    
+    # Mỗi khối (trừ khối cuối) đúng CHUNK dòng, khối đầu có thêm header
+    assert len(chunks) == len(rows) // CHUNK + 1, (len(chunks), len(rows))
+    assert all(chunk.count('\n') == CHUNK for chunk in chunks[1:-1])
+    assert chunks[0].count('\n') == CHUNK + 1
+    print(f"   ✅ {len(rows)} dòng trong {len(chunks)} khối, BOM ở đầu, không dòng nào trùng")
+
+def check_ndjson(expected_items, archived_ids):
+    chunks = list(iter_ndjson(Order.iter_export()))
+    orders = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    ids = [order['id'] for order in orders]
+    assert len(ids) == len(set(ids)), 'Có đơn bị xuất hai lần'
+    items = {(order['id'], item['id']) for order in orders for item in order['items']}
+    assert items == expected_items and archived_ids <= set(ids)
+    assert [order['created_at'] for order in orders] == sorted(order['created_at'] for order in orders)
+    assert len(chunks) == -(-len(orders) // CHUNK) and all(chunk.count('\n') == CHUNK for chunk in chunks[:-1])
+    print(f"   ✅ {len(orders)} đơn trong {len(chunks)} khối, mỗi đơn một dòng, cũ trước")
+
+def test_order_export():
+    """Xuất đơn hàng gồm cả đơn đã lưu trữ, mỗi đơn đúng một lần"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST XUẤT ĐƠN HÀNG")
+        print("="*60 + "\n")
+        
+        db = get_db()
+        Order.create_many(make_orders(300, seed=11))
+        expected_items = {(row['order_id'], row['id']) for row in db.execute('SELECT id, order_id FROM order_items')}
+        
+        # Lưu trữ đơn cũ, rồi để một đơn nằm ở cả hai nơi
+        cutoff = (datetime.utcnow() - timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        while Order.archive(cutoff, batch_size=100):
+            pass
+        archived_ids = {row['id'] for row in db.execute('SELECT id FROM archive.orders')}
+        duplicate = db.execute("SELECT id FROM main.orders WHERE status = 'completed' LIMIT 1").fetchone()['id']
+        interrupt_archive(db, duplicate)
+        assert archived_ids and len(expected_items) > CHUNK * 3
+        print(f"📊 {len(expected_items)} dòng chi tiết, {len(archived_ids)} đơn đã lưu trữ, "
+              f"đơn #{duplicate} ở cả hai nơi")
+        
+        old_chunk = order_export.CHUNK_ROWS
+        order_export.CHUNK_ROWS = CHUNK
+        try:
+            print("\n1️⃣  CSV...")
+            check_csv(expected_items, archived_ids)
+            
+            print("\n2️⃣  NDJSON...")
+            check_ndjson(expected_items, archived_ids)
+        finally:
+            order_export.CHUNK_ROWS = old_chunk
+        
+        # 3. Route stream đúng nội dung
+        print("\n3️⃣  Route /orders/export.csv...")
+        client = admin.test_client()
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+        with admin.app_context():
+            response = client.get('/orders/export.csv?status=completed')
+        assert response.status_code == 200 and response.is_streamed
+        assert response.headers['Content-Disposition'] == 'attachment; filename="orders-completed.csv"'
+        text = response.get_data().decode('utf-8')
+        assert text.startswith('\ufeff')
+        rows = list(csv.DictReader(io.StringIO(text[1:])))
+        completed = {row['id'] for row in db.execute(
+            '''SELECT oi.id FROM order_items oi JOIN main.orders o ON o.id = oi.order_id WHERE o.status = 'completed'
+               UNION SELECT oi.id FROM archive.order_items oi JOIN archive.orders o ON o.id = oi.order_id
+               WHERE o.status = 'completed' ''')}
+        assert sorted(int(row['item_id']) for row in rows) == sorted(completed)
+        print(f"   ✅ {len(rows)} dòng đơn hoàn thành (kể cả đã lưu trữ), mỗi dòng một lần")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_order_export()
@@ -0,0 +1,136 @@
+"""
+Script test bảng tổng hợp đơn hàng theo ngày/tháng (tạo đơn, đổi trạng thái, lưu trữ, dựng lại)
+So sánh thống kê, chuỗi doanh thu và top bán chạy với kết quả tính trực tiếp trên orders + archive.orders.
+Chạy trên database tạm, không đụng food_ordering.db.
+Chạy: python test_order_rollups.py
+"""
+
+import random
+from datetime import datetime, timedelta
+import database
+from database import get_db
+from models import Order, Product
+from rebuild_rollups import rebuild_rollups
+from testdb import temp_database
+
+# Mọi đơn hàng (kể cả đã lưu trữ), đơn có ở cả hai nơi chỉ tính bản trong bảng chính
+ALL_ORDERS = '''(SELECT id, created_at, status, total_amount FROM main.orders
+                 UNION ALL
+                 SELECT id, created_at, status, total_amount FROM archive.orders a
+                 WHERE NOT EXISTS (SELECT 1 FROM main.orders h WHERE h.id = a.id))'''
+
+ALL_ITEMS = '''(SELECT oi.product_id, oi.quantity, oi.price, o.status
+                FROM main.order_items oi JOIN main.orders o ON o.id = oi.order_id
+                UNION ALL
+                SELECT oi.product_id, oi.quantity, oi.price, o.status
+                FROM archive.order_items oi JOIN archive.orders o ON o.id = oi.order_id
+                WHERE NOT EXISTS (SELECT 1 FROM main.orders h WHERE h.id = o.id))'''
+
+STATUSES = ['pending', 'processing', 'completed', 'cancelled']
+
+def make_orders(count, seed=7):
+    """Đơn hàng ngẫu nhiên (cố định theo seed) rải trong 60 ngày gần đây"""
+    rng = random.Random(seed)
+    product_ids = [product['id'] for product in Product.get_all()]
+    now = datetime.utcnow()
+    orders = []
+    for i in range(count):
+        created_at = now - timedelta(days=rng.randint(0, 60), minutes=rng.randint(0, 1440))
+        orders.append({
+            'customer_name': f'Khách {i}',
+            'customer_phone': f'09{i:08d}',
+            'customer_address': f'{i} Lê Lợi',
+            'status': rng.choice(STATUSES),
+            'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'items': [{'id': product_id, 'quantity': rng.randint(1, 4)}
+                      for product_id in rng.sample(product_ids, rng.randint(1, 3))]
+        })
+    return orders
+
+def expected_statistics(db):
+    stats = {'total': 0, 'pending': 0, 'processing': 0, 'completed': 0, 'cancelled': 0, 'revenue': 0}
+    for row in db.execute(f'''SELECT status, COUNT(*) as count, SUM(total_amount) as amount
+                              FROM {ALL_ORDERS} WHERE status IS NOT NULL GROUP BY status'''):
+        stats['total'] += row['count']
+        stats[row['status']] = row['count']
+        if row['status'] == 'completed':
+            stats['revenue'] = row['amount']
+    return stats
+
+def check_rollups(step):
+    """So sánh số liệu đọc từ bảng tổng hợp với tính trực tiếp"""
+    db = get_db()
+    
+    stats = Order.get_statistics()
+    expected = expected_statistics(db)
+    assert abs(stats['revenue'] - expected['revenue']) < 0.01, f'{step}: doanh thu {stats["revenue"]} != {expected["revenue"]}'
+    assert {k: v for k, v in stats.items() if k != 'revenue'} == \
+        {k: v for k, v in expected.items() if k != 'revenue'}, f'{step}: {stats} != {expected}'
+    
+    for table, key, expr in database.ORDER_ROLLUPS:
+        rollup = {(row[0], row[1]): (row[2], round(row[3], 2))
+                  for row in db.execute(f'SELECT {key}, status, order_count, revenue FROM {table} WHERE order_count != 0')}
+        direct = {(row[0], row[1]): (row[2], round(row[3], 2))
+                  for row in db.execute(f'''SELECT {expr}, status, COUNT(*), SUM(total_amount)
+                                            FROM {ALL_ORDERS} WHERE status IS NOT NULL
+                                            GROUP BY {expr}, status''')}
+        assert rollup == direct, f'{step}: {table} lệch với bảng orders'
+    
+    revenue = Order.get_revenue_by_date(60)
+    direct = {row[0]: row[1] for row in db.execute(
+        f"SELECT DATE(created_at), SUM(total_amount) FROM {ALL_ORDERS} WHERE status = 'completed' GROUP BY 1")}
+    for row in revenue:
+        assert abs(row['revenue'] - direct.get(row['date'], 0)) < 0.01, f'{step}: doanh thu ngày {row["date"]}'
+    
+    top = {row['name']: (row['total_sold'], round(row['revenue'], 2)) for row in Order.get_top_products(100)}
+    direct = {row[0]: (row[1], round(row[2], 2)) for row in db.execute(
+        f'''SELECT p.name, SUM(i.quantity), SUM(i.quantity * i.price)
+            FROM {ALL_ITEMS} i JOIN products p ON p.id = i.product_id
+            WHERE i.status = 'completed' GROUP BY i.product_id''')}
+    assert top == direct, f'{step}: top bán chạy lệch'
+    
+    print(f"   ✅ {step}: {stats['total']} đơn, doanh thu {stats['revenue']:,.0f}₫")
+
+def test_order_rollups():
+    """Bảng tổng hợp luôn khớp với dữ liệu gốc qua mọi thao tác ghi"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST BẢNG TỔNG HỢP ĐƠN HÀNG")
+        print("="*60 + "\n")
+        
+        print("1️⃣  Tạo đơn hàng...")
+        order_ids = []
+        orders = make_orders(300)
+        for i in range(0, len(orders), 100):
+            order_ids.extend(Order.create_many(orders[i:i + 100]))
+        check_rollups('Sau khi tạo đơn')
+        
+        print("\n2️⃣  Đổi trạng thái...")
+        rng = random.Random(11)
+        for order_id in rng.sample(order_ids, 80):
+            Order.update_status(order_id, rng.choice(STATUSES))
+        check_rollups('Sau khi đổi trạng thái')
+        
+        print("\n3️⃣  Lưu trữ đơn cũ hơn 20 ngày...")
+        before = (datetime.utcnow() - timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        moved = 0
+        while True:
+            count = Order.archive(before, batch_size=50)
+            if not count:
+                break
+            moved += count
+        assert moved > 0, 'Không có đơn nào được lưu trữ'
+        print(f"   ✅ Đã lưu trữ {moved} đơn")
+        check_rollups('Sau khi lưu trữ')
+        
+        print("\n4️⃣  Dựng lại bảng tổng hợp...")
+        rebuild_rollups()
+        check_rollups('Sau khi dựng lại')
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_order_rollups()
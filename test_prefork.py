@@ -0,0 +1,110 @@
+"""
+Script test heartbeat của worker pre-fork (prefork.WorkerHealth)
+- Response stream mở lâu hơn WORKER_TIMEOUT (SSE, file xuất) không làm worker bị coi là treo
+- Mọi luồng kẹt trong view quá WORKER_TIMEOUT, hoặc vòng lặp server dừng, thì ngừng heartbeat
+- Server không giới hạn luồng (Werkzeug) chỉ kiểm tra vòng lặp server
+Chạy: python test_prefork.py
+"""
+
+import threading
+import time
+import urllib.request
+from werkzeug.serving import make_server
+import prefork
+from prefork import WorkerHealth
+
+TIMEOUT = 1.0
+
+def make_app(release):
+    """App WSGI: /stream gửi từng khối đến khi release được set, /hang kẹt trong view"""
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/hang':
+            release.wait()
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+        if environ['PATH_INFO'] != '/stream':
+            return [b'ok']
+        
+        def stream():
+            while not release.is_set():
+                yield b'data: ping\n\n'
+                time.sleep(0.1)
+        return stream()
+    return app
+
+def serve(health):
+    server = make_server('127.0.0.1', 0, health, threaded=True)
+    server.service_actions = health.tick
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def open_requests(url, path, count):
+    def read():
+        with urllib.request.urlopen(url + path) as response:
+            response.read()
+    threads = [threading.Thread(target=read, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def check(health, url, release, threads):
+    """Trả về trạng thái healthy khi có 2 stream mở quá hạn, rồi khi có `threads` view kẹt"""
+    streams = open_requests(url, '/stream', 2)
+    time.sleep(TIMEOUT * 1.5)
+    with_streams = health.healthy(time.monotonic())
+    
+    hung = open_requests(url, '/hang', threads)
+    time.sleep(TIMEOUT * 1.5)
+    with_hung = health.healthy(time.monotonic())
+    
+    release.set()
+    for thread in streams + hung:
+        thread.join(5)
+    return with_streams, with_hung
+
+def test_prefork_health():
+    """Heartbeat chỉ dừng khi worker thật sự không phục vụ được"""
+    old_timeout = prefork.WORKER_TIMEOUT
+    prefork.WORKER_TIMEOUT = TIMEOUT
+    try:
+        print("\n" + "="*60)
+        print("🧪 TEST HEARTBEAT WORKER")
+        print("="*60 + "\n")
+        
+        # 1. Server giới hạn 2 luồng (như waitress với PREFORK_THREADS=2)
+        print("1️⃣  Giới hạn 2 luồng...")
+        release = threading.Event()
+        health = WorkerHealth(make_app(release), threads=2)
+        server, url = serve(health)
+        with_streams, with_hung = check(health, url, release, 2)
+        assert with_streams, '2 stream SSE mở lâu bị coi là worker treo'
+        assert not with_hung, '2 luồng kẹt trong view nhưng vẫn gửi heartbeat'
+        assert health.healthy(time.monotonic()), 'Không hồi phục sau khi view trả về'
+        print("   ✅ Stream mở quá hạn vẫn khỏe, mọi luồng kẹt trong view thì ngừng heartbeat")
+        
+        # 2. Vòng lặp server dừng
+        print("\n2️⃣  Vòng lặp server dừng...")
+        server.shutdown()
+        time.sleep(TIMEOUT * 1.5)
+        assert not health.healthy(time.monotonic()), 'Vòng lặp đã dừng nhưng vẫn gửi heartbeat'
+        server.server_close()
+        print("   ✅ Ngừng heartbeat")
+        
+        # 3. Werkzeug: không giới hạn luồng
+        print("\n3️⃣  Không giới hạn luồng (Werkzeug)...")
+        release = threading.Event()
+        health = WorkerHealth(make_app(release), threads=None)
+        server, url = serve(health)
+        with_streams, with_hung = check(health, url, release, 3)
+        assert with_streams and with_hung, 'View kẹt không chiếm hết luồng nhưng worker bị coi là treo'
+        server.shutdown()
+        server.server_close()
+        print("   ✅ Chỉ kiểm tra vòng lặp server")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+    finally:
+        prefork.WORKER_TIMEOUT = old_timeout
+
+if __name__ == '__main__':
+    test_prefork_health()
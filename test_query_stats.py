@@ -0,0 +1,106 @@
+"""
+Script test thống kê truy vấn trên app admin (/metrics/queries)
+- Histogram theo câu SQL và slow-query log kèm EXPLAIN QUERY PLAN
+- Gộp số liệu của nhiều worker (mỗi tiến trình một file queries_<pid>.json)
+- Cần đăng nhập admin hoặc Bearer METRICS_TOKEN
+Chạy: python test_query_stats.py
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import metrics
+from admin_app import app as admin
+from database import get_db
+from query_trace import normalize_sql, query_stats
+from testdb import temp_database
+
+SQL = 'SELECT id, name FROM products WHERE id = ?'
+
+def get(client, path, **headers):
+    with admin.app_context():
+        return client.get(path, headers=headers)
+
+def test_collect_queries():
+    """Gộp file của 2 tiến trình: cộng số lần, thời gian, bucket; slow log mới nhất trước"""
+    directory = tempfile.mkdtemp()
+    try:
+        entry = {'sql': SQL, 'count': 2, 'total_ms': 3.0, 'max_ms': 2.0, 'rows': 2, 'avg_ms': 1.5,
+                 'buckets': {'1': 1, '5': 1, '+Inf': 0}}
+        for pid, at, max_ms in ((101, 10.0, 2.0), (102, 20.0, 4.0)):
+            data = {'statements': [dict(entry, max_ms=max_ms)],
+                    'slow_queries': [{'sql': SQL, 'ms': max_ms, 'rows': 1, 'params': 1, 'plan': [], 'at': at}]}
+            with open(os.path.join(directory, f'queries_{pid}.json'), 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        
+        result = metrics.collect_queries(directory)
+        (merged,) = result['statements']
+        assert merged['count'] == 4 and merged['total_ms'] == 6.0 and merged['rows'] == 4
+        assert merged['max_ms'] == 4.0 and merged['avg_ms'] == 1.5
+        assert merged['buckets'] == {'1': 2, '5': 2, '+Inf': 0}
+        assert [slow['at'] for slow in result['slow_queries']] == [20.0, 10.0]
+        print("   ✅ Gộp 2 worker: count, total_ms, max_ms, bucket, slow log mới nhất trước")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def test_query_stats_endpoint():
+    """Route /metrics/queries trả histogram và slow log của truy vấn vừa chạy"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST THỐNG KÊ TRUY VẤN (/metrics/queries)")
+        print("="*60 + "\n")
+        
+        print("1️⃣  Gộp số liệu của nhiều worker...")
+        test_collect_queries()
+        
+        client = admin.test_client()
+        old_slow_ms, old_token = query_stats.slow_ms, metrics.METRICS_TOKEN
+        try:
+            # Mọi truy vấn đều vào slow log để kiểm tra EXPLAIN QUERY PLAN
+            query_stats.slow_ms = 0
+            get_db().execute(SQL, (1,)).fetchall()
+            query_stats.slow_ms = old_slow_ms
+            
+            # 2. Xác thực
+            print("\n2️⃣  Xác thực...")
+            metrics.METRICS_TOKEN = 'secret-token'
+            response = get(client, '/metrics/queries')
+            assert response.status_code == 302 and '/login' in response.headers['Location']
+            response = get(client, '/metrics/queries', Authorization='Bearer wrong-token')
+            assert response.status_code == 302
+            response = get(client, '/metrics/queries', Authorization='Bearer secret-token')
+            assert response.status_code == 200, response.status_code
+            with client.session_transaction() as session:
+                session['admin_logged_in'] = True
+            response = get(client, '/metrics/queries?top=500')
+            assert response.status_code == 200 and response.mimetype == 'application/json'
+            print("   ✅ Chưa đăng nhập / sai token → /login, Bearer token hoặc đăng nhập → 200")
+            
+            # 3. Histogram và slow log
+            print("\n3️⃣  Histogram và slow log...")
+            data = response.get_json()
+            statements = {entry['sql']: entry for entry in data['statements']}
+            entry = statements[normalize_sql(SQL)]
+            assert entry['count'] >= 1 and sum(entry['buckets'].values()) == entry['count']
+            assert entry['max_ms'] <= entry['total_ms']
+            slow = next(slow for slow in data['slow_queries'] if slow['sql'] == normalize_sql(SQL))
+            assert slow['rows'] == 1 and any('products' in line for line in slow['plan']), slow
+            totals = [entry['total_ms'] for entry in data['statements']]
+            assert totals == sorted(totals, reverse=True)
+            print(f"   ✅ {entry['count']} lần, TB {entry['avg_ms']}ms, kế hoạch: {slow['plan']}")
+            
+            response = get(client, '/metrics/queries?top=1')
+            assert len(response.get_json()['statements']) == 1
+            print("   ✅ ?top=1 chỉ trả câu tốn thời gian nhất")
+        finally:
+            query_stats.slow_ms = old_slow_ms
+            metrics.METRICS_TOKEN = old_token
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_query_stats_endpoint()
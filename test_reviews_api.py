@@ -3,8 +3,11 @@ Script test API reviews
 Chạy: python test_reviews_api.py
 """
 
+import html
+import re
 from app import app
 from models import Review, Product
+from testdb import temp_database
 
 def test_reviews_api():
     """Test các API reviews"""
@@ -83,6 +86,13 @@ def test_reviews_api():
         except Exception as e:
             print(f"   ❌ Error: {e}")
         
+        # 6. Test trang tất cả đánh giá (phân trang theo cursor: xem test_reviews_pagination)
+        print("\n6️⃣  Test trang tất cả đánh giá...")
+        response = client.get('/reviews')
+        assert response.status_code == 200, response.status_code
+        print(f"   ✅ Trang đánh giá hoạt động OK")
+        print(f"   🔗 URL: http://localhost:5000/reviews")
+        
         print("\n" + "="*60)
         print("✅ KIỂM TRA HOÀN TẤT!")
         print("="*60)
@@ -100,5 +110,48 @@ def test_reviews_api():
         
         print()
 
+def reviews_page(client, url):
+    """Lấy một trang /reviews: (id các đánh giá theo thứ tự hiển thị, link trang sau hoặc None)"""
+    with app.app_context():
+        response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    text = response.get_data(as_text=True)
+    ids = [int(review_id) for review_id in re.findall(r'id="review-(\d+)"', text)]
+    next_link = re.search(r'href="([^"]*after=[^"]*)"', text)
+    return ids, html.unescape(next_link.group(1)) if next_link else None
+
+def test_reviews_pagination():
+    """Trang /reviews: link trang sau theo cursor, các trang không trùng, không thiếu đánh giá"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST PHÂN TRANG /reviews")
+        print("="*60 + "\n")
+        
+        product_id = Product.get_all()[0]['id']
+        for i in range(5):
+            Review.create(product_id, f'Khách {i}', 5 - i % 3, f'Đánh giá số {i}')
+        expected = [review['id'] for review in Review.get_all()]
+        assert len(expected) == 5
+        
+        client = app.test_client()
+        pages = []
+        url = '/reviews?limit=2'
+        while url:
+            ids, url = reviews_page(client, url)
+            pages.append(ids)
+            assert len(pages) <= 5, 'Link trang sau lặp vô hạn'
+        
+        assert [len(ids) for ids in pages] == [2, 2, 1], pages
+        seen = [review_id for ids in pages for review_id in ids]
+        assert len(seen) == len(set(seen)), f'Các trang bị trùng: {pages}'
+        assert seen == expected, 'Thứ tự hoặc số đánh giá khác Review.get_all (mới nhất trước)'
+        print(f"   ✅ 3 trang {pages}: có link trang sau, không trùng, trang cuối không có link")
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
 if __name__ == '__main__':
-    test_reviews_api()
\ No newline at end of file
+    test_reviews_api()
+    test_reviews_pagination()
\ No newline at end of file
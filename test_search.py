@@ -0,0 +1,59 @@
+"""
+Script test tìm kiếm sản phẩm không phân biệt dấu (Product.search)
+- "pho" khớp "Phở", "dau" khớp "Đậu" (đ→d), khớp tiền tố từng từ, tên khớp xếp trước
+- Cùng kết quả khi SQLite không có FTS5 (so khớp bỏ dấu trên danh mục trong bộ nhớ)
+Chạy: python test_search.py
+"""
+
+import database
+from database import get_db, has_fts5
+from models import Product
+from testdb import temp_database
+
+def names(keyword):
+    return [product['name'] for product in Product.search(keyword)]
+
+def check_search(label):
+    """Các trường hợp bỏ dấu chung cho FTS5 và nhánh dự phòng"""
+    assert 'Phở Bò Tái' in names('pho'), names('pho')
+    assert 'Phở Bò Tái' in names('PHỞ bo'), 'Từ có dấu / chữ hoa phải khớp'
+    assert names('dau') and names('dau')[0] == 'Đậu Hũ Sốt Cà', names('dau')
+    assert names('Đậu hu') == names('dau hu')
+    assert 'Bún Chả Hà Nội' in names('bun ch'), 'Không khớp tiền tố'
+    assert names('pho xyzkhongco') == [] and names('!!!') == []
+    # Khớp ở tên xếp trước khớp ở mô tả
+    ranked = names('nuong')
+    assert ranked[0] == 'Thịt Nướng Đặc Biệt', ranked
+    print(f"   ✅ {label}: pho → Phở, dau → Đậu, bun ch → Bún Chả, tên khớp xếp trước")
+
+def test_search():
+    """Tìm kiếm bỏ dấu qua FTS5 và khi không có FTS5"""
+    
+    with temp_database():
+        print("\n" + "="*60)
+        print("🧪 TEST TÌM KIẾM KHÔNG DẤU")
+        print("="*60 + "\n")
+        
+        Product.create('Đậu Hũ Sốt Cà', 'Đậu hũ non sốt cà chua', 35000, '', 'Món chay')
+        Product.create('Thịt Nướng Đặc Biệt', 'Thịt heo ướp sả', 60000, '', 'Món nướng')
+        Product.create('Cơm Tấm', 'Sườn nướng, bì, chả', 45000, '', 'Cơm')
+        
+        # 1. FTS5
+        print("1️⃣  FTS5...")
+        assert has_fts5(get_db()), 'SQLite không có FTS5'
+        check_search('FTS5')
+        
+        # 2. Không có FTS5
+        print("\n2️⃣  Không có FTS5...")
+        database._fts5_cache[database.DATABASE] = False
+        try:
+            check_search('Dự phòng')
+        finally:
+            database._fts5_cache.pop(database.DATABASE, None)
+        
+        print("\n" + "="*60)
+        print("✅ KIỂM TRA HOÀN TẤT!")
+        print("="*60 + "\n")
+
+if __name__ == '__main__':
+    test_search()
@@ -0,0 +1,26 @@
+"""
+Database tạm cho các script test: không đụng food_ordering.db, file lưu trữ nằm cùng thư mục tạm
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+import database
+from app import app
+from database import init_db
+
+@contextmanager
+def temp_database():
+    """Chạy trong app context với database tạm (có dữ liệu mẫu), khôi phục khi xong"""
+    old = database.DATABASE
+    directory = tempfile.mkdtemp()
+    database.DATABASE = os.path.join(directory, 'test.db')
+    try:
+        with app.app_context():
+            init_db()
+            yield
+    finally:
+        database.get_pool().close()
+        database.DATABASE = old
+        shutil.rmtree(directory, ignore_errors=True)